@@ -1,6 +1,5 @@
 from flask import Flask, jsonify
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, verify_jwt_in_request, get_jwt
 from flask_bcrypt import Bcrypt
@@ -11,8 +10,8 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Initialize extensions
-db = SQLAlchemy()
-migrate = Migrate()
+from app.db_pool import RoutingSession
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 jwt = JWTManager()
 bcrypt = Bcrypt()
 
@@ -38,12 +37,105 @@ def create_app(config_name='development'):
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = False  # Tokens don't expire for now
     app.config['JWT_TOKEN_LOCATION'] = ['headers']
 
+    # SQL instrumentation (app/query_stats.py): on by default outside production
+    def env_flag(name, default):
+        return os.getenv(name, '1' if default else '0').strip().lower() in ('1', 'true', 'yes', 'on')
+    app.config['QUERY_STATS_ENABLED'] = env_flag('QUERY_STATS', config_name != 'production')
+    app.config['QUERY_STATS_HEADERS'] = env_flag('QUERY_STATS_HEADERS', config_name != 'production')
+    app.config['QUERY_STATS_STRICT'] = env_flag('QUERY_STATS_STRICT', False)
+    app.config['QUERY_STATS_N1_THRESHOLD'] = int(os.getenv('QUERY_STATS_N1_THRESHOLD', '5'))
+
+    # Prometheus /metrics (app/metrics.py): served only when METRICS_TOKEN is set
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+
+    # Connection pools (app/db_pool.py). Defaults fit 2 workers x 4 threads against Neon,
+    # which drops idle connections after ~5 minutes. Checkout wait is reported in /metrics.
+    from app.db_pool import engine_options
+    database_uri = app.config['SQLALCHEMY_DATABASE_URI']
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(
+        database_uri, 'default',
+        pool_size=int(os.getenv('DB_POOL_SIZE', '4')),
+        max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '2')),
+        recycle=int(os.getenv('DB_POOL_RECYCLE', '280')),
+        timeout=float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        pre_ping=env_flag('DB_POOL_PRE_PING', True),
+    )
+    # Separate small pool for expensive endpoints (bulk create, imports, exports): @use_pool('bulk')
+    bulk_uri = os.getenv('DATABASE_BULK_URL') or database_uri
+    if not bulk_uri.startswith('sqlite') or os.getenv('DATABASE_BULK_URL'):
+        app.config['SQLALCHEMY_BINDS'] = {'bulk': {'url': bulk_uri, **engine_options(
+            bulk_uri, 'bulk',
+            pool_size=int(os.getenv('DB_BULK_POOL_SIZE', '1')),
+            max_overflow=int(os.getenv('DB_BULK_MAX_OVERFLOW', '1')),
+            recycle=int(os.getenv('DB_POOL_RECYCLE', '280')),
+            timeout=float(os.getenv('DB_BULK_POOL_TIMEOUT', '30')),
+            pre_ping=env_flag('DB_POOL_PRE_PING', True),
+        )}}
+    # Read replica for GET/HEAD requests (see app/db_pool.py for stickiness and lag fallback)
+    replica_uri = os.getenv('DATABASE_REPLICA_URL')
+    if replica_uri:
+        app.config.setdefault('SQLALCHEMY_BINDS', {})['replica'] = {'url': replica_uri, **engine_options(
+            replica_uri, 'replica',
+            pool_size=int(os.getenv('DB_POOL_SIZE', '4')),
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '2')),
+            recycle=int(os.getenv('DB_POOL_RECYCLE', '280')),
+            timeout=float(os.getenv('DB_POOL_TIMEOUT', '10')),
+            pre_ping=env_flag('DB_POOL_PRE_PING', True),
+        )}
+    app.config['REPLICA_MAX_LAG_SECONDS'] = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '5'))
+    app.config['REPLICA_STICKY_SECONDS'] = int(os.getenv('REPLICA_STICKY_SECONDS', '10'))
+    app.config['REPLICA_LAG_CHECK_SECONDS'] = float(os.getenv('REPLICA_LAG_CHECK_SECONDS', '2'))
+    # Postgres statement timeouts per pool in ms (0 = none); @statement_timeout(ms) overrides per view
+    app.config['DB_STATEMENT_TIMEOUTS'] = {
+        'default': int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '15000')),
+        'bulk': int(os.getenv('DB_BULK_STATEMENT_TIMEOUT_MS', '120000')),
+        'replica': int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '15000')),
+    }
+
+    # Response cache for public GET endpoints (app/response_cache.py): off | memory | sqlite | redis
+    app.config['RESPONSE_CACHE'] = os.getenv('RESPONSE_CACHE', 'off')
+    app.config['RESPONSE_CACHE_URL'] = os.getenv('RESPONSE_CACHE_URL')
+    app.config['RESPONSE_CACHE_TTL'] = float(os.getenv('RESPONSE_CACHE_TTL', '30'))
+    app.config['RESPONSE_CACHE_MAX_ENTRIES'] = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1024'))
+
+    # In-process bitmap index for student feed / filter targeting (app/bitmap_index.py)
+    app.config['BITMAP_INDEX'] = env_flag('BITMAP_INDEX', False)
+    app.config['BITMAP_INDEX_REFRESH_SECONDS'] = float(os.getenv('BITMAP_INDEX_REFRESH_SECONDS', '5'))
+
+    # Opt-in sampling profiler (app/profiling): see app/profiling/hooks.py for triggers
+    app.config['PROFILER_ENABLED'] = env_flag('PROFILER', False)
+    app.config['PROFILER_SLOW_MS'] = float(os.getenv('PROFILER_SLOW_MS', '0'))
+    app.config['PROFILER_SAMPLE_RATE'] = float(os.getenv('PROFILER_SAMPLE_RATE', '0'))
+    app.config['PROFILER_INTERVAL_MS'] = float(os.getenv('PROFILER_INTERVAL_MS', '5'))
+    app.config['PROFILER_TOKEN'] = os.getenv('PROFILER_TOKEN')
+    app.config['PROFILER_DIR'] = os.getenv('PROFILER_DIR')
+    app.config['PROFILER_MAX_FILES'] = int(os.getenv('PROFILER_MAX_FILES', '200'))
+
     # Initialize extensions with app
     db.init_app(app)
-    migrate.init_app(app, db)
+    # Flask-Migrate pulls in alembic (~150 ms); only the `flask db ...` CLI needs it
+    import click
+    if click.get_current_context(silent=True) is not None:
+        from flask_migrate import Migrate
+        Migrate(app, db)
     jwt.init_app(app)
     bcrypt.init_app(app)
 
+    from app.db_pool import init_db_pools
+    init_db_pools(app)
+
+    from app.query_stats import init_query_stats
+    init_query_stats(app)
+
+    from app.metrics import init_metrics
+    init_metrics(app)
+
+    from app.profiling.hooks import init_profiler
+    init_profiler(app)
+
+    from app.response_cache import init_response_cache
+    init_response_cache(app)
+
     # CORS configuration for frontend origins
     frontend_origin_env = os.getenv('FRONTEND_ORIGIN')
     default_allowed_origins = [
@@ -71,6 +163,7 @@ def create_app(config_name='development'):
     from app.users import users_bp
     from app.media import media_bp
     from app.filters import filters_bp
+    from app.profiling import profiling_bp
 
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(articles_bp, url_prefix='/api/articles')
@@ -78,19 +171,30 @@ def create_app(config_name='development'):
     app.register_blueprint(users_bp, url_prefix='/api/users')
     app.register_blueprint(media_bp, url_prefix='/api/media')
     app.register_blueprint(filters_bp, url_prefix='/api/filters')
+    app.register_blueprint(profiling_bp, url_prefix='/api/profiles')
 
-    # Ensure database tables exist (useful for SQLite/demo deployments)
-    with app.app_context():
-        try:
-            db.create_all()
-            # Run minimal idempotent migrations for Neon/MySQL
+    # CLI: background media processing (`flask media-worker`)
+    from app.media.worker import media_worker_command, media_backfill_hashes_command
+    app.cli.add_command(media_worker_command)
+    app.cli.add_command(media_backfill_hashes_command)
+
+    # CLI: schema migrations (`flask schema-migrate`, `flask schema-status`)
+    from app.db_migrations import schema_migrate_command, schema_status_command
+    app.cli.add_command(schema_migrate_command)
+    app.cli.add_command(schema_status_command)
+    from app.db_indexes import index_status_command, ensure_indexes_command
+    app.cli.add_command(index_status_command)
+    app.cli.add_command(ensure_indexes_command)
+
+    # Ensure tables and versioned migrations (app/db_migrations.py). When the schema is
+    # current this is a single SELECT; set SCHEMA_AUTO_MIGRATE=0 to migrate only via the CLI.
+    if env_flag('SCHEMA_AUTO_MIGRATE', True):
+        with app.app_context():
             try:
                 from app.db_migrations import run_startup_migrations
-                run_startup_migrations(db)
+                run_startup_migrations(db, logger=app.logger)
             except Exception:
-                pass
-        except Exception:
-            pass
+                app.logger.exception('startup schema migration failed')
 
     @app.before_request
     def enforce_active_admin_session():
@@ -6,13 +6,24 @@ from app.models import SchoolClass
 from app.models import ArticleReaction, ReactionEmoji
 from app.models import ArticleView
 from app.models import City, Speciality, Group  # for bulk
+from app.media.loaders import load_article_media
 from app import db
 from datetime import datetime
 import re
-from sqlalchemy import or_, asc, desc
-import requests
+from sqlalchemy import or_, asc, desc, func, update
+from app.lazy import LazyView
+from app.db_pool import use_pool
+from app.response_cache import cached
+from app.bitmap_index import get_bitmap_index
+from app.targeting import AudienceQuery, StudentContext, narrow, plan_for
+from app.filters.keys import get_key_registry
+
+def _published_listing():
+    # Admin lists (drafts included) are never cached
+    return (request.args.get('is_published') or '').lower() in ('1', 'true')
 
 @articles_bp.route('/', methods=['GET'])
+@cached('articles', when=_published_listing)
 def get_articles():
     """Get articles with filtering options"""
     # Get query parameters
@@ -113,55 +124,20 @@ def get_articles():
             pass
     if tag:
         query = query.filter(Article.tag == tag)
-    # Institution type constraint via Speciality (no relationship on Article, so join explicitly)
-    if institution_type_id or institution_type_ids:
-        query = query.join(Speciality, Speciality.id == Article.speciality_id)
-        if institution_type_id:
-            query = query.filter(Speciality.institution_type_id == institution_type_id)
-        elif institution_type_ids:
-            query = query.filter(Speciality.institution_type_id.in_(institution_type_ids))
-    if education_form_id:
-        query = query.filter(Article.education_form_id == education_form_id)
-    elif education_form_ids:
-        query = query.filter(Article.education_form_id.in_(education_form_ids))
-    if speciality_id:
-        query = query.filter(Article.speciality_id == speciality_id)
-    elif speciality_ids:
-        query = query.filter(Article.speciality_id.in_(speciality_ids))
-    if base_class:
-        query = query.filter(Article.base_class == base_class)
-    if audience:
-        query = query.filter(Article.audience == audience)
-    if audience_city_id:
-        query = query.filter(Article.audience_city_id == audience_city_id)
-    elif city_ids:
-        query = query.filter(Article.audience_city_id.in_(city_ids))
-    if audience_course:
-        query = query.filter(Article.audience_course == audience_course)
-    if audience_admission_year_id:
-        query = query.filter(Article.audience_admission_year_id == audience_admission_year_id)
-    elif admission_year_ids:
-        query = query.filter(Article.audience_admission_year_id.in_(admission_year_ids))
-    if education_mode:
-        query = query.filter(Article.education_mode == education_mode)
-    if speciality_id:
-        query = query.filter(Article.speciality_id == speciality_id)
-
-    # Enforce strict audience if requested (exclude fully general posts)
-    if strict_audience:
-        from sqlalchemy import and_
-        query = query.filter(
-            and_(Article.audience.isnot(None), Article.audience != 'all')
-        )
-
-    # View toggle: 'common' shows only general posts; 'city' shows only city-targeted
-    if view == 'common':
-        query = query.filter(or_(Article.audience.is_(None), Article.audience == 'all'))
-    elif view == 'city':
-        query = query.filter(Article.audience == 'city')
-    # If city filter provided, include city-targeted or general
-    elif audience_city_id or city_ids:
-        query = query.filter(or_(Article.audience == 'city', Article.audience == 'all'))
+    # Audience filters: app/targeting.py (institution type via the article's speciality)
+    query = query.filter(*plan_for(AudienceQuery(
+        audience=audience or None,
+        audience_city_ids=(audience_city_id,) if audience_city_id else tuple(city_ids),
+        audience_course=audience_course,
+        base_class=base_class,
+        education_form_ids=(education_form_id,) if education_form_id else tuple(education_form_ids),
+        speciality_ids=(speciality_id,) if speciality_id else tuple(speciality_ids),
+        admission_year_ids=(audience_admission_year_id,) if audience_admission_year_id else tuple(admission_year_ids),
+        education_mode=education_mode or None,
+        institution_type_ids=(institution_type_id,) if institution_type_id else tuple(institution_type_ids),
+        strict_audience=bool(strict_audience),
+        view=view,
+    )).conditions)
 
     # Sorting
     sort_map = {
@@ -260,18 +236,23 @@ def get_articles():
     }), 200
 
 @articles_bp.route('/<int:article_id>', methods=['GET'])
+@use_pool('primary')  # records a view; a replica read would write back a stale counter
 def get_article(article_id):
     """Get a specific article by ID"""
     article = Article.query.get_or_404(article_id)
 
     # Increment views metric (anonymous allowed)
     try:
-        from app.models import ArticleView
         view = ArticleView(article_id=article.id, user_id=None)
         db.session.add(view)
-        # in-place counter to avoid heavy count()
-        if hasattr(article, 'views_count'):
-            article.views_count = (article.views_count or 0) + 1
+        # in-place counter to avoid heavy count(), incremented in SQL so concurrent views are not lost.
+        # Core execute on the session's connection skips the ORM hooks that purge the response
+        # cache / bitmap index. Cached lists (/api/filters/articles) render views_count and keep
+        # the cached value until the entry expires, as with IGNORED_COLUMNS in app/response_cache.py.
+        db.session.connection(bind_arguments={'mapper': Article}).execute(
+            update(Article.__table__).where(Article.__table__.c.id == article.id)
+            .values(views_count=func.coalesce(Article.__table__.c.views_count, 0) + 1)
+        )
         db.session.commit()
     except Exception:
         db.session.rollback()
@@ -318,17 +299,8 @@ def get_article(article_id):
             'email': author.user.email
         })
 
-    # Get media
-    media = []
-    for media_link in article.media_links:
-        media.append({
-            'id': media_link.media.id,
-            'media_type': media_link.media.media_type,
-            'file_name': media_link.media.file_name,
-            'mime_type': media_link.media.mime_type,
-            'caption': media_link.media.caption,
-            'position': media_link.position
-        })
+    # Get media (metadata only; blobs stay in the DB)
+    media = load_article_media([article.id])[article.id]
 
     article_data = {
         'id': article.id,
@@ -516,21 +488,7 @@ def create_article():
                 resolved_city_id = requested_city_id
         if resolved_city_id is None and isinstance(publish_scope.get('city_key'), str):
             city_key = publish_scope.get('city_key')
-            # map common keys to russian names used in cities table
-            key_to_name = {
-                'nsk': 'Новосибирск',
-                'spb': 'Санкт-Петербург',
-                'msk': 'Москва',
-                'ekb': 'Екатеринбург',
-                'krd': 'Краснодар',
-                'rnd': 'Ростов-на-Дону',
-            }
-            target_name = key_to_name.get(city_key)
-            if target_name:
-                from sqlalchemy import func
-                c = City.query.filter(func.lower(City.name) == func.lower(target_name)).first()
-                if c:
-                    resolved_city_id = c.id
+            resolved_city_id = get_key_registry().city_id(city_key)
     except Exception:
         resolved_city_id = None
 
@@ -847,65 +805,8 @@ def publish_article(article_id):
         return jsonify({'error': 'Failed to publish article'}), 500
 
 
-@articles_bp.route('/import/weeek', methods=['POST'])
-@jwt_required()
-def import_from_weeek():
-    """Import articles from Weeek share link using provided API key.
-    Request JSON: { url: string, api_key?: string }
-    Creates draft articles with tag 'imported'.
-    """
-    user_id = int(get_jwt_identity())
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
-
-    data = request.get_json(silent=True) or {}
-    share_url = data.get('url')
-    api_key = data.get('api_key') or request.headers.get('X-WEEEK-API-KEY')
-    if not share_url or not api_key:
-        return jsonify({'error': 'url and api_key are required'}), 400
-
-    try:
-        # Minimal fetch. In real Weeek API you would call their REST to list pages.
-        # Here we GET the shared document as HTML and extract sections into articles.
-        res = requests.get(share_url, timeout=15)
-        if res.status_code >= 400:
-            return jsonify({'error': 'Failed to fetch from Weeek', 'status': res.status_code}), 502
-        html = res.text or ''
-
-        # Naive split by <section ... id="..."> as separate articles
-        import re as _re
-        chunks = _re.split(r'<section[^>]*id="([^"]+)"[^>]*>', html)
-        created_ids = []
-        # chunks format: [before, id1, rest1, id2, rest2, ...]
-        for i in range(1, len(chunks), 2):
-            sec_id = chunks[i]
-            sec_html = chunks[i+1] if (i+1) < len(chunks) else ''
-            # Title from first h2/h1
-            m = _re.search(r'<h[12][^>]*>(.*?)</h[12]>', sec_html, _re.IGNORECASE | _re.DOTALL)
-            title = _re.sub(r'<[^>]+>', '', m.group(1)).strip() if m else f'Imported {sec_id}'
-
-            article = Article(
-                title=title[:255] or 'Imported',
-                content=sec_html,
-                is_published=False,
-                is_for_staff=False,
-                is_actual=False,
-                tag='imported',
-                audience=None,
-            )
-            try:
-                db.session.add(article)
-                db.session.flush()
-                db.session.add(ArticleAuthor(article_id=article.id, user_id=user.id))
-                created_ids.append(article.id)
-            except Exception:
-                db.session.rollback()
-        db.session.commit()
-        return jsonify({ 'imported_count': len(created_ids), 'article_ids': created_ids }), 201
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': 'Import failed'}), 500
+# Rarely used: the implementation (and `requests`) is imported on first call
+articles_bp.add_url_rule('/import/weeek', view_func=LazyView('app.articles.weeek.import_from_weeek'), methods=['POST'])
 
 @articles_bp.route('/<int:article_id>/unpublish', methods=['POST'])
 @jwt_required()
@@ -943,6 +844,7 @@ def unpublish_article(article_id):
         return jsonify({'error': 'Failed to unpublish article'}), 500
 
 @articles_bp.route('/<int:article_id>/reactions', methods=['GET'])
+@cached('reactions', 'article:{article_id}')
 def list_reactions(article_id):
     article = Article.query.get_or_404(article_id)
     reactions = ArticleReaction.query.filter_by(article_id=article.id).all()
@@ -1013,12 +915,14 @@ def publish_for_all(article_id):
         return jsonify({'error': 'Failed to set audience'}), 500
 
 @articles_bp.route('/student-feed', methods=['GET'])
+@cached('articles', 'group:{group_id}', 'lookups')
 def student_feed():
     """Return feed tailored for a student group context.
     Query: group_id (required), course (optional), page/per_page
     Includes articles with audience='all' or targeted entries matching student's context.
+    Optional: courses, speciality_ids, education_form_ids, admission_year_ids (narrow the
+    group's values), filter_group_ids (articles linked via ArticleFilter).
     """
-    from sqlalchemy import and_
     group_id = request.args.get('group_id', type=int)
     course = request.args.get('course', type=int)
     # Optional arrays from request (student context)
@@ -1027,11 +931,11 @@ def student_feed():
             return [int(x) for x in request.args.getlist(name) if str(x).isdigit()]
         except Exception:
             return []
-    req_city_ids = _to_ints('city_ids')
     req_courses = _to_ints('courses')
     req_spec_ids = _to_ints('speciality_ids')
     req_form_ids = _to_ints('education_form_ids')
     req_year_ids = _to_ints('admission_year_ids')
+    req_filter_group_ids = _to_ints('filter_group_ids')
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     if not group_id:
@@ -1051,98 +955,37 @@ def student_feed():
                 base_class = int(sc.name)
     except Exception:
         base_class = base_class
-    edu_mode = None
     education_form_id = getattr(group, 'education_form_id', None)
     student_inst_type_id = getattr(group, 'institution_type_id', None)
 
-    query = Article.query.filter(Article.is_published.is_(True))
-
-    # Targeting logic per diagram:
-    # - Always include audience 'all'
-    # - If city present, include city targeted
-    # - If course provided, include course targeted
-    # - School case: if group has school_class, allow class-only filtering via additional constraints below
-    conds = [Article.audience == 'all']
-    if city_id:
-        conds.append(and_(Article.audience == 'city', Article.audience_city_id == city_id))
-    if course:
-        conds.append(and_(Article.audience == 'course', Article.audience_course == course))
-    query = query.filter(or_(*conds))
-
-    # Additional constraints: if article specified a field, it must match student's context.
-    # Apply unconditionally to avoid leaking targeted posts into unrelated institutions.
-    query = query.filter(or_(Article.base_class.is_(None), Article.base_class == base_class))
-    query = query.filter(or_(Article.speciality_id.is_(None), Article.speciality_id == speciality_id))
-    query = query.filter(or_(Article.education_form_id.is_(None), Article.education_form_id == education_form_id))
-    query = query.filter(or_(Article.audience_admission_year_id.is_(None), Article.audience_admission_year_id == admission_year_id))
-    query = query.filter(or_(Article.education_mode.is_(None), Article.education_mode == edu_mode))
-
-    # Institution hard constraint: targeted posts must not leak across institution types.
-    # If article is targeted (audience != 'all' or any audience_* set), enforce institution match
-    if student_inst_type_id is not None:
-        from sqlalchemy import exists, select
-        AC = ArticleCategory
-        Cat = Category
-        G = Group
-        targeted = or_(
-            Article.audience.isnot(None),
-            Article.base_class.isnot(None),
-            Article.speciality_id.isnot(None),
-            Article.education_form_id.isnot(None),
-            Article.audience_admission_year_id.isnot(None)
-        )
-        query = query.filter(
-            or_(
-                ~targeted,
-                exists(
-                    select(1)
-                    .select_from(AC)
-                    .join(Cat, AC.category_id == Cat.id)
-                    .join(G, Cat.group_id == G.id)
-                    .where(AC.article_id == Article.id, G.institution_type_id == student_inst_type_id)
-                )
-            )
-        )
-
-    # Fetch candidates and apply array-based student context matching
-    query = query.order_by(desc(Article.created_at))
-    candidates = query.all()
-
-    student_city_ids = req_city_ids or ([city_id] if city_id else [])
+    # Targeting rules (legacy audience fields, filter_path, ArticleFilter): app/targeting.py
     student_courses = req_courses or ([course] if course else [])
-    student_spec_ids = req_spec_ids or ([speciality_id] if speciality_id else [])
-    student_form_ids = req_form_ids or ([education_form_id] if education_form_id else [])
-    student_year_ids = req_year_ids or ([admission_year_id] if admission_year_id else [])
-    student_base_classes = ([base_class] if base_class is not None else [])
-
-    def _matches(a: Article) -> bool:
-        # audience checks were already applied for city/course. Here enforce arrays if present in article
-        if a.base_class is not None and student_base_classes and a.base_class not in student_base_classes:
-            return False
-        if a.speciality_id is not None and student_spec_ids and a.speciality_id not in student_spec_ids:
-            return False
-        if a.education_form_id is not None and student_form_ids and a.education_form_id not in student_form_ids:
-            return False
-        if a.audience_admission_year_id is not None and student_year_ids and a.audience_admission_year_id not in student_year_ids:
-            return False
-        # audience_courses JSON array
-        try:
-            import json as _json
-            arr = _json.loads(a.audience_courses or 'null')
-            if isinstance(arr, list) and student_courses:
-                if not any((isinstance(x, int) and x in student_courses) for x in arr):
-                    return False
-        except Exception:
-            pass
-        return True
-
-    filtered = [a for a in candidates if _matches(a)]
-
-    # manual pagination
-    total = len(filtered)
+    plan = plan_for(StudentContext(
+        city_id=city_id,
+        city_key=get_key_registry().city_key(city_id) if city_id else None,
+        course=course,
+        base_class=base_class,
+        speciality_ids=narrow(speciality_id, req_spec_ids),
+        education_form_ids=narrow(education_form_id, req_form_ids),
+        admission_year_ids=narrow(admission_year_id, req_year_ids),
+        courses=tuple(sorted(set(student_courses))),
+        institution_type_id=student_inst_type_id,
+        filter_group_ids=tuple(sorted(set(req_filter_group_ids))),
+    ))
     start = (page - 1) * per_page
     end = start + per_page
-    page_items = filtered[start:end]
+
+    index = get_bitmap_index() if plan.bitmap is not None else None
+    if index is not None:
+        with index:
+            page_ids, total = index.page(plan.bits(index), offset=start, limit=per_page)
+        by_id = {a.id: a for a in Article.query.filter(Article.id.in_(page_ids)).all()} if page_ids else {}
+        page_items = [by_id[i] for i in page_ids if i in by_id]
+    else:
+        query = Article.query.filter(*plan.conditions)
+        total = query.with_entities(func.count(Article.id)).scalar()
+        page_items = (query.order_by(desc(Article.created_at), desc(Article.id))
+                      .offset(start).limit(per_page).all())
 
     items = []
     for article in page_items:
@@ -1174,6 +1017,7 @@ def student_feed():
     }), 200
 
 @articles_bp.route('/bulk', methods=['POST'])
+@use_pool('bulk')
 @jwt_required()
 def create_articles_bulk():
     """Create multiple articles across selected dimensions.
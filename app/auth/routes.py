@@ -5,7 +5,6 @@ from app.models import User, Role, AdminSession, EditLock
 from app.models import InstitutionType, EducationForm, Speciality, AdmissionYear, City, SchoolClass, Group
 from app import db, bcrypt
 import re
-from email_validator import validate_email, EmailNotValidError
 import secrets
 from datetime import datetime
 
@@ -147,6 +146,7 @@ def register():
     role_id = data['role_id']
     
     # Validate email
+    from email_validator import validate_email, EmailNotValidError  # slow import, deferred
     try:
         validate_email(email)
     except EmailNotValidError:
@@ -242,6 +242,7 @@ def update_profile():
     # Update fields if provided
     if 'email' in data:
         email = data['email'].lower().strip()
+        from email_validator import validate_email, EmailNotValidError  # slow import, deferred
         try:
             validate_email(email)
         except EmailNotValidError:
@@ -0,0 +1,399 @@
+"""In-process bitmap index over published articles for audience/filter targeting.
+
+The targeting dimensions (audience, audience city/course, base class,
+speciality, education form, admission year, education mode, audience_courses,
+institution type via categories, filter_path keys) have low cardinality, so
+every (dimension, value) pair gets a bitmap of the published articles that
+carry it and a targeting rule becomes a handful of AND/OR operations. The
+bitmaps are plain Python ints: no extra dependency, and `&`, `|`, `~` and
+`int.bit_count()` run in C over the whole set.
+
+Bit positions are slots in (created_at, id) order rather than article ids,
+so "newest first" is "highest bits first": a page is read off the top of
+the result bitmap and a keyset cursor is a mask of the bits below its slot.
+The database then only fetches the rows of the final page. The targeting
+rules themselves live in app/targeting.py (`TargetingPlan.bits`).
+
+Freshness:
+  * commits in this process mark the touched articles (ORM flushes and
+    ORM-enabled bulk DML on articles / article_categories) and the next
+    lookup re-reads just those rows; writes to groups and categories, or
+    bulk DML without primary keys, schedule a full rebuild;
+  * every BITMAP_INDEX_REFRESH_SECONDS the index catches up on articles
+    updated in other workers (updated_at watermark) and rebuilds if the
+    published count no longer matches (deletes);
+  * a full rebuild runs at least every REBUILD_SECONDS.
+An article whose created_at sorts before the newest slot (a backdated new
+article, an edited created_at) cannot take an existing slot and also
+triggers a rebuild. Rebuilds read into a fresh index on a background thread
+and are swapped in when done, so requests keep serving the current bitmaps
+meanwhile; only the first build of a process runs inside a request.
+
+Enabled with BITMAP_INDEX=1; memory is about max(published) / 8 bytes per
+distinct dimension value.
+"""
+import json
+import re
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+
+from sqlalchemy import event, func, inspect, select
+
+from app.db_pool import RoutingSession
+
+REBUILD_SECONDS = 300
+FP_DIMENSIONS = ('fp_city', 'fp_institution_type', 'fp_program', 'fp_course', 'fp_form')
+# Single-valued article columns indexed as-is (None is a value too: "not targeted on this field")
+COLUMN_DIMENSIONS = (
+    'audience', 'audience_city_id', 'audience_course', 'base_class', 'speciality_id',
+    'education_form_id', 'audience_admission_year_id', 'education_mode',
+) + FP_DIMENSIONS
+# Article columns whose change requires re-indexing the row
+INDEXED_COLUMNS = frozenset(COLUMN_DIMENSIONS) | {'is_published', 'created_at', 'audience_courses', 'filter_path'}
+# Tables whose writes change institution types reachable through categories
+REBUILD_TABLES = frozenset({'groupss', 'categories'})
+
+# Attributes replaced as a whole when a rebuilt index is swapped in
+_STATE = ('published', 'bitmaps', 'slot_of', 'slot_ids', 'slot_keys', 'entries', 'watermark')
+
+_NONZERO = re.compile(rb'[^\x00]')
+_BIT_COUNTS = bytes(bin(b).count('1') for b in range(256))
+
+
+def _sort_key(created_at, article_id):
+    return (created_at or datetime.min, article_id)
+
+
+def _audience_courses(raw):
+    """Course numbers of the audience_courses JSON array; None when the article has no array"""
+    try:
+        value = json.loads(raw or 'null')
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(value, list):
+        return None
+    return {x for x in value if isinstance(x, int) and not isinstance(x, bool)}
+
+
+class BitmapIndex:
+    """Bitmaps per (dimension, value) over published articles; see module docstring"""
+
+    def __init__(self, refresh_seconds: float = 5.0):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._stale = True
+        self._building = False
+        self._checked_at = 0.0
+        self._built_at = 0.0
+        self._reset()
+
+    def _reset(self):
+        self.published = 0
+        self.bitmaps = {}       # (dimension, value) -> int
+        self.slot_of = {}       # article id -> slot
+        self.slot_ids = []      # slot -> article id
+        self.slot_keys = []     # slot -> (created_at, id), ascending
+        self.entries = {}       # article id -> (dimension, value) pairs it is set in
+        self.watermark = None   # max(updated_at) seen
+
+    # -- lookups (hold the index: `with index:`) ---------------------------
+
+    def __enter__(self):
+        self._lock.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+    def member(self, dimension: str, value) -> int:
+        return self.bitmaps.get((dimension, value), 0)
+
+    def any_of(self, dimension: str, values) -> int:
+        bits = 0
+        for value in values:
+            bits |= self.bitmaps.get((dimension, value), 0)
+        return bits
+
+    def page(self, bits: int, offset: int = 0, limit: int = 20, before=None):
+        """(article ids newest first, total) of `bits`; `before` is a (created_at, id) keyset cursor"""
+        # total counts the whole match, not what is left after the cursor
+        total = bits.bit_count()
+        if before is not None:
+            slot = bisect_left(self.slot_keys, _sort_key(*before))
+            bits &= (1 << slot) - 1
+        wanted = offset + limit
+        if not bits or offset >= bits.bit_count() or limit <= 0:
+            return [], total
+        data = bits.to_bytes((bits.bit_length() + 7) // 8, 'big')
+        top = len(data) - 1
+        slots, seen = [], 0
+        for match in _NONZERO.finditer(data):
+            byte = data[match.start()]
+            count = _BIT_COUNTS[byte]
+            if seen + count <= offset:
+                seen += count
+                continue
+            base = (top - match.start()) * 8
+            for bit in range(7, -1, -1):
+                if byte >> bit & 1:
+                    if seen >= offset:
+                        slots.append(base + bit)
+                    seen += 1
+                    if seen >= wanted:
+                        break
+            if seen >= wanted:
+                break
+        return [self.slot_ids[s] for s in slots], total
+
+    # -- maintenance -----------------------------------------------------
+
+    def invalidate(self, article_ids=(), rebuild: bool = False):
+        with self._lock:
+            if rebuild:
+                self._stale = True
+            self._pending.update(article_ids)
+
+    def sync(self, session, app=None):
+        """Bring the bitmaps up to date before a lookup (called per request, cheap when current)"""
+        now = time.monotonic()
+        with self._lock:
+            if not self._built_at:
+                # nothing to serve yet: the first build runs here
+                self._stale = False
+                self._swap(self._build(session), now)
+                return
+            if (self._stale or now - self._built_at >= REBUILD_SECONDS) and not self._building:
+                self._start_rebuild(app)
+            if now - self._checked_at >= self.refresh_seconds and not self._building:
+                # skipped during a build: the swap resets the watermark and the published count
+                self._checked_at = now
+                self._catch_up(session)
+            if self._pending and not self._stale and not self._building:
+                # held during a build: the ids go to the swapped-in bitmaps, which may not have
+                # read them (category edits do not move updated_at, so catch-up misses them)
+                ids, self._pending = self._pending, set()
+                self._apply(session, ids)
+
+    def _build(self, session) -> 'BitmapIndex':
+        """A fresh index read from the database; touches no state of this one"""
+        from app.models import Article
+        fresh = BitmapIndex(self.refresh_seconds)
+        # watermark first: rows updated while the build reads are caught up afterwards
+        fresh.watermark = session.execute(select(func.max(Article.updated_at))).scalar()
+        rows = session.execute(fresh._rows_query().where(Article.is_published.is_(True))).all()
+        inst_types = fresh._institution_types(session, None)
+        for row in sorted(rows, key=lambda r: _sort_key(r.created_at, r.id)):
+            fresh._assign_slot(row.id, _sort_key(row.created_at, row.id))
+            fresh._set(row, inst_types.get(row.id, ()))
+        return fresh
+
+    def _swap(self, fresh, now):
+        # _pending is kept: ids invalidated during the build are applied to the new bitmaps on the next sync
+        for name in _STATE:
+            setattr(self, name, getattr(fresh, name))
+        self._built_at = self._checked_at = now
+
+    def _start_rebuild(self, app):
+        from flask import current_app
+        app = app or current_app._get_current_object()
+        # cleared now, so a rebuild requested while this one reads schedules another
+        self._stale = False
+        self._building = True
+        threading.Thread(target=self._rebuild, args=(app,), name='bitmap-index-rebuild', daemon=True).start()
+
+    def _rebuild(self, app):
+        from app import db
+        try:
+            with app.app_context():
+                fresh = self._build(db.session)
+            with self._lock:
+                self._swap(fresh, time.monotonic())
+        except Exception:
+            app.logger.exception('bitmap index rebuild failed')
+            with self._lock:
+                self._stale = True
+        finally:
+            self._building = False
+
+    def _catch_up(self, session):
+        from app.models import Article
+        published = session.execute(
+            select(func.count(Article.id)).where(Article.is_published.is_(True))
+        ).scalar() or 0
+        if self.watermark is not None:
+            changed = session.execute(
+                select(Article.id, Article.updated_at).where(Article.updated_at >= self.watermark)
+            ).all()
+            for article_id, updated_at in changed:
+                self._pending.add(article_id)
+                if updated_at is not None and updated_at > self.watermark:
+                    self.watermark = updated_at
+        if self._pending:
+            ids, self._pending = self._pending, set()
+            self._apply(session, ids)
+        if published != self.published.bit_count():
+            self._stale = True  # rows deleted (or changed) without passing through this process
+
+    def _apply(self, session, article_ids):
+        from app.models import Article
+        ids = sorted(article_ids)
+        rows = {row.id: row for row in session.execute(
+            self._rows_query().where(Article.id.in_(ids), Article.is_published.is_(True))
+        )}
+        inst_types = self._institution_types(session, ids)
+        for article_id in ids:
+            self._clear(article_id)
+            row = rows.get(article_id)
+            if row is None:
+                continue  # unpublished or deleted
+            key = _sort_key(row.created_at, row.id)
+            slot = self.slot_of.get(article_id)
+            if slot is not None and self.slot_keys[slot] != key:
+                self._stale = True  # created_at changed: slots must be reassigned
+                return
+            if slot is None and self.slot_keys and key < self.slot_keys[-1]:
+                self._stale = True  # older than the newest slot: no free position in order
+                return
+            if slot is None:
+                self._assign_slot(article_id, key)
+            self._set(row, inst_types.get(article_id, ()))
+
+    @staticmethod
+    def _rows_query():
+        from app.models import Article
+        return select(
+            Article.id, Article.created_at, Article.audience_courses,
+            *[getattr(Article, name) for name in COLUMN_DIMENSIONS],
+        )
+
+    @staticmethod
+    def _institution_types(session, article_ids):
+        """{article id: institution type ids of the groups its categories belong to}"""
+        from app.models import Article, ArticleCategory, Category, Group
+        query = (
+            select(ArticleCategory.article_id, Group.institution_type_id)
+            .join(Category, ArticleCategory.category_id == Category.id)
+            .join(Group, Category.group_id == Group.id)
+            .where(Group.institution_type_id.isnot(None))
+        )
+        if article_ids is None:
+            query = query.join(Article, ArticleCategory.article_id == Article.id).where(Article.is_published.is_(True))
+        else:
+            query = query.where(ArticleCategory.article_id.in_(article_ids))
+        result = {}
+        for article_id, inst_type_id in session.execute(query):
+            result.setdefault(article_id, set()).add(inst_type_id)
+        return result
+
+    def _assign_slot(self, article_id, key):
+        self.slot_of[article_id] = len(self.slot_ids)
+        self.slot_ids.append(article_id)
+        self.slot_keys.append(key)
+
+    def _set(self, row, inst_types):
+        bit = 1 << self.slot_of[row.id]
+        entries = [(name, getattr(row, name)) for name in COLUMN_DIMENSIONS]
+        courses = _audience_courses(row.audience_courses)
+        entries += [('audience_courses', c) for c in courses] if courses is not None else [('audience_courses', None)]
+        entries += [('institution_type_id', t) for t in inst_types]
+        if (row.audience is not None or row.base_class is not None or row.speciality_id is not None
+                or row.education_form_id is not None or row.audience_admission_year_id is not None):
+            entries.append(('targeted', True))
+        for entry in entries:
+            self.bitmaps[entry] = self.bitmaps.get(entry, 0) | bit
+        self.entries[row.id] = entries
+        self.published |= bit
+
+    def _clear(self, article_id):
+        entries = self.entries.pop(article_id, None)
+        if entries is None:
+            return
+        mask = ~(1 << self.slot_of[article_id])
+        for entry in entries:
+            bits = self.bitmaps[entry] & mask
+            if bits:
+                self.bitmaps[entry] = bits
+            else:
+                del self.bitmaps[entry]
+        self.published &= mask
+
+
+def get_bitmap_index(app=None):
+    """The app's index, synced and ready, or None when BITMAP_INDEX is off"""
+    from flask import current_app
+    from app import db
+    app = app or current_app
+    if not app.config.get('BITMAP_INDEX'):
+        return None
+    index = app.extensions.get('kb_bitmap_index')
+    if index is None:
+        index = app.extensions.setdefault(
+            'kb_bitmap_index', BitmapIndex(app.config.get('BITMAP_INDEX_REFRESH_SECONDS', 5.0)),
+        )
+    index.sync(db.session, app)
+    return index
+
+
+def _pending(session):
+    return session.info.setdefault('bitmap_index_changes', {'ids': set(), 'rebuild': False})
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _collect_flushed(session, flush_context):
+    changes = None
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table == 'articles':
+            if obj in session.dirty:
+                changed = {attr.key for attr in inspect(obj).attrs if attr.history.has_changes()}
+                if not changed & INDEXED_COLUMNS:
+                    continue  # e.g. a views_count bump
+            changes = changes or _pending(session)
+            changes['ids'].add(obj.id)
+        elif table == 'article_categories':
+            changes = changes or _pending(session)
+            changes['ids'].add(obj.article_id)
+        elif table in REBUILD_TABLES:
+            changes = changes or _pending(session)
+            changes['rebuild'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _collect_bulk_dml(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if table is None:
+        return
+    id_column = {'articles': 'id', 'article_categories': 'article_id'}.get(table.name)
+    if id_column is None and table.name not in REBUILD_TABLES:
+        return
+    changes = _pending(orm_execute_state.session)
+    params = orm_execute_state.parameters
+    rows = params if isinstance(params, list) else [params or {}]
+    ids = [row.get(id_column) for row in rows] if id_column else [None]
+    if None in ids:
+        changes['rebuild'] = True  # rows not identified by key (UPDATE ... WHERE, new rows, lookup tables)
+    else:
+        changes['ids'].update(ids)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _invalidate_committed(session):
+    changes = session.info.pop('bitmap_index_changes', None)
+    if not changes:
+        return
+    from flask import current_app, has_app_context
+    if has_app_context():
+        index = current_app.extensions.get('kb_bitmap_index')
+        if index is not None:
+            index.invalidate(changes['ids'], changes['rebuild'])
+
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _forget_rolled_back(session, previous_transaction):
+    if not session.in_transaction():
+        session.info.pop('bitmap_index_changes', None)
@@ -0,0 +1,67 @@
+"""CSV import/export of groups (loaded lazily, see app/lazy.py)."""
+import csv
+import io
+from flask import request, jsonify, Response
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.models import Group, User
+from app import db
+from app.db_pool import use_pool
+
+
+@use_pool('bulk')
+@jwt_required()
+def import_groups_csv():
+    """Import groups from CSV. Columns: display_name,speciality_id,education_form_id,admission_year_id,institution_type_id,school_class_id,city_id"""
+    user_id = int(get_jwt_identity())
+    user = User.query.get(user_id)
+    if not user or user.role.name != 'Администратор':
+        return jsonify({'error': 'Unauthorized'}), 403
+    data = request.get_json() or {}
+    csv_text = (data.get('csv') or '').strip()
+    if not csv_text:
+        return jsonify({'error': 'csv is required'}), 400
+    reader = csv.DictReader(io.StringIO(csv_text))
+    created = 0
+    skipped = 0
+    for row in reader:
+        name = (row.get('display_name') or '').strip()
+        if not name:
+            skipped += 1
+            continue
+        if Group.query.filter_by(display_name=name).first():
+            skipped += 1
+            continue
+        g = Group(
+            display_name=name,
+            speciality_id=int(row['speciality_id']) if row.get('speciality_id') else None,
+            education_form_id=int(row['education_form_id']) if row.get('education_form_id') else None,
+            admission_year_id=int(row['admission_year_id']) if row.get('admission_year_id') else None,
+            institution_type_id=int(row['institution_type_id']) if row.get('institution_type_id') else None,
+            school_class_id=int(row['school_class_id']) if row.get('school_class_id') else None,
+            city_id=int(row['city_id']) if row.get('city_id') else None,
+        )
+        db.session.add(g)
+        created += 1
+    try:
+        if created:
+            db.session.commit()
+        return jsonify({'created': created, 'skipped': skipped}), 200
+    except Exception:
+        db.session.rollback()
+        return jsonify({'error': 'Import failed'}), 500
+
+@use_pool('bulk')
+@jwt_required()
+def export_groups_csv():
+    """Export groups to CSV."""
+    user_id = int(get_jwt_identity())
+    user = User.query.get(user_id)
+    if not user or user.role.name != 'Администратор':
+        return jsonify({'error': 'Unauthorized'}), 403
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['display_name','speciality_id','education_form_id','admission_year_id','institution_type_id','school_class_id','city_id','base_class'])
+    for g in Group.query.order_by(Group.display_name.asc()).all():
+        writer.writerow([g.display_name, g.speciality_id, g.education_form_id, g.admission_year_id, g.institution_type_id, g.school_class_id, g.city_id, getattr(g, 'base_class', None)])
+    csv_data = output.getvalue()
+    return Response(csv_data, mimetype='text/csv', headers={'Content-Disposition': 'attachment; filename=groups.csv'})
@@ -1,12 +1,15 @@
-from flask import request, jsonify, Response
+from flask import request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.categories import categories_bp
 from app.models import TopCategory, Subcategory, Category, Group, InstitutionType, Speciality, EducationForm, AdmissionYear, City, SchoolClass, User, ArticleCategory
 from app import db
 import re
 from datetime import datetime
+from app.lazy import LazyView
+from app.response_cache import cached
 
 @categories_bp.route('/top-categories', methods=['GET'])
+@cached('lookups')
 def get_top_categories():
     """Get all top categories"""
     top_categories = TopCategory.query.all()
@@ -174,6 +177,7 @@ def delete_top_category(category_id):
         return jsonify({'error': 'Failed to delete top category'}), 500
 
 @categories_bp.route('/subcategories', methods=['GET'])
+@cached('lookups')
 def get_subcategories():
     """Get subcategories with optional top category filter"""
     top_category_id = request.args.get('top_category_id', type=int)
@@ -351,6 +355,7 @@ def delete_subcategory(subcategory_id):
         return jsonify({'error': 'Failed to delete subcategory'}), 500
 
 @categories_bp.route('/groups', methods=['GET'])
+@cached('groups', 'lookups')
 def get_groups():
     """Get groups with filtering options.
     Rules:
@@ -471,6 +476,7 @@ def delete_group(group_id):
         return jsonify({'error': 'Failed to delete group'}), 500
 
 @categories_bp.route('/groups/<int:group_id>', methods=['GET'])
+@cached('group:{group_id}', 'lookups')
 def get_group(group_id):
     group = Group.query.get_or_404(group_id)
     data = {
@@ -502,65 +508,9 @@ def get_group(group_id):
     }
     return jsonify(data), 200
 
-@categories_bp.route('/groups/import', methods=['POST'])
-@jwt_required()
-def import_groups_csv():
-    """Import groups from CSV. Columns: display_name,speciality_id,education_form_id,admission_year_id,institution_type_id,school_class_id,city_id"""
-    user_id = int(get_jwt_identity())
-    user = User.query.get(user_id)
-    if not user or user.role.name != 'Администратор':
-        return jsonify({'error': 'Unauthorized'}), 403
-    data = request.get_json() or {}
-    csv_text = (data.get('csv') or '').strip()
-    if not csv_text:
-        return jsonify({'error': 'csv is required'}), 400
-    import csv, io
-    reader = csv.DictReader(io.StringIO(csv_text))
-    created = 0
-    skipped = 0
-    for row in reader:
-        name = (row.get('display_name') or '').strip()
-        if not name:
-            skipped += 1
-            continue
-        if Group.query.filter_by(display_name=name).first():
-            skipped += 1
-            continue
-        g = Group(
-            display_name=name,
-            speciality_id=int(row['speciality_id']) if row.get('speciality_id') else None,
-            education_form_id=int(row['education_form_id']) if row.get('education_form_id') else None,
-            admission_year_id=int(row['admission_year_id']) if row.get('admission_year_id') else None,
-            institution_type_id=int(row['institution_type_id']) if row.get('institution_type_id') else None,
-            school_class_id=int(row['school_class_id']) if row.get('school_class_id') else None,
-            city_id=int(row['city_id']) if row.get('city_id') else None,
-        )
-        db.session.add(g)
-        created += 1
-    try:
-        if created:
-            db.session.commit()
-        return jsonify({'created': created, 'skipped': skipped}), 200
-    except Exception:
-        db.session.rollback()
-        return jsonify({'error': 'Import failed'}), 500
-
-@categories_bp.route('/groups/export', methods=['GET'])
-@jwt_required()
-def export_groups_csv():
-    """Export groups to CSV."""
-    user_id = int(get_jwt_identity())
-    user = User.query.get(user_id)
-    if not user or user.role.name != 'Администратор':
-        return jsonify({'error': 'Unauthorized'}), 403
-    import csv, io
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['display_name','speciality_id','education_form_id','admission_year_id','institution_type_id','school_class_id','city_id','base_class'])
-    for g in Group.query.order_by(Group.display_name.asc()).all():
-        writer.writerow([g.display_name, g.speciality_id, g.education_form_id, g.admission_year_id, g.institution_type_id, g.school_class_id, g.city_id, getattr(g, 'base_class', None)])
-    csv_data = output.getvalue()
-    return Response(csv_data, mimetype='text/csv', headers={'Content-Disposition': 'attachment; filename=groups.csv'})
+# Rarely used CSV endpoints: implementation imported on first call
+categories_bp.add_url_rule('/groups/import', view_func=LazyView('app.categories.csv_io.import_groups_csv'), methods=['POST'])
+categories_bp.add_url_rule('/groups/export', view_func=LazyView('app.categories.csv_io.export_groups_csv'), methods=['GET'])
 
 @categories_bp.route('/groups/merge', methods=['POST'])
 @jwt_required()
@@ -850,6 +800,7 @@ def update_group(group_id):
         return jsonify({'error':'Failed to update group'}), 500
 
 @categories_bp.route('/cities', methods=['GET'])
+@cached('lookups')
 def get_cities():
     """Get all cities (no authorization required)"""
     cities = City.query.order_by(City.name).all()
@@ -864,6 +815,7 @@ def get_cities():
     return jsonify(cities_data), 200
 
 @categories_bp.route('/specialities', methods=['GET'])
+@cached('lookups')
 def get_specialities():
     """Get all specialities (no authorization required)"""
     institution_type_id = request.args.get('institution_type_id', type=int)
@@ -886,6 +838,7 @@ def get_specialities():
     return jsonify(specialities_data), 200
 
 @categories_bp.route('/education-forms', methods=['GET'])
+@cached('lookups')
 def get_education_forms():
     """Get all education forms (no authorization required)"""
     institution_type_id = request.args.get('institution_type_id', type=int)
@@ -907,6 +860,7 @@ def get_education_forms():
     return jsonify(education_forms_data), 200
 
 @categories_bp.route('/admission-years', methods=['GET'])
+@cached('lookups')
 def get_admission_years():
     """Get all admission years (no authorization required)"""
     institution_type_id = request.args.get('institution_type_id', type=int)
@@ -930,6 +884,7 @@ def get_admission_years():
     return jsonify(admission_years_data), 200
 
 @categories_bp.route('/school-classes', methods=['GET'])
+@cached('lookups')
 def get_school_classes():
     """Get all school classes (no authorization required)"""
     institution_type_id = request.args.get('institution_type_id', type=int)
@@ -951,6 +906,7 @@ def get_school_classes():
     return jsonify(school_classes_data), 200
 
 @categories_bp.route('/institution-types', methods=['GET'])
+@cached('lookups')
 def get_institution_types():
     """Get all institution types (no authorization required)"""
     institution_types = InstitutionType.query.order_by(InstitutionType.name).all()
@@ -966,6 +922,7 @@ def get_institution_types():
 
 # Aggregated audience dictionaries with "all-*" helpers
 @categories_bp.route('/audience/options', methods=['GET'])
+@cached('lookups')
 def get_audience_options():
     """Return audience dictionaries including optional institution filtering.
     Query: ?institution_type_id=ID to scope forms/specialities/years/classes.
@@ -1037,6 +994,7 @@ def get_base_classes():
     return jsonify([9, 11]), 200
 
 @categories_bp.route('/courses', methods=['GET'])
+@cached('lookups')
 def get_courses():
     """Return available course numbers. Prefer institution_type_id rule: college=3, university=4.
     Fallback to ?max= for manual override.
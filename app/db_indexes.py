@@ -0,0 +1,216 @@
+"""Index management: non-blocking builds, INVALID index repair, progress reporting.
+
+Indexes are declared in INDEXES and built by `ensure_indexes()`. On Postgres
+each build runs as `CREATE INDEX CONCURRENTLY` on an AUTOCOMMIT connection,
+so writes to the table continue during the build. A failed or interrupted
+concurrent build leaves an INVALID index behind; it is detected through
+pg_index.indisvalid, dropped CONCURRENTLY and rebuilt. While a build runs, a
+helper thread polls pg_stat_progress_create_index and reports the phase and
+the blocks/tuples done.
+
+On other databases indexes are created with plain CREATE INDEX; specs
+limited to other dialects (e.g. GIN on Postgres) report n/a there and are
+skipped.
+"""
+import threading
+from dataclasses import dataclass
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, text
+
+PROGRESS_INTERVAL_SECONDS = 5.0
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    name: str
+    table: str
+    definition: str                 # everything after "ON <table>", e.g. "(created_at DESC)"
+    postgresql_only: bool = False
+    fallback: str = None            # alternative definition if the first one fails (e.g. text search config)
+    dialects: tuple = None          # limit to these dialect names (postgresql_only == ('postgresql',))
+
+    def applies_to(self, dialect: str) -> bool:
+        if self.dialects:
+            return dialect in self.dialects
+        return dialect == 'postgresql' or not self.postgresql_only
+
+
+INDEXES = [
+    IndexSpec('idx_articles_created_at', 'articles', '(created_at DESC)'),
+    IndexSpec('idx_articles_tag', 'articles', '(tag)'),
+    IndexSpec('idx_articles_audience', 'articles', '(audience)'),
+    IndexSpec('idx_articles_base_class', 'articles', '(base_class)'),
+    IndexSpec('idx_articles_city', 'articles', '(audience_city_id)'),
+    IndexSpec('idx_articles_course', 'articles', '(audience_course)'),
+    # GIN index for JSONB filter_path
+    IndexSpec('idx_articles_filter_path', 'articles', 'USING GIN (filter_path)', postgresql_only=True),
+    # FTS GIN index for title+content (russian); 'simple' if the russian config is not available
+    IndexSpec(
+        'idx_articles_fts', 'articles',
+        "USING GIN (to_tsvector('russian', coalesce(title,'') || ' ' || coalesce(content,'')))",
+        postgresql_only=True,
+        fallback="USING GIN (to_tsvector('simple', coalesce(title,'') || ' ' || coalesce(content,'')))",
+    ),
+]
+
+
+def register_index(spec: IndexSpec):
+    """Declare an additional index (used by modules that own their tables)"""
+    if all(s.name != spec.name for s in INDEXES):
+        INDEXES.append(spec)
+    return spec
+
+
+def index_states(conn) -> dict:
+    """Postgres: {index name: 'valid' | 'invalid'} for the declared indexes"""
+    rows = conn.execute(text(
+        "SELECT c.relname, i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = ANY(:names)"
+    ), {'names': [s.name for s in INDEXES]}).all()
+    return {name: 'valid' if valid else 'invalid' for name, valid in rows}
+
+
+def indexes_need_repair(engine) -> bool:
+    """Postgres: True if a declared index is INVALID or missing (one pg_index read).
+    Elsewhere indexes are built with plain transactional CREATE INDEX and cannot be
+    left half-built, so this is always False."""
+    if engine.dialect.name != 'postgresql':
+        return False
+    with engine.connect() as conn:
+        states = index_states(conn)
+    return any(states.get(s.name) != 'valid' for s in INDEXES if s.applies_to('postgresql'))
+
+
+def index_status(engine) -> list:
+    """[(spec, state)] where state is valid | invalid | missing | n/a"""
+    dialect = engine.dialect.name
+    if dialect == 'postgresql':
+        with engine.connect() as conn:
+            states = index_states(conn)
+        return [(s, states.get(s.name, 'missing') if s.applies_to(dialect) else 'n/a') for s in INDEXES]
+    result = []
+    existing = {}
+    for s in INDEXES:
+        if not s.applies_to(dialect):
+            result.append((s, 'n/a'))
+            continue
+        if s.table not in existing:
+            existing[s.table] = _index_names(engine, s.table)
+        result.append((s, 'valid' if s.name in existing[s.table] else 'missing'))
+    return result
+
+
+def _index_names(engine, table: str) -> set:
+    # Read the catalogs directly: the inspector skips expression / functional indexes
+    with engine.connect() as conn:
+        if engine.dialect.name == 'sqlite':
+            rows = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :t"),
+                                {'t': table})
+        elif engine.dialect.name == 'mysql':
+            rows = conn.execute(text(
+                "SELECT DISTINCT index_name FROM information_schema.statistics "
+                "WHERE table_schema = DATABASE() AND table_name = :t"
+            ), {'t': table})
+        else:
+            insp = inspect(conn)
+            return {ix['name'] for ix in insp.get_indexes(table)} if insp.has_table(table) else set()
+        return {name for (name,) in rows}
+
+
+class _ProgressReporter(threading.Thread):
+    """Polls pg_stat_progress_create_index for the backend building an index"""
+
+    def __init__(self, engine, pid, name, report):
+        super().__init__(name=f'index-progress-{name}', daemon=True)
+        self.engine, self.pid, self.index_name, self.report = engine, pid, name, report
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(PROGRESS_INTERVAL_SECONDS):
+            try:
+                with self.engine.connect() as conn:
+                    row = conn.execute(text(
+                        "SELECT phase, blocks_done, blocks_total, tuples_done, tuples_total, "
+                        "lockers_done, lockers_total FROM pg_stat_progress_create_index WHERE pid = :pid"
+                    ), {'pid': self.pid}).first()
+            except Exception:
+                return
+            if row is None:
+                continue
+            pct = ''
+            if row.blocks_total:
+                pct = f' {100.0 * row.blocks_done / row.blocks_total:.1f}% blocks'
+            elif row.tuples_total:
+                pct = f' {100.0 * row.tuples_done / row.tuples_total:.1f}% tuples'
+            elif row.lockers_total:
+                pct = f' waiting for {row.lockers_total - row.lockers_done} transaction(s)'
+            self.report(f'{self.index_name}: {row.phase}{pct}')
+
+
+def _build_postgresql(engine, spec, state, report):
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        # Concurrent builds wait for older transactions; never let a default timeout kill them midway
+        conn.execute(text('SET statement_timeout = 0'))
+        if state == 'invalid':
+            report(f'{spec.name}: INVALID (left by a failed build), dropping')
+            conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {spec.name}'))
+        pid = conn.execute(text('SELECT pg_backend_pid()')).scalar()
+        reporter = _ProgressReporter(engine, pid, spec.name, report)
+        reporter.start()
+        try:
+            definitions = [d for d in (spec.definition, spec.fallback) if d]
+            for attempt, definition in enumerate(definitions, 1):
+                try:
+                    conn.execute(text(
+                        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {spec.name} ON {spec.table} {definition}'
+                    ))
+                    break
+                except Exception:
+                    # A failed concurrent build leaves an INVALID index; drop it before any retry
+                    conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {spec.name}'))
+                    if attempt == len(definitions):
+                        raise
+        finally:
+            reporter.done.set()
+            reporter.join()
+
+
+def ensure_indexes(engine, names=None, report=None) -> list:
+    """Build missing and repair INVALID declared indexes. Returns the names (re)built."""
+    report = report or (lambda msg: None)
+    built = []
+    for spec, state in index_status(engine):
+        if names and spec.name not in names:
+            continue
+        if state in ('valid', 'n/a'):
+            continue
+        report(f'{spec.name}: {state}, building on {spec.table}')
+        if engine.dialect.name == 'postgresql':
+            _build_postgresql(engine, spec, state, report)
+        else:
+            with engine.begin() as conn:
+                conn.execute(text(f'CREATE INDEX {spec.name} ON {spec.table} {spec.definition}'))
+        report(f'{spec.name}: ready')
+        built.append(spec.name)
+    return built
+
+
+@click.command('index-status')
+@with_appcontext
+def index_status_command():
+    """Show declared indexes and whether they are valid, invalid or missing."""
+    from app import db
+    for spec, state in index_status(db.engine):
+        click.echo(f'{state:<8} {spec.table}.{spec.name}')
+
+
+@click.command('ensure-indexes')
+@click.argument('names', nargs=-1)
+@with_appcontext
+def ensure_indexes_command(names):
+    """Build missing / rebuild INVALID indexes without blocking writes (Postgres: CONCURRENTLY)."""
+    from app import db
+    built = ensure_indexes(db.engine, names=set(names) or None, report=click.echo)
+    click.echo(f'built: {", ".join(built)}' if built else 'all indexes are valid')
@@ -1,152 +1,398 @@
-from sqlalchemy import text
+"""Versioned schema migrations, applied once per database instead of on every boot.
 
+Steps are registered with `@migration(version, name)` and recorded in the
+`schema_migrations` table. `run_startup_migrations` first checks the
+recorded version with a single SELECT and returns immediately when the
+schema is current, so gunicorn workers and one-off scripts (create_admin.py,
+remote_logs.py) no longer issue DDL. Otherwise it takes a database lock
+(Postgres advisory lock / MySQL GET_LOCK) so exactly one process runs
+`create_all()` and the pending steps while the others wait and re-check.
 
-def run_startup_migrations(db):
-    """
-    Minimal, idempotent migrations executed at startup.
-    Adds new Article scope columns if they are missing.
-    Works on Postgres (Neon) and MySQL 8+ using IF NOT EXISTS.
-    """
-    engine = db.engine
-    dialect = engine.url.get_dialect().name  # 'postgresql' | 'mysql' | etc.
+Indexes are not built at worker boot on Postgres/MySQL: gunicorn kills a
+worker that has not booted within its timeout, and a killed CREATE INDEX
+CONCURRENTLY leaves an INVALID index behind. Boot only logs missing or
+INVALID ones (one pg_index read on the fast path); `flask schema-migrate`
+applies the steps and builds indexes and runs as the deploy's release step
+before new workers start (`flask ensure-indexes` repairs indexes alone).
+SQLite databases (local, demo, bench) still build theirs at boot.
 
-    with engine.begin() as conn:
-        if dialect == 'postgresql':
-            statements = [
-                "CREATE EXTENSION IF NOT EXISTS unaccent",
-                "CREATE EXTENSION IF NOT EXISTS pg_trgm",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS views_count INTEGER DEFAULT 0",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS tag VARCHAR(20)",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS base_class INTEGER",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS audience VARCHAR(20)",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS audience_city_id INTEGER",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS audience_course INTEGER",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS audience_admission_year_id INTEGER",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS audience_courses TEXT",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS education_mode VARCHAR(20)",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS education_form_id INTEGER",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS speciality_id INTEGER",
-                # New hierarchical filter columns
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS filter_tree_id INTEGER",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS filter_path JSONB",
-                # Relax NOT NULL on filter_courses.city_id (unconditional safe try)
-                "ALTER TABLE IF EXISTS filter_courses ALTER COLUMN city_id DROP NOT NULL",
-            ]
-            for stmt in statements:
-                conn.execute(text(stmt))
-            # FTS GIN index for title+content (russian); fallback to 'simple' if russian not available
-            try:
-                conn.execute(text(
-                    "CREATE INDEX IF NOT EXISTS idx_articles_fts ON articles USING GIN (to_tsvector('russian', coalesce(title,'') || ' ' || coalesce(content,'')))"
-                ))
-            except Exception:
-                conn.execute(text(
-                    "CREATE INDEX IF NOT EXISTS idx_articles_fts ON articles USING GIN (to_tsvector('simple', coalesce(title,'') || ' ' || coalesce(content,'')))"
-                ))
-            # Helpful btree indexes
-            for idx_stmt in [
-                "CREATE INDEX IF NOT EXISTS idx_articles_created_at ON articles (created_at DESC)",
-                "CREATE INDEX IF NOT EXISTS idx_articles_tag ON articles (tag)",
-                "CREATE INDEX IF NOT EXISTS idx_articles_audience ON articles (audience)",
-                "CREATE INDEX IF NOT EXISTS idx_articles_base_class ON articles (base_class)",
-                "CREATE INDEX IF NOT EXISTS idx_articles_city ON articles (audience_city_id)",
-                "CREATE INDEX IF NOT EXISTS idx_articles_course ON articles (audience_course)",
-                # GIN index for JSONB filter_path
-                "CREATE INDEX IF NOT EXISTS idx_articles_filter_path ON articles USING GIN (filter_path)"
-            ]:
-                try:
-                    conn.execute(text(idx_stmt))
-                except Exception:
-                    pass
-            # Add archive flag and audit table for groups
-            try:
-                conn.execute(text("ALTER TABLE groupss ADD COLUMN IF NOT EXISTS is_archived BOOLEAN DEFAULT FALSE"))
-            except Exception:
-                pass
-            # Add base_class to groups (9 or 11)
-            try:
-                conn.execute(text("ALTER TABLE groupss ADD COLUMN IF NOT EXISTS base_class INTEGER"))
-            except Exception:
-                pass
-            conn.execute(text(
-                """
-                CREATE TABLE IF NOT EXISTS group_audit_logs (
-                  id SERIAL PRIMARY KEY,
-                  group_id INTEGER,
-                  user_id INTEGER,
-                  action VARCHAR(50) NOT NULL,
-                  details TEXT,
-                  created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
-                )
-                """
-            ))
-
-        elif dialect == 'mysql':  # MySQL 8+
-            statements = [
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS views_count INT DEFAULT 0",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS tag VARCHAR(20)",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS base_class INT",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS audience VARCHAR(20)",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS audience_city_id INT",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS audience_course INT",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS audience_admission_year_id INT",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS audience_courses TEXT",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS education_mode VARCHAR(20)",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS education_form_id INT",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS speciality_id INT",
-                # New hierarchical filter columns
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS filter_tree_id INT",
-                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS filter_path JSON",
-                # MySQL: drop NOT NULL if exists
-                "SET @stmt := (SELECT IF((SELECT IS_NULLABLE = 'NO' FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = 'filter_courses' AND COLUMN_NAME = 'city_id' LIMIT 1), 'ALTER TABLE filter_courses MODIFY city_id INT NULL', NULL));",
-                "PREPARE s FROM @stmt; EXECUTE s; DEALLOCATE PREPARE s;",
-            ]
-            for stmt in statements:
-                conn.execute(text(stmt))
-            # Add archive flag and audit table for groups (MySQL)
-            try:
-                conn.execute(text("ALTER TABLE groupss ADD COLUMN IF NOT EXISTS is_archived BOOLEAN DEFAULT FALSE"))
-            except Exception:
-                pass
-            try:
-                conn.execute(text("ALTER TABLE groupss ADD COLUMN IF NOT EXISTS base_class INT"))
-            except Exception:
-                pass
-            conn.execute(text(
-                """
-                CREATE TABLE IF NOT EXISTS group_audit_logs (
-                  id INT AUTO_INCREMENT PRIMARY KEY,
-                  group_id INT,
-                  user_id INT,
-                  action VARCHAR(50) NOT NULL,
-                  details TEXT,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-                """
-            ))
-        else:
-            # Fallback: attempt generic ADD COLUMN, ignore if exists
-            try:
-                conn.execute(text("ALTER TABLE articles ADD COLUMN tag VARCHAR(20)"))
-            except Exception:
-                pass
-            for col_stmt in [
-                "ALTER TABLE articles ADD COLUMN base_class INTEGER",
-                "ALTER TABLE articles ADD COLUMN audience VARCHAR(20)",
-                "ALTER TABLE articles ADD COLUMN audience_city_id INTEGER",
-                "ALTER TABLE articles ADD COLUMN audience_course INTEGER",
-                "ALTER TABLE articles ADD COLUMN audience_admission_year_id INTEGER",
-                "ALTER TABLE articles ADD COLUMN audience_courses TEXT",
-                "ALTER TABLE articles ADD COLUMN education_mode VARCHAR(20)",
-                "ALTER TABLE articles ADD COLUMN speciality_id INTEGER",
-            ]:
-                try:
-                    conn.execute(text(col_stmt))
-                except Exception:
-                    pass
+Steps registered with a `rewrites` check (column type changes, STORED
+generated columns) rewrite the whole table under an exclusive lock. When the
+check is true, boot applies the steps before it and stops there with a
+warning; the rest is applied by `flask schema-migrate`.
+
+Adding a model or column: register a new step with the next version number;
+`create_all()` runs whenever any step is pending, so a new table needs only
+an empty step.
+"""
+import time
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, text
+
+# Arbitrary application-wide key for pg_advisory_lock / GET_LOCK
+MIGRATION_LOCK_KEY = 72410351
+MIGRATION_LOCK_NAME = 'kb_schema_migrations'
+LOCK_TIMEOUT_SECONDS = 600
+# Workers give up well inside gunicorn's 60 s boot timeout; the CLI waits LOCK_TIMEOUT_SECONDS
+BOOT_LOCK_TIMEOUT_SECONDS = 30
+LOCK_POLL_SECONDS = 0.5
+
+MIGRATIONS = []
+
+
+def migration(version: int, name: str, rewrites=None):
+    """Register fn(conn, dialect) as schema step `version`. rewrites(conn, dialect) -> bool
+    tells whether the step would rewrite a table on this database (then it is left to the CLI)."""
+    def decorator(fn):
+        fn.rewrites = rewrites
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return decorator
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+@migration(1, 'baseline: article scope columns, media hash/size/status, group archive, indexes')
+def _baseline(conn, dialect):
+    """Former startup DDL. Idempotent, so databases created before versioning adopt it safely."""
+    if dialect == 'postgresql':
+        statements = [
+            "CREATE EXTENSION IF NOT EXISTS unaccent",
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS views_count INTEGER DEFAULT 0",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS tag VARCHAR(20)",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS base_class INTEGER",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS audience VARCHAR(20)",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS audience_city_id INTEGER",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS audience_course INTEGER",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS audience_admission_year_id INTEGER",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS audience_courses TEXT",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS education_mode VARCHAR(20)",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS education_form_id INTEGER",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS speciality_id INTEGER",
+            # New hierarchical filter columns
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS filter_tree_id INTEGER",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS filter_path JSONB",
+            # Media content hash/size for HTTP caching
+            "ALTER TABLE articles_media ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+            "ALTER TABLE articles_media ADD COLUMN IF NOT EXISTS byte_size INTEGER",
+            "ALTER TABLE articles_media ADD COLUMN IF NOT EXISTS status VARCHAR(20) DEFAULT 'ready'",
+            # Relax NOT NULL on filter_courses.city_id (unconditional safe try)
+            "ALTER TABLE IF EXISTS filter_courses ALTER COLUMN city_id DROP NOT NULL",
+        ]
+        for stmt in statements:
+            conn.execute(text(stmt))
+        # Indexes are built CONCURRENTLY outside this transaction: see app/db_indexes.py
+        # Add archive flag and audit table for groups
+        try:
+            conn.execute(text("ALTER TABLE groupss ADD COLUMN IF NOT EXISTS is_archived BOOLEAN DEFAULT FALSE"))
+        except Exception:
+            pass
+        # Add base_class to groups (9 or 11)
+        try:
+            conn.execute(text("ALTER TABLE groupss ADD COLUMN IF NOT EXISTS base_class INTEGER"))
+        except Exception:
+            pass
+        conn.execute(text(
+            """
+            CREATE TABLE IF NOT EXISTS group_audit_logs (
+              id SERIAL PRIMARY KEY,
+              group_id INTEGER,
+              user_id INTEGER,
+              action VARCHAR(50) NOT NULL,
+              details TEXT,
+              created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
+            )
+            """
+        ))
+
+    elif dialect == 'mysql':  # MySQL 8+
+        statements = [
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS views_count INT DEFAULT 0",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS tag VARCHAR(20)",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS base_class INT",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS audience VARCHAR(20)",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS audience_city_id INT",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS audience_course INT",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS audience_admission_year_id INT",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS audience_courses TEXT",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS education_mode VARCHAR(20)",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS education_form_id INT",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS speciality_id INT",
+            # New hierarchical filter columns
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS filter_tree_id INT",
+            "ALTER TABLE articles ADD COLUMN IF NOT EXISTS filter_path JSON",
+            # Media content hash/size for HTTP caching
+            "ALTER TABLE articles_media ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+            "ALTER TABLE articles_media ADD COLUMN IF NOT EXISTS byte_size INT",
+            "ALTER TABLE articles_media ADD COLUMN IF NOT EXISTS status VARCHAR(20) DEFAULT 'ready'",
+            # MySQL: drop NOT NULL if exists
+            "SET @stmt := (SELECT IF((SELECT IS_NULLABLE = 'NO' FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = 'filter_courses' AND COLUMN_NAME = 'city_id' LIMIT 1), 'ALTER TABLE filter_courses MODIFY city_id INT NULL', NULL));",
+            "PREPARE s FROM @stmt; EXECUTE s; DEALLOCATE PREPARE s;",
+        ]
+        for stmt in statements:
+            conn.execute(text(stmt))
+        # Add archive flag and audit table for groups (MySQL)
+        try:
+            conn.execute(text("ALTER TABLE groupss ADD COLUMN IF NOT EXISTS is_archived BOOLEAN DEFAULT FALSE"))
+        except Exception:
+            pass
+        try:
+            conn.execute(text("ALTER TABLE groupss ADD COLUMN IF NOT EXISTS base_class INT"))
+        except Exception:
+            pass
+        conn.execute(text(
+            """
+            CREATE TABLE IF NOT EXISTS group_audit_logs (
+              id INT AUTO_INCREMENT PRIMARY KEY,
+              group_id INT,
+              user_id INT,
+              action VARCHAR(50) NOT NULL,
+              details TEXT,
+              created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        ))
+    else:
+        # Fallback: attempt generic ADD COLUMN, ignore if exists
+        try:
+            conn.execute(text("ALTER TABLE articles ADD COLUMN tag VARCHAR(20)"))
+        except Exception:
+            pass
+        for col_stmt in [
+            "ALTER TABLE articles ADD COLUMN base_class INTEGER",
+            "ALTER TABLE articles ADD COLUMN audience VARCHAR(20)",
+            "ALTER TABLE articles ADD COLUMN audience_city_id INTEGER",
+            "ALTER TABLE articles ADD COLUMN audience_course INTEGER",
+            "ALTER TABLE articles ADD COLUMN audience_admission_year_id INTEGER",
+            "ALTER TABLE articles ADD COLUMN audience_courses TEXT",
+            "ALTER TABLE articles ADD COLUMN education_mode VARCHAR(20)",
+            "ALTER TABLE articles ADD COLUMN speciality_id INTEGER",
+            "ALTER TABLE articles_media ADD COLUMN content_hash VARCHAR(64)",
+            "ALTER TABLE articles_media ADD COLUMN byte_size INTEGER",
+            "ALTER TABLE articles_media ADD COLUMN status VARCHAR(20) DEFAULT 'ready'",
+        ]:
             try:
-                conn.execute(text("ALTER TABLE groupss ADD COLUMN base_class INTEGER"))
+                conn.execute(text(col_stmt))
             except Exception:
                 pass
+        try:
+            conn.execute(text("ALTER TABLE groupss ADD COLUMN base_class INTEGER"))
+        except Exception:
+            pass
+
+
+@migration(2, 'article indexes managed by app/db_indexes.py (CREATE INDEX CONCURRENTLY)')
+def _managed_indexes(conn, dialect):
+    """No DDL here: `flask schema-migrate` calls ensure_indexes() after the steps."""
+
+
+def _add_column(conn, table: str, column: str, ddl: str):
+    """ALTER TABLE ADD COLUMN unless create_all() already made it (fresh databases)"""
+    if column not in {c['name'] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+
+
+@migration(3, 'filter_trees.version, bumped by every filter write (filter tree snapshots)')
+def _filter_tree_version(conn, dialect):
+    _add_column(conn, 'filter_trees', 'version', 'INTEGER NOT NULL DEFAULT 1')
+
+
+def _filter_path_type(conn, dialect):
+    if dialect != 'postgresql':
+        return None
+    return conn.execute(text(
+        "SELECT data_type FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = 'articles' AND column_name = 'filter_path'"
+    )).scalar()
+
+
+def _missing_filter_path_columns(conn):
+    inspector = inspect(conn)
+    if not inspector.has_table('articles'):
+        return []  # create_all() creates them with the table
+    existing = {c['name'] for c in inspector.get_columns('articles')}
+    return [key for key in ('city', 'institution_type', 'program', 'course', 'form') if f'fp_{key}' not in existing]
+
+
+@migration(4, 'articles.filter_path as JSONB on Postgres (GIN index and @> need jsonb)',
+           rewrites=lambda conn, dialect: _filter_path_type(conn, dialect) == 'json')
+def _filter_path_jsonb(conn, dialect):
+    """Databases created by create_all() got json. The GIN index is dropped here and
+    rebuilt on the new type by ensure_indexes()."""
+    if _filter_path_type(conn, dialect) == 'json':
+        conn.execute(text('DROP INDEX IF EXISTS idx_articles_filter_path'))
+        conn.execute(text('ALTER TABLE articles ALTER COLUMN filter_path TYPE JSONB USING filter_path::jsonb'))
+
+
+@migration(5, 'articles.fp_* generated columns from filter_path keys',
+           rewrites=lambda conn, dialect: dialect != 'sqlite' and bool(_missing_filter_path_columns(conn)))
+def _filter_path_columns(conn, dialect):
+    """Existing rows are computed by the ALTER itself, no backfill pass needed. All columns
+    go into one ALTER, so Postgres/MySQL rewrite the table once instead of once per column.
+    SQLite cannot ADD a STORED column (nor several per ALTER), so it gets VIRTUAL ones
+    (still indexable, no rewrite)."""
+    from app.models import FilterPathText
+    storage = 'VIRTUAL' if dialect == 'sqlite' else 'STORED'
+    columns = [
+        f'fp_{key} VARCHAR(64) GENERATED ALWAYS AS ({FilterPathText(key).compile(dialect=conn.dialect)}) {storage}'
+        for key in _missing_filter_path_columns(conn)
+    ]
+    if dialect == 'sqlite':
+        for column in columns:
+            conn.execute(text(f'ALTER TABLE articles ADD COLUMN {column}'))
+    elif columns:
+        conn.execute(text('ALTER TABLE articles ' + ', '.join(f'ADD COLUMN {c}' for c in columns)))
+
+
+def _ensure_version_table(conn, dialect):
+    if dialect == 'mysql':
+        ddl = ("CREATE TABLE IF NOT EXISTS schema_migrations (version INT PRIMARY KEY, "
+               "name VARCHAR(200) NOT NULL, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+    else:
+        ddl = ("CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY, "
+               "name VARCHAR(200) NOT NULL, applied_at TIMESTAMP)")
+    conn.execute(text(ddl))
+
+
+def applied_versions(engine) -> set:
+    """Versions recorded in schema_migrations; empty if the table does not exist yet"""
+    if not inspect(engine).has_table('schema_migrations'):
+        return set()
+    with engine.connect() as conn:
+        return {v for (v,) in conn.execute(text('SELECT version FROM schema_migrations'))}
+
+
+def pending_migrations(engine) -> list:
+    done = applied_versions(engine)
+    return [m for m in MIGRATIONS if m[0] not in done]
+
+
+def _boot_steps(engine, dialect, pending, logger) -> list:
+    """Pending steps up to (not including) the first one that would rewrite a table"""
+    if not any(fn.rewrites for _, _, fn in pending):
+        return pending
+    with engine.connect() as conn:
+        for i, (version, name, fn) in enumerate(pending):
+            if fn.rewrites is not None and fn.rewrites(conn, dialect):
+                if logger is not None:
+                    logger.warning('schema migration %s rewrites a table (%s); run `flask schema-migrate`',
+                                   version, name)
+                return pending[:i]
+    return pending
+
+
+def _acquire_lock(lock_conn, dialect, timeout: float):
+    if dialect == 'postgresql':
+        # Poll on an AUTOCOMMIT connection instead of blocking in pg_advisory_lock: a waiter
+        # blocked inside a transaction is an "older transaction" that the holder's
+        # CREATE INDEX CONCURRENTLY waits for, and the holder never releases the lock.
+        deadline = time.monotonic() + timeout
+        while not lock_conn.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': MIGRATION_LOCK_KEY}).scalar():
+            if time.monotonic() > deadline:
+                raise RuntimeError('timed out waiting for the schema migration lock')
+            time.sleep(LOCK_POLL_SECONDS)
+    elif dialect == 'mysql':
+        got = lock_conn.execute(text('SELECT GET_LOCK(:name, :timeout)'),
+                                {'name': MIGRATION_LOCK_NAME, 'timeout': int(timeout)}).scalar()
+        if got != 1:
+            raise RuntimeError('timed out waiting for the schema migration lock')
+    # The lock is session-level; do not keep a transaction open while holding it
+    lock_conn.commit()
+
+
+def _release_lock(lock_conn, dialect):
+    if dialect == 'postgresql':
+        lock_conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': MIGRATION_LOCK_KEY})
+    elif dialect == 'mysql':
+        lock_conn.execute(text('SELECT RELEASE_LOCK(:name)'), {'name': MIGRATION_LOCK_NAME})
+    lock_conn.commit()
+
+
+def _report_indexes(engine, logger):
+    if logger is None:
+        return
+    from app.db_indexes import index_status
+    broken = [f'{spec.name} ({state})' for spec, state in index_status(engine) if state in ('missing', 'invalid')]
+    if broken:
+        logger.warning('indexes not built: %s; run `flask ensure-indexes`', ', '.join(broken))
+
+
+def run_startup_migrations(db, logger=None, offline: bool = False) -> list:
+    """Bring the schema to the latest version. Returns the versions applied by this call
+    (empty when the schema was already current). offline=True is the CLI / release step:
+    it waits longer for the lock, applies table-rewriting steps and builds indexes on every database."""
+    engine = db.engine
+    dialect = engine.url.get_dialect().name  # 'postgresql' | 'mysql' | etc.
+
+    from app.db_indexes import ensure_indexes, indexes_need_repair
+
+    build_indexes = offline or dialect == 'sqlite'
+    pending = pending_migrations(engine)
+    if not offline and pending:
+        pending = _boot_steps(engine, dialect, pending, logger)
+    if not offline and not pending:
+        # Fast path: one catalog lookup + one SELECT (+ one pg_index read on Postgres), no locks, no DDL
+        if indexes_need_repair(engine) and logger is not None:
+            logger.warning('declared indexes are missing or INVALID; run `flask ensure-indexes`')
+        return []
+
+    applied = []
+    lock_conn = engine.connect()
+    if dialect == 'postgresql':
+        lock_conn = lock_conn.execution_options(isolation_level='AUTOCOMMIT')
+    with lock_conn:
+        _acquire_lock(lock_conn, dialect, LOCK_TIMEOUT_SECONDS if offline else BOOT_LOCK_TIMEOUT_SECONDS)
+        try:
+            # Another process may have finished while we waited for the lock
+            pending = pending_migrations(engine)
+            if not offline and pending:
+                pending = _boot_steps(engine, dialect, pending, None)
+            if pending:
+                db.create_all()
+                with engine.begin() as conn:
+                    _ensure_version_table(conn, dialect)
+            for version, name, fn in pending:
+                with engine.begin() as conn:
+                    fn(conn, dialect)
+                    conn.execute(
+                        text('INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)'),
+                        {'v': version, 'n': name[:200], 't': datetime.utcnow()},
+                    )
+                applied.append(version)
+                if logger is not None:
+                    logger.info('schema migration %s applied: %s', version, name)
+            if build_indexes:
+                # Non-transactional part: CREATE INDEX CONCURRENTLY for anything missing or INVALID
+                ensure_indexes(engine, report=logger.info if logger is not None else None)
+            elif pending:
+                _report_indexes(engine, logger)
+        finally:
+            _release_lock(lock_conn, dialect)
+    return applied
+
+
+@click.command('schema-migrate')
+@with_appcontext
+def schema_migrate_command():
+    """Apply pending schema migrations and build missing indexes (deploy release step)."""
+    from flask import current_app
+    from app import db
+    applied = run_startup_migrations(db, logger=current_app.logger, offline=True)
+    click.echo(f'applied: {applied}' if applied else f'schema is current (version {latest_version()})')
 
 
+@click.command('schema-status')
+@with_appcontext
+def schema_status_command():
+    """Show applied and pending schema migrations."""
+    from app import db
+    done = applied_versions(db.engine)
+    for version, name, _ in MIGRATIONS:
+        click.echo(f"{'applied' if version in done else 'PENDING'}  {version:>4}  {name}")
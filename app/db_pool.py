@@ -0,0 +1,258 @@
+"""Connection pools: engine options from config, a routing session and statement timeouts.
+
+Every engine gets its pool size/overflow/recycle/pre-ping from config
+(`engine_options`). Besides the default pool there is a 'bulk' bind with its
+own, smaller pool and longer statement timeout; views decorated with
+`@use_pool('bulk')` run all their ORM queries there, so an import or export
+cannot starve the pool serving regular traffic. On Postgres every
+transaction starts with `SET LOCAL statement_timeout`, taken from the view's
+`@statement_timeout(ms)` or the pool default; SET LOCAL works behind
+transaction-mode poolers such as Neon's pgbouncer.
+
+With DATABASE_REPLICA_URL set, GET/HEAD requests read from the 'replica'
+bind while flushes and DML always go to the primary. A caller that just
+wrote reads from the primary for REPLICA_STICKY_SECONDS (read-your-writes),
+keyed on its JWT since the frontend is cross-origin and sends no cookies;
+all reads fall back to the primary while the replica lags more than
+REPLICA_MAX_LAG_SECONDS.
+"""
+import threading
+import time
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.elements import TextClause
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited for a free connection.
+    The pool is labelled by the engine's `pool_logging_name` (default 'default')."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            from app.metrics import observe_pool_wait
+            observe_pool_wait(self._orig_logging_name or 'default', time.perf_counter() - start)
+
+
+def engine_options(uri: str, name: str, pool_size: int, max_overflow: int, recycle: int,
+                   timeout: float, pre_ping: bool) -> dict:
+    """SQLAlchemy create_engine() options for one bind"""
+    if uri.startswith('sqlite'):
+        # SQLite pools are per-file and cheap; keep SQLAlchemy's defaults
+        return {}
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_logging_name': name,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_recycle': recycle,
+        'pool_timeout': timeout,
+        'pool_pre_ping': pre_ping,
+    }
+
+
+def _request_attr(name):
+    from flask import g, has_request_context
+    return g.get(name) if has_request_context() else None
+
+
+class RoutingSession(Session):
+    """Sends the queries of a request to the pool its view asked for (see `use_pool`)"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None:
+            return engine
+        engines = self._db.engines
+        if engine is not engines.get(None):
+            return engine  # model with an explicit bind_key
+        key = _request_attr('db_pool')
+        if key == 'replica' and (self._flushing or _is_write(clause)):
+            return engine  # writes always go to the primary
+        return engines.get(key, engine) if key else engine
+
+
+def _is_write(clause) -> bool:
+    if clause is None:
+        return False
+    if getattr(clause, 'is_dml', False):
+        return True
+    if isinstance(clause, TextClause):
+        return clause.text.lstrip()[:6].upper() in ('INSERT', 'UPDATE', 'DELETE')
+    return False
+
+
+class ReplicaMonitor:
+    """Caches the replica's replication lag for `interval` seconds per process"""
+
+    LAG_SQL = (
+        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+    )
+
+    def __init__(self, interval: float = 2.0):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self.lag = None  # seconds; None = replica unreachable
+
+    def current_lag(self, engine):
+        now = time.monotonic()
+        if now - self._checked_at < self.interval:
+            return self.lag
+        with self._lock:
+            if now - self._checked_at < self.interval:
+                return self.lag
+            self._checked_at = now
+            if engine.dialect.name != 'postgresql':
+                self.lag = 0.0
+                return self.lag
+            try:
+                with engine.connect() as conn:
+                    self.lag = float(conn.execute(text(self.LAG_SQL)).scalar() or 0)
+            except Exception:
+                self.lag = None
+            return self.lag
+
+
+class StickyWrites:
+    """Read-your-writes marks: caller key -> unix time until which it reads from the primary.
+    Kept in the response cache store when one is configured (shared by the workers
+    using it), in this process otherwise."""
+
+    PREFIX = 'sticky:'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._until = {}
+
+    def _store(self):
+        from app.response_cache import get_cache
+        return get_cache()
+
+    def mark(self, key: str, seconds: float):
+        until = time.time() + seconds
+        store = self._store()
+        if store is not None:
+            try:
+                store.set(self.PREFIX + key, repr(until).encode(), seconds, ())
+                return
+            except Exception:
+                pass
+        with self._lock:
+            now = time.time()
+            self._until = {k: t for k, t in self._until.items() if t > now}
+            self._until[key] = until
+
+    def active(self, key: str) -> bool:
+        if self._until.get(key, 0) > time.time():
+            return True
+        store = self._store()
+        if store is None:
+            return False
+        try:
+            value = store.get(self.PREFIX + key)
+        except Exception:
+            return False
+        return value is not None and float(value) > time.time()
+
+
+def _caller_key():
+    """The request JWT's jti (student context tokens all share one identity), None if anonymous"""
+    from flask_jwt_extended import get_jwt, verify_jwt_in_request
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt().get('jti')
+    except Exception:
+        return None
+
+
+def use_pool(key: str):
+    """Run the view's queries on the `key` bind, e.g. @use_pool('bulk')"""
+    def decorator(fn):
+        fn.db_pool = key
+        return fn
+    return decorator
+
+
+def statement_timeout(ms: int):
+    """Per-view Postgres statement timeout in milliseconds (0 disables)"""
+    def decorator(fn):
+        fn.statement_timeout_ms = ms
+        return fn
+    return decorator
+
+
+def _bind_key(session, engine):
+    for key, candidate in session._db.engines.items():
+        if candidate is engine:
+            return key
+    return None
+
+
+@event.listens_for(RoutingSession, 'after_begin')
+def _set_statement_timeout(session, transaction, connection):
+    if connection.dialect.name != 'postgresql':
+        return
+    from flask import current_app, has_app_context
+    if not has_app_context():
+        return
+    ms = _request_attr('statement_timeout_ms')
+    if ms is None:
+        timeouts = current_app.config.get('DB_STATEMENT_TIMEOUTS') or {}
+        ms = timeouts.get(_bind_key(session, connection.engine) or 'default')
+    if ms is not None:
+        connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(ms)}')
+
+
+def init_db_pools(app):
+    """Resolve the pool and timeout of the matched view before the request touches the DB"""
+    from flask import g, request
+    from app import db
+    from app.lazy import LazyView
+
+    binds = app.config.get('SQLALCHEMY_BINDS') or {}
+    monitor = ReplicaMonitor(app.config.get('REPLICA_LAG_CHECK_SECONDS', 2.0)) if 'replica' in binds else None
+    sticky = StickyWrites()
+
+    def _replica_usable() -> bool:
+        key = _caller_key()
+        if key is not None and sticky.active(key):
+            return False  # read-your-writes window after this caller's last write
+        lag = monitor.current_lag(db.engines['replica'])
+        return lag is not None and lag <= app.config.get('REPLICA_MAX_LAG_SECONDS', 5.0)
+
+    @app.before_request
+    def _select_db_pool():
+        view = app.view_functions.get(request.endpoint) if request.endpoint else None
+        if isinstance(view, LazyView):
+            view = view.view
+        key = getattr(view, 'db_pool', None)
+        if key and key in binds:
+            g.db_pool = key
+        elif key is None and monitor is not None and request.method in READ_METHODS and _replica_usable():
+            # @use_pool('primary') keeps a read endpoint on the primary
+            g.db_pool = 'replica'
+        ms = getattr(view, 'statement_timeout_ms', None)
+        if ms is None and key:
+            ms = (app.config.get('DB_STATEMENT_TIMEOUTS') or {}).get(key)
+        if ms is not None:
+            g.statement_timeout_ms = ms
+
+    if monitor is None:
+        return
+
+    @app.after_request
+    def _mark_write(response):
+        response.headers['X-DB-Route'] = g.get('db_pool') or 'primary'
+        if request.method not in READ_METHODS and response.status_code < 400:
+            key = _caller_key()
+            if key is not None:
+                sticky.mark(key, app.config.get('REPLICA_STICKY_SECONDS', 10))
+        return response
@@ -0,0 +1,119 @@
+"""Set-based assignment of filter groups (and filter_path) to articles.
+
+`sync_article_filters(assignments)` diffs the requested filter_group ids of
+every article against article_filters in one SELECT, then issues one
+DELETE for the stale links and one INSERT for the missing ones. The INSERT
+skips rows that already exist (ON CONFLICT DO NOTHING on Postgres/SQLite,
+a no-op ON DUPLICATE KEY UPDATE on MySQL), so a concurrent assignment of
+the same pair cannot fail the transaction on the unique constraint.
+filter_path / filter_tree_id changes go out as one executemany UPDATE.
+"""
+from dataclasses import dataclass, field
+
+from sqlalchemy import delete, insert, select, update
+
+from app.filters.filter_path import FILTER_KEYS
+
+MAX_ARTICLES = 1000
+
+
+@dataclass
+class Assignment:
+    """Desired filters of one article; filter_path None leaves the article's path as is"""
+    article_id: int
+    filter_group_ids: set = field(default_factory=set)
+    filter_path: dict = None
+    filter_tree_id: int = None
+
+    @classmethod
+    def from_request(cls, data, article_id=None) -> 'Assignment':
+        """Same keys as POST /articles/<id>/filters; the path is set only if one of its keys is present"""
+        data = data if isinstance(data, dict) else {}
+        article_id = article_id if article_id is not None else data.get('article_id')
+        groups = data.get('filter_group_ids') or []
+        if not isinstance(groups, list):
+            raise ValueError('filter_group_ids must be a list')
+        assignment = cls(int(article_id), {int(g) for g in groups})
+        if any(key in data for key in FILTER_KEYS) or 'filter_tree_id' in data:
+            assignment.filter_path = {key: data.get(key) for key in FILTER_KEYS}
+            assignment.filter_tree_id = data.get('filter_tree_id')
+        return assignment
+
+
+@dataclass
+class AssignStats:
+    articles: int = 0
+    inserted: int = 0
+    deleted: int = 0
+
+    def as_dict(self):
+        return {'articles': self.articles, 'inserted': self.inserted, 'deleted': self.deleted}
+
+
+def _insert_missing(session, rows):
+    from app.models import ArticleFilter
+    dialect = session.get_bind(mapper=ArticleFilter).dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(ArticleFilter).on_conflict_do_nothing(index_elements=['article_id', 'filter_group_id'])
+    elif dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(ArticleFilter)
+        # no-op update instead of INSERT IGNORE, which would also swallow FK errors
+        stmt = stmt.on_duplicate_key_update(filter_group_id=stmt.inserted.filter_group_id)
+    else:
+        stmt = insert(ArticleFilter)
+    session.execute(stmt, rows)
+
+
+def sync_article_filters(assignments, replace: bool = True) -> AssignStats:
+    """Apply `assignments` (Assignment list) inside the current transaction.
+    replace=False only adds links and never deletes."""
+    from datetime import datetime
+    from app import db
+    from app.models import ArticleFilter
+
+    session = db.session
+    stats = AssignStats()
+    desired = {}
+    paths = {}
+    for assignment in assignments:
+        desired.setdefault(assignment.article_id, set()).update(assignment.filter_group_ids)
+        if assignment.filter_path is not None:
+            paths[assignment.article_id] = {
+                'id': assignment.article_id,
+                'filter_path': assignment.filter_path,
+                'filter_tree_id': assignment.filter_tree_id,
+            }
+    stats.articles = len(desired)
+    if not desired:
+        return stats
+
+    existing = {}
+    for row_id, article_id, group_id in session.execute(
+        select(ArticleFilter.id, ArticleFilter.article_id, ArticleFilter.filter_group_id)
+        .where(ArticleFilter.article_id.in_(sorted(desired)))
+    ):
+        existing[(article_id, group_id)] = row_id
+
+    wanted = {(article_id, group_id) for article_id, groups in desired.items() for group_id in groups}
+    if replace:
+        stale = [row_id for pair, row_id in existing.items() if pair not in wanted]
+        if stale:
+            session.execute(delete(ArticleFilter).where(ArticleFilter.id.in_(stale)))
+            stats.deleted = len(stale)
+    now = datetime.utcnow()
+    missing = [
+        {'article_id': article_id, 'filter_group_id': group_id, 'created_at': now}
+        for article_id, group_id in sorted(wanted - existing.keys())
+    ]
+    if missing:
+        _insert_missing(session, missing)
+        stats.inserted = len(missing)
+    if paths:
+        from app.models import Article
+        session.execute(update(Article), [{**row, 'updated_at': now} for row in paths.values()])
+    return stats
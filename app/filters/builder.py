@@ -0,0 +1,265 @@
+"""Set-based builder for the filter tree structure.
+
+`build_structure(tree_id, specs)` expands the institution specs into the
+full node set in memory (type -> general filters -> cities / programs ->
+courses -> forms -> city instances) and syncs it level by level against
+what the tree already holds, matching nodes on their natural keys. Each
+level costs one SELECT, at most one multi-row INSERT ... RETURNING and one
+executemany UPDATE, instead of a flush per node. Re-running with the same
+specs writes nothing; changing one program touches only that program's
+subtree. Nodes missing from the specs are deleted only with prune=True.
+"""
+from dataclasses import dataclass, field
+
+from sqlalchemy import delete, insert, or_, select, update
+
+from app.filters.keys import display_name
+
+DEFAULT_CITIES = ['nsk', 'spb', 'msk', 'ekb', 'krd', 'rnd']
+DEFAULT_PROGRAMS = [
+    'programming', 'sys_adm', 'design', 'commercial',
+    'web_design', 'gamedev', 'ai', '3d', 'cybersport',
+    'info_sec', 'tech',
+]
+DEFAULT_COURSES = ['1 course', '2 course', '3 course', '4 course']
+DEFAULT_FORMS = ['full_time', 'remote', 'dist', 'blended']
+GENERAL_KEYS = ['general', 'city', 'study_info']
+
+
+@dataclass
+class InstitutionSpec:
+    """Desired subtree of one institution type"""
+    type_key: str
+    display_name: str = None
+    sort_order: int = 0
+    generals: list = field(default_factory=lambda: list(GENERAL_KEYS))
+    cities: list = field(default_factory=lambda: list(DEFAULT_CITIES))
+    programs: list = field(default_factory=lambda: list(DEFAULT_PROGRAMS))
+    courses: list = field(default_factory=lambda: list(DEFAULT_COURSES))
+    forms: list = field(default_factory=lambda: list(DEFAULT_FORMS))
+    course_city: str = None  # city_key FilterCourse.city_id points at (None = no city)
+    node_sort_order: int = 0  # sort_order of every generated child node
+
+    @classmethod
+    def from_request(cls, type_key: str, data) -> 'InstitutionSpec':
+        """`structure` entry of POST /tree/<id>/structure; lists default to the standard sets"""
+        data = data if isinstance(data, dict) else {}
+        spec = cls(type_key)
+        for name in ('cities', 'programs', 'courses', 'forms'):
+            if isinstance(data.get(name), list):
+                setattr(spec, name, [str(v) for v in data[name]])
+        if data.get('display_name'):
+            spec.display_name = str(data['display_name'])
+        if data.get('course_city'):
+            spec.course_city = str(data['course_city'])
+        return spec
+
+    @classmethod
+    def bare(cls, type_key: str, display_name: str = None, sort_order: int = 0) -> 'InstitutionSpec':
+        """Institution type node without general filters or children"""
+        return cls(type_key, display_name, sort_order, generals=[], cities=[], programs=[])
+
+
+@dataclass
+class BuildStats:
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+
+    def as_dict(self):
+        return {'inserted': self.inserted, 'updated': self.updated, 'deleted': self.deleted}
+
+
+class _Level:
+    """One table of the tree: rows keyed by (parent id, natural key)"""
+
+    def __init__(self, session, model, parent_column, key_column, value_columns, stats):
+        self.session = session
+        self.model = model
+        self.parent_column = parent_column
+        self.key_column = key_column
+        self.value_columns = value_columns
+        self.stats = stats
+        self.stale = []
+
+    def sync(self, desired: dict) -> dict:
+        """desired: {(parent_id, key): {column: value}} -> {(parent_id, key): id}"""
+        model, parent, key = self.model, self.parent_column, self.key_column
+        parent_ids = sorted({p for p, _ in desired})
+        ids, changed = {}, []
+        if parent_ids:
+            rows = self.session.execute(
+                select(model.id, parent, key, *[getattr(model, c) for c in self.value_columns])
+                .where(parent.in_(parent_ids))
+            ).all()
+            for row in rows:
+                natural = (row[1], row[2])
+                values = desired.get(natural)
+                if values is None:
+                    self.stale.append(row[0])
+                    continue
+                ids[natural] = row[0]
+                if any(row[3 + i] != values[c] for i, c in enumerate(self.value_columns)):
+                    changed.append({'id': row[0], **values})
+
+        missing = [
+            {parent.key: p, key.key: k, **values}
+            for (p, k), values in desired.items() if (p, k) not in ids
+        ]
+        if missing:
+            ids.update(self._insert(missing))
+            self.stats.inserted += len(missing)
+        if changed:
+            self.session.execute(update(model), changed)
+            self.stats.updated += len(changed)
+        return ids
+
+    def _insert(self, rows):
+        model, parent, key = self.model, self.parent_column, self.key_column
+        if self.session.get_bind().dialect.insert_executemany_returning:
+            result = self.session.execute(insert(model).returning(model.id, parent, key), rows)
+            return {(r[1], r[2]): r[0] for r in result}
+        # MySQL: no RETURNING; read the new keys back in one query
+        self.session.execute(insert(model), rows)
+        result = self.session.execute(
+            select(model.id, parent, key).where(parent.in_({r[parent.key] for r in rows}))
+        )
+        wanted = {(r[parent.key], r[key.key]) for r in rows}
+        return {(r[1], r[2]): r[0] for r in result if (r[1], r[2]) in wanted}
+
+
+def build_structure(tree_id: int, specs, prune: bool = False) -> BuildStats:
+    """Sync the tree with `specs` (InstitutionSpec list) inside the current transaction"""
+    from app import db
+    from app.models import (
+        FilterInstitutionType, FilterGeneral, FilterCity, FilterStudyProgram,
+        FilterCourse, FilterEducationForm, FilterCityInstance, FilterGroup,
+    )
+
+    session = db.session
+    stats = BuildStats()
+
+    def level(model, parent_column, key_column, *value_columns):
+        return _Level(session, model, parent_column, key_column, value_columns, stats)
+
+    types_level = level(FilterInstitutionType, FilterInstitutionType.filter_tree_id, FilterInstitutionType.type_key,
+                        'display_name', 'sort_order')
+    generals_level = level(FilterGeneral, FilterGeneral.institution_type_id, FilterGeneral.filter_key,
+                           'display_name', 'sort_order')
+    cities_level = level(FilterCity, FilterCity.general_filter_id, FilterCity.city_key,
+                         'institution_type_id', 'display_name', 'sort_order')
+    programs_level = level(FilterStudyProgram, FilterStudyProgram.general_filter_id, FilterStudyProgram.program_key,
+                           'institution_type_id', 'display_name', 'sort_order')
+    courses_level = level(FilterCourse, FilterCourse.study_program_id, FilterCourse.course_key,
+                          'city_id', 'display_name', 'sort_order')
+    forms_level = level(FilterEducationForm, FilterEducationForm.course_id, FilterEducationForm.form_key,
+                        'display_name', 'sort_order')
+    instances_level = level(FilterCityInstance, FilterCityInstance.education_form_id, FilterCityInstance.city_key,
+                            'display_name', 'sort_order')
+    levels = [types_level, generals_level, cities_level, programs_level, courses_level, forms_level, instances_level]
+
+    specs = {spec.type_key: spec for spec in specs}
+    type_ids = types_level.sync({
+        (tree_id, key): {
+            'display_name': spec.display_name or display_name('institution_type', key),
+            'sort_order': spec.sort_order,
+        }
+        for key, spec in specs.items()
+    })
+
+    general_ids = generals_level.sync({
+        (type_ids[(tree_id, key)], general_key): {
+            'display_name': display_name('general', general_key),
+            'sort_order': spec.node_sort_order,
+        }
+        for key, spec in specs.items() for general_key in spec.generals
+    })
+
+    def general_of(key, general_key):
+        return general_ids[(type_ids[(tree_id, key)], general_key)]
+
+    city_ids = cities_level.sync({
+        (general_of(key, 'city'), city_key): {
+            'institution_type_id': type_ids[(tree_id, key)],
+            'display_name': display_name('city', city_key),
+            'sort_order': spec.node_sort_order,
+        }
+        for key, spec in specs.items() if 'city' in spec.generals for city_key in spec.cities
+    })
+
+    program_ids = programs_level.sync({
+        (general_of(key, 'study_info'), program_key): {
+            'institution_type_id': type_ids[(tree_id, key)],
+            'display_name': display_name('program', program_key),
+            'sort_order': spec.node_sort_order,
+        }
+        for key, spec in specs.items() if 'study_info' in spec.generals for program_key in spec.programs
+    })
+
+    def program_of(key, program_key):
+        return program_ids[(general_of(key, 'study_info'), program_key)]
+
+    def course_city_id(key, spec):
+        if not spec.course_city or 'city' not in spec.generals:
+            return None
+        return city_ids.get((general_of(key, 'city'), spec.course_city))
+
+    course_ids = courses_level.sync({
+        (program_of(key, program_key), course_key): {
+            'city_id': course_city_id(key, spec),
+            'display_name': display_name('course', course_key),
+            'sort_order': spec.node_sort_order,
+        }
+        for key, spec in specs.items() if 'study_info' in spec.generals
+        for program_key in spec.programs for course_key in spec.courses
+    })
+
+    def course_of(key, program_key, course_key):
+        return course_ids[(program_of(key, program_key), course_key)]
+
+    form_ids = forms_level.sync({
+        (course_of(key, program_key, course_key), form_key): {
+            'display_name': display_name('form', form_key),
+            'sort_order': spec.node_sort_order,
+        }
+        for key, spec in specs.items() if 'study_info' in spec.generals for program_key in spec.programs
+        for course_key in spec.courses for form_key in spec.forms
+    })
+
+    instances_level.sync({
+        (form_ids[(course_of(key, program_key, course_key), form_key)], city_key): {
+            'display_name': display_name('city', city_key),
+            'sort_order': spec.node_sort_order,
+        }
+        for key, spec in specs.items() if 'study_info' in spec.generals for program_key in spec.programs
+        for course_key in spec.courses for form_key in spec.forms for city_key in spec.cities
+    })
+
+    if prune and any(lvl.stale for lvl in levels[1:]):
+        # A stale node goes with the subtree the ORM cascades would remove (a course also goes
+        # with the city it points at): one DELETE per table, bottom up, while the parents the
+        # conditions select from still exist. The types level is never pruned; dropping an
+        # institution type stays explicit.
+        def doomed(lvl, *parents):
+            return or_(lvl.model.id.in_(lvl.stale), *parents)
+
+        def ids(model, condition):
+            return select(model.id).where(condition)
+
+        generals = doomed(generals_level)
+        cities = doomed(cities_level, FilterCity.general_filter_id.in_(ids(FilterGeneral, generals)))
+        programs = doomed(programs_level, FilterStudyProgram.general_filter_id.in_(ids(FilterGeneral, generals)))
+        courses = doomed(courses_level, FilterCourse.study_program_id.in_(ids(FilterStudyProgram, programs)),
+                         FilterCourse.city_id.in_(ids(FilterCity, cities)))
+        forms = doomed(forms_level, FilterEducationForm.course_id.in_(ids(FilterCourse, courses)))
+        instances = doomed(instances_level, FilterCityInstance.education_form_id.in_(ids(FilterEducationForm, forms)))
+        session.execute(
+            delete(FilterGroup).where(FilterGroup.city_instance_id.in_(ids(FilterCityInstance, instances)))
+            .execution_options(synchronize_session=False)
+        )
+        for model, condition in ((FilterCityInstance, instances), (FilterEducationForm, forms),
+                                 (FilterCourse, courses), (FilterStudyProgram, programs),
+                                 (FilterCity, cities), (FilterGeneral, generals)):
+            result = session.execute(delete(model).where(condition).execution_options(synchronize_session=False))
+            stats.deleted += result.rowcount
+    return stats
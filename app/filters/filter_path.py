@@ -0,0 +1,32 @@
+"""Generated filter_path columns and the indexes that serve them.
+
+filter_path is a flat JSON object such as
+{"city": "nsk", "institution_type": "college", "program": "ai", "course": "2", "form": "full_time"}.
+
+Each key is a generated column (Article.fp_<key>, see `fp_column`) that
+every filter query reads; the composite btree indexes below put the
+published flag and the narrowing keys ahead of created_at DESC, so a
+narrowed, newest-first page is an index range scan that stops after one
+page.
+"""
+from app.db_indexes import IndexSpec, register_index
+
+FILTER_KEYS = ('city', 'institution_type', 'program', 'course', 'form')
+
+
+# Incremental narrowing: institution_type -> program -> course -> form; city on its own
+for _name, _columns in (
+    ('idx_articles_fp_type_created', 'fp_institution_type'),
+    ('idx_articles_fp_program_course_created', 'fp_institution_type, fp_program, fp_course'),
+    ('idx_articles_fp_full_created', 'fp_institution_type, fp_program, fp_course, fp_form'),
+    ('idx_articles_fp_city_created', 'fp_city'),
+):
+    register_index(IndexSpec(_name, 'articles', f'(is_published, {_columns}, created_at DESC)'))
+
+
+def fp_column(key: str):
+    """Generated column holding filter_path[key]"""
+    from app.models import Article
+    if key not in FILTER_KEYS:
+        raise ValueError(f'unknown filter_path key: {key}')
+    return getattr(Article, f'fp_{key}')
@@ -0,0 +1,181 @@
+"""Filter key registry: filter keys <-> display names <-> legacy lookup ids.
+
+Display names of institution types, general filters, cities, programs,
+courses and forms are module-level dicts (both directions), built once at
+import. Legacy `City` ids are read from the cities table once per app and
+kept in memory: commits that write to `cities` in this process drop them,
+and other workers reload after CITY_IDS_TTL seconds.
+
+    display_name('program', 'ai')        -> 'Искусственный интеллект'
+    key_for('city', 'Москва')            -> 'msk'
+    get_key_registry().city_id('msk')    -> 3
+    get_key_registry().city_key(3)       -> 'msk'
+"""
+import threading
+import time
+
+from sqlalchemy import event, select
+
+from app.db_pool import RoutingSession
+
+CITY_IDS_TTL = 300
+
+INSTITUTION_NAMES = {
+    'college': 'Колледж',
+    'university': 'Университет',
+    'school': 'Школа',
+}
+GENERAL_NAMES = {
+    'general': 'Общее',
+    'city': 'Город',
+    'study_info': 'Учебная информация',
+}
+CITY_NAMES = {
+    'nsk': 'Новосибирск',
+    'spb': 'Санкт-Петербург',
+    'msk': 'Москва',
+    'ekb': 'Екатеринбург',
+    'krd': 'Краснодар',
+    'rnd': 'Ростов-на-Дону',
+}
+PROGRAM_NAMES = {
+    'programming': 'Программирование',
+    'sys_adm': 'Системное администрирование',
+    'design': 'Дизайн',
+    'commercial': 'Реклама',
+    'web_design': 'Веб-дизайн',
+    'gamedev': 'Разработка игр',
+    'ai': 'Искусственный интеллект',
+    '3d': '3D моделирование',
+    'cybersport': 'Киберспорт',
+    'info_sec': 'Информационная безопасность',
+    'tech': 'Технологии',
+}
+COURSE_NAMES = {
+    '1 course': '1 курс',
+    '2 course': '2 курс',
+    '3 course': '3 курс',
+    '4 course': '4 курс',
+}
+FORM_NAMES = {
+    'full_time': 'Очная',
+    'remote': 'Заочная',
+    'dist': 'Дистанционная',
+    'blended': 'Смешанная',
+}
+
+NAMES = {
+    'institution_type': INSTITUTION_NAMES,
+    'general': GENERAL_NAMES,
+    'city': CITY_NAMES,
+    'program': PROGRAM_NAMES,
+    'course': COURSE_NAMES,
+    'form': FORM_NAMES,
+}
+# Tree node names without a kind: institution types, general filters, programs and forms
+_ANY_NAMES = {**INSTITUTION_NAMES, **GENERAL_NAMES, **PROGRAM_NAMES, **FORM_NAMES}
+_KEYS = {kind: {name.lower(): key for key, name in names.items()} for kind, names in NAMES.items()}
+
+
+def display_name(kind: str, key: str) -> str:
+    """Display name of `key` of the given kind (None = any tree node); the key itself if unknown"""
+    names = NAMES.get(kind, _ANY_NAMES) if kind else _ANY_NAMES
+    return names.get(key, key)
+
+
+def key_for(kind: str, name: str):
+    """Filter key of a display name (case-insensitive), None if unknown"""
+    return _KEYS[kind].get((name or '').strip().lower())
+
+
+def course_number(value):
+    """Course as the integer stored in audience_course: 2, '2' and '2 course' -> 2; None otherwise"""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    head = str(value or '').strip().split(' ', 1)[0]
+    return int(head) if head.isdigit() else None
+
+
+class KeyRegistry:
+    """City key <-> legacy City id, loaded from the cities table and kept in memory"""
+
+    def __init__(self, ttl: float = CITY_IDS_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._ids = {}
+        self._keys = {}
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _load(self):
+        loaded_at = self._loaded_at
+        if loaded_at is not None and time.monotonic() - loaded_at < self.ttl:
+            return
+        with self._lock:
+            if self._loaded_at is not loaded_at:
+                return  # another thread reloaded meanwhile
+            from app import db
+            from app.models import City
+            ids = {}
+            # A small lookup table; names are matched in Python since SQLite's lower() is ASCII-only
+            for city_id, name in db.session.execute(select(City.id, City.name).order_by(City.id)):
+                key = key_for('city', name)
+                if key is not None:
+                    ids.setdefault(key, city_id)
+            self._ids = ids
+            self._keys = {city_id: key for key, city_id in ids.items()}
+            self._loaded_at = time.monotonic()
+
+    def city_id(self, key: str):
+        """Legacy City id of a city key, None if the key or its city is unknown"""
+        self._load()
+        return self._ids.get(key)
+
+    def city_key(self, city_id):
+        """City key of a legacy City id, None if the city has no filter key"""
+        self._load()
+        return self._keys.get(city_id)
+
+
+def get_key_registry(app=None) -> KeyRegistry:
+    from flask import current_app
+    app = app or current_app
+    registry = app.extensions.get('kb_filter_keys')
+    if registry is None:
+        registry = app.extensions.setdefault('kb_filter_keys', KeyRegistry())
+    return registry
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _note_flushed(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if getattr(obj, '__tablename__', None) == 'cities':
+            session.info['filter_keys_dirty'] = True
+            return
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _note_bulk_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None and table.name == 'cities':
+            orm_execute_state.session.info['filter_keys_dirty'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _refresh_committed(session):
+    if not session.info.pop('filter_keys_dirty', False):
+        return
+    from flask import current_app, has_app_context
+    if has_app_context():
+        registry = current_app.extensions.get('kb_filter_keys')
+        if registry is not None:
+            registry.invalidate()
+
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _forget_rolled_back(session, previous_transaction):
+    if not session.in_transaction():
+        session.info.pop('filter_keys_dirty', None)
@@ -1,32 +1,57 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
-from app.models import (
-    FilterTree, FilterInstitutionType, FilterGeneral, FilterCity,
-    FilterStudyProgram, FilterCourse, FilterEducationForm,
-    FilterCityInstance, FilterGroup, Article, ArticleFilter
-)
-from sqlalchemy.orm import joinedload
+from app.models import FilterTree, FilterGroup, Article
+import base64
 import json
+from datetime import datetime
+from app.response_cache import cached
+from app.bitmap_index import get_bitmap_index
+from app.filters.snapshot import get_snapshot
+from app.filters.builder import InstitutionSpec, build_structure
+from app.filters.filter_path import FILTER_KEYS, fp_column
+from app.filters.keys import CITY_NAMES, get_key_registry
+from app.targeting import FilterContext, plan_for
+from app.filters.assignments import MAX_ARTICLES as MAX_ASSIGN_ARTICLES, Assignment, sync_article_filters
 
 filters_bp = Blueprint('filters', __name__)
 
+DEFAULT_ARTICLES_LIMIT = 50
+MAX_ARTICLES_LIMIT = 200
+CONTENT_PREVIEW_CHARS = 200
+ARTICLE_LIST_FIELDS = (
+    'id', 'title', 'content', 'created_at', 'filter_path', 'views_count',
+    'audience', 'audience_city_id', 'audience_course',
+)
+
+def _encode_cursor(created_at, article_id):
+    """Opaque keyset cursor: (created_at, id) of the last returned article"""
+    raw = json.dumps([created_at.isoformat() if created_at else None, article_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def _decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, article_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(article_id)
+    except Exception:
+        return None
+
 @filters_bp.route('/tree', methods=['GET'])
 def get_filter_tree():
-    """Получить полное дерево фильтров"""
+    """Получить полное дерево фильтров (готовый снимок текущей версии дерева, с ETag)"""
     try:
-        # Получаем активное дерево фильтров
-        filter_tree = FilterTree.query.filter_by(is_active=True).first()
-        if not filter_tree:
+        snapshot = get_snapshot()
+        if snapshot is None:
             return jsonify({'error': 'No active filter tree found'}), 404
 
-        # Строим иерархию
-        tree_data = build_filter_hierarchy(filter_tree)
-
-        return jsonify({
-            'success': True,
-            'data': tree_data
-        })
+        if request.if_none_match.contains(snapshot.etag):
+            response = Response(status=304)
+        else:
+            response = Response(snapshot.body, mimetype='application/json')
+        response.set_etag(snapshot.etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -64,103 +89,28 @@ def create_filter_tree():
 @filters_bp.route('/tree/<int:tree_id>/structure', methods=['POST'])
 @jwt_required()
 def create_filter_structure(tree_id):
-    """Создать структуру фильтров для дерева"""
+    """Создать (или досинхронизировать) структуру фильтров для дерева.
+    structure: {type_key: {cities?, programs?, courses?, forms?, course_city?}}; prune: удалить лишние узлы
+    """
     try:
         data = request.get_json()
 
-        filter_tree = FilterTree.query.get_or_404(tree_id)
+        FilterTree.query.get_or_404(tree_id)
 
         # Создаем структуру согласно вашей схеме
         structure = data.get('structure', {})
-
-        for inst_type_key, inst_type_data in structure.items():
-            # Создаем тип учреждения
-            inst_type = FilterInstitutionType(
-                filter_tree_id=tree_id,
-                type_key=inst_type_key,
-                display_name=get_display_name(inst_type_key)
-            )
-            db.session.add(inst_type)
-            db.session.flush()  # Получаем ID
-
-            # Создаем общие фильтры
-            for general_key in ['general', 'city', 'study_info']:
-                general = FilterGeneral(
-                    institution_type_id=inst_type.id,
-                    filter_key=general_key,
-                    display_name=get_display_name(general_key)
-                )
-                db.session.add(general)
-                db.session.flush()
-
-                if general_key == 'city':
-                    # Создаем города
-                    cities = ['nsk', 'spb', 'msk', 'ekb', 'krd', 'rnd']
-                    for city_key in cities:
-                        city = FilterCity(
-                            institution_type_id=inst_type.id,
-                            general_filter_id=general.id,
-                            city_key=city_key,
-                            display_name=get_city_display_name(city_key)
-                        )
-                        db.session.add(city)
-
-                elif general_key == 'study_info':
-                    # Создаем учебные программы
-                    programs = [
-                        'programming', 'sys_adm', 'design', 'commercial',
-                        'web_design', 'gamedev', 'ai', '3d', 'cybersport',
-                        'info_sec', 'tech'
-                    ]
-
-                    for program_key in programs:
-                        program = FilterStudyProgram(
-                            institution_type_id=inst_type.id,
-                            general_filter_id=general.id,
-                            program_key=program_key,
-                            display_name=get_program_display_name(program_key)
-                        )
-                        db.session.add(program)
-                        db.session.flush()
-
-                        # Создаем курсы для каждой программы
-                        courses = ['1 course', '2 course', '3 course', '4 course']
-                        for course_key in courses:
-                            course = FilterCourse(
-                                study_program_id=program.id,
-                                city_id=None,  # Будет установлено позже
-                                course_key=course_key,
-                                display_name=get_course_display_name(course_key)
-                            )
-                            db.session.add(course)
-                            db.session.flush()
-
-                            # Создаем формы обучения
-                            forms = ['full_time', 'remote', 'dist', 'blended']
-                            for form_key in forms:
-                                form = FilterEducationForm(
-                                    course_id=course.id,
-                                    form_key=form_key,
-                                    display_name=get_form_display_name(form_key)
-                                )
-                                db.session.add(form)
-                                db.session.flush()
-
-                                # Создаем города для каждой формы
-                                cities = ['nsk', 'spb', 'msk', 'ekb', 'krd', 'rnd']
-                                for city_key in cities:
-                                    city_instance = FilterCityInstance(
-                                        education_form_id=form.id,
-                                        city_key=city_key,
-                                        display_name=get_city_display_name(city_key)
-                                    )
-                                    db.session.add(city_instance)
+        specs = [
+            InstitutionSpec.from_request(inst_type_key, inst_type_data)
+            for inst_type_key, inst_type_data in structure.items()
+        ]
+        stats = build_structure(tree_id, specs, prune=bool(data.get('prune')))
 
         db.session.commit()
 
         return jsonify({
             'success': True,
-            'message': 'Filter structure created successfully'
+            'message': 'Filter structure created successfully',
+            'stats': stats.as_dict()
         }), 201
 
     except Exception as e:
@@ -168,247 +118,257 @@ def create_filter_structure(tree_id):
         return jsonify({'error': str(e)}), 500
 
 @filters_bp.route('/articles', methods=['GET'])
+@cached('articles', 'filters')
 def get_filtered_articles():
     """Инкрементальная фильтрация: каждый следующий параметр сужает выбор (AND).
     Поддержка как filter_path, так и полей аудитории (город/курс).
-    Параметры: city, institution_type, program, course, form.
+    Параметры: city, institution_type, program, course, form, filter_group_ids (связи ArticleFilter).
+    Правила отбора - app/targeting.py (FilterContext).
+    Страницы: limit (по умолчанию 50, максимум 200), cursor (next_cursor прошлого ответа),
+    fields=id,title,... (проекция), total=0 (не считать total).
     """
     try:
-        city = request.args.get('city')
-        institution_type = request.args.get('institution_type')
-        program = request.args.get('program')
-        course = request.args.get('course')
-        form = request.args.get('form')
-
-        from sqlalchemy import or_, and_, cast, literal
-        from sqlalchemy.dialects.postgresql import JSONB
-
-        def fp_contains(sub: dict):
-            try:
-                payload = json.dumps(sub, ensure_ascii=False)
-                return cast(Article.filter_path, JSONB).op('@>')(cast(literal(payload), JSONB))
-            except Exception:
-                # Fallback: always true no-op if cast fails
-                return Article.id.isnot(None)
-
-        query = Article.query.filter(Article.is_published.is_(True))
-
-        # City: accept either filter_path.city == city OR audience city match
-        if city:
-            fp_city = fp_contains({'city': city})
-            # audience mapping: resolve city_key -> City id
-            from app.models import City
-            resolved_id = None
-            try:
-                key_to_name = {
-                    'nsk': 'Новосибирск',
-                    'spb': 'Санкт-Петербург',
-                    'msk': 'Москва',
-                    'ekb': 'Екатеринбург',
-                    'krd': 'Краснодар',
-                    'rnd': 'Ростов-на-Дону',
-                }
-                target = key_to_name.get(city)
-                if target:
-                    from sqlalchemy import func
-                    c = City.query.filter(func.lower(City.name) == func.lower(target)).first()
-                    if c:
-                        resolved_id = c.id
-            except Exception:
-                resolved_id = None
-            aud_city = and_(Article.audience == 'city', Article.audience_city_id == resolved_id) if resolved_id else None
-            query = query.filter(or_(fp_city, aud_city) if aud_city is not None else fp_city)
-
-        if institution_type:
-            query = query.filter(fp_contains({'institution_type': institution_type}))
-        if program:
-            query = query.filter(fp_contains({'program': program}))
-        if course:
-            # course may be numeric audience field or string in filter_path
-            try:
-                course_num = int(course)
-            except Exception:
-                course_num = None
-            fp_course = fp_contains({'course': str(course)})
-            aud_course = and_(Article.audience == 'course', Article.audience_course == course_num) if course_num is not None else None
-            query = query.filter(or_(fp_course, aud_course) if aud_course is not None else fp_course)
-        if form:
-            query = query.filter(fp_contains({'form': form}))
-
-        articles = query.order_by(Article.created_at.desc()).all()
-        result = [{
-            'id': a.id,
-            'title': a.title,
-            'content': (a.content[:200] + '...') if a.content and len(a.content) > 200 else (a.content or ''),
-            'created_at': a.created_at.isoformat() if a.created_at else None,
-            'filter_path': a.filter_path,
-            'views_count': getattr(a, 'views_count', 0),
-            'audience': a.audience,
-            'audience_city_id': a.audience_city_id,
-            'audience_course': a.audience_course,
-        } for a in articles]
-        return jsonify({'success': True, 'data': result, 'total': len(result)}), 200
+        plan = plan_for(FilterContext.from_args(request.args))
+
+        limit = min(max(request.args.get('limit', DEFAULT_ARTICLES_LIMIT, type=int), 1), MAX_ARTICLES_LIMIT)
+        cursor = request.args.get('cursor')
+        after = None
+        if cursor:
+            after = _decode_cursor(cursor)
+            if after is None:
+                return jsonify({'error': 'invalid cursor'}), 400
+        fields = [f.strip() for f in (request.args.get('fields') or '').split(',') if f.strip()]
+        unknown = [f for f in fields if f not in ARTICLE_LIST_FIELDS]
+        if unknown:
+            return jsonify({'error': f'unknown fields: {", ".join(unknown)}'}), 400
+        fields = ['id'] + [f for f in fields if f != 'id'] if fields else list(ARTICLE_LIST_FIELDS)
+        want_total = request.args.get('total', '1').lower() not in ('0', 'false', 'no')
+
+        from sqlalchemy import or_, and_, func
+
+        # Only the first CONTENT_PREVIEW_CHARS + 1 characters leave the DB: enough to know whether to add '...'
+        columns = {
+            'content': func.substr(Article.content, 1, CONTENT_PREVIEW_CHARS + 1).label('content'),
+        }
+        selected = [columns.get(f, getattr(Article, f)) for f in fields]
+        selected += [Article.created_at.label('_cursor_created_at'), Article.id.label('_cursor_id')]
+
+        index = get_bitmap_index() if plan.bitmap is not None else None
+        if index is not None:
+            with index:
+                bits = plan.bits(index)
+                page_ids, total = index.page(bits, limit=limit + 1, before=after)
+            total = total if want_total else None
+            by_id = {}
+            if page_ids:
+                by_id = {row._cursor_id: row for row in Article.query.with_entities(*selected).filter(
+                    Article.id.in_(page_ids), Article.is_published.is_(True)).all()}
+            rows = [by_id[i] for i in page_ids if i in by_id]
+        else:
+            query = Article.query.filter(*plan.conditions)
+
+            total = query.with_entities(func.count(Article.id)).scalar() if want_total else None
+
+            if after is not None:
+                after_created_at, after_id = after
+                query = query.filter(or_(
+                    Article.created_at < after_created_at,
+                    and_(Article.created_at == after_created_at, Article.id < after_id),
+                ))
+            rows = (query.with_entities(*selected)
+                    .order_by(Article.created_at.desc(), Article.id.desc())
+                    .limit(limit + 1)
+                    .all())
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        result = []
+        for row in rows:
+            item = {}
+            for f in fields:
+                value = getattr(row, f)
+                if f == 'content':
+                    value = (value[:CONTENT_PREVIEW_CHARS] + '...') if value and len(value) > CONTENT_PREVIEW_CHARS else (value or '')
+                elif f == 'created_at':
+                    value = value.isoformat() if value else None
+                item[f] = value
+            result.append(item)
+        next_cursor = _encode_cursor(rows[-1]._cursor_created_at, rows[-1]._cursor_id) if has_more and rows else None
+        return jsonify({
+            'success': True,
+            'data': result,
+            'total': total,
+            'has_more': has_more,
+            'next_cursor': next_cursor
+        }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@filters_bp.route('/articles/<int:article_id>/filters', methods=['POST'])
-@jwt_required()
-def assign_filters_to_article(article_id):
-    """Назначить фильтры для статьи"""
+@filters_bp.route('/facets', methods=['GET'])
+@cached('articles', 'filters')
+def get_filter_facets():
+    """Счётчики для инкрементального сужения: для текущего частичного выбора
+    (city, institution_type, program, course, form, filter_group_ids) - число опубликованных статей
+    по каждому значению каждого ещё не выбранного измерения.
+    Один запрос: UNION ALL из GROUP BY по индексированным колонкам fp_*; город и курс
+    учитывают и legacy audience city/course, как /api/filters/articles.
+    """
     try:
-        data = request.get_json()
-        article = Article.query.get_or_404(article_id)
-
-        # Создаем путь фильтрации
-        filter_path = {
-            'institution_type': data.get('institution_type'),
-            'city': data.get('city'),
-            'program': data.get('program'),
-            'course': data.get('course'),
-            'form': data.get('form')
-        }
-
-        # Обновляем статью
-        article.filter_path = filter_path
-        article.filter_tree_id = data.get('filter_tree_id')
+        from sqlalchemy import func, literal, select, union, union_all
+
+        context = FilterContext.from_args(request.args)
+        selection = context.selection()
+        conditions = plan_for(context).conditions
+        remaining = [key for key in FILTER_KEYS if key not in selection]
+
+        parts = [
+            select(literal('').label('dimension'), literal(None, db.String).label('value'), func.count(Article.id).label('count'))
+            .where(*conditions)
+        ]
+        for key in remaining:
+            branches = _facet_branches(key, conditions)
+            if len(branches) == 1:
+                column = fp_column(key)
+                parts.append(
+                    select(literal(key).label('dimension'), column.label('value'), func.count(Article.id).label('count'))
+                    .where(*conditions, column.isnot(None))
+                    .group_by(column)
+                )
+                continue
+            # UNION, not UNION ALL: an article in both branches of a bucket counts once
+            pairs = union(*branches).subquery()
+            parts.append(
+                select(literal(key).label('dimension'), pairs.c.value, func.count(pairs.c.article_id).label('count'))
+                .group_by(pairs.c.value)
+            )
+        rows = db.session.execute(union_all(*parts)).all()
+
+        total = 0
+        facets = {key: {} for key in remaining}
+        for dimension, value, count in rows:
+            if not dimension:
+                total = count
+            else:
+                facets[dimension][value] = count
+        return jsonify({
+            'success': True,
+            'selection': selection,
+            'total': total,
+            'facets': facets,
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        # Создаем связи с группами фильтров
-        filter_group_ids = data.get('filter_group_ids', [])
-        for group_id in filter_group_ids:
-            article_filter = ArticleFilter(
-                article_id=article.id,
-                filter_group_id=group_id
+def _facet_branches(key, conditions):
+    """(article_id, value) selects of a facet: the fp_* column, plus the legacy audience
+    city / course that the filter plan matches for a selected city / course"""
+    from sqlalchemy import String, case, cast, select
+    column = fp_column(key)
+    branches = [select(Article.id.label('article_id'), column.label('value')).where(*conditions, column.isnot(None))]
+    if key == 'city':
+        registry = get_key_registry()
+        keys = {registry.city_id(city): city for city in CITY_NAMES}
+        keys.pop(None, None)
+        if keys:
+            branches.append(
+                select(Article.id, case(keys, value=Article.audience_city_id))
+                .where(*conditions, Article.audience == 'city', Article.audience_city_id.in_(keys))
             )
-            db.session.add(article_filter)
+    elif key == 'course':
+        # both spellings: course=2 and course=2 course each match audience_course 2
+        number = cast(Article.audience_course, String)
+        legacy = (*conditions, Article.audience == 'course', Article.audience_course.isnot(None))
+        branches += [select(Article.id, number).where(*legacy),
+                     select(Article.id, number + ' course').where(*legacy)]
+    return branches
+
+
+def _check_assignments(assignments):
+    """Error response for unknown articles / filter groups, None if all exist"""
+    article_ids = {a.article_id for a in assignments}
+    found = {i for (i,) in db.session.query(Article.id).filter(Article.id.in_(article_ids))}
+    if article_ids - found:
+        return jsonify({'error': 'articles not found', 'article_ids': sorted(article_ids - found)}), 404
+    group_ids = set().union(*(a.filter_group_ids for a in assignments))
+    if group_ids:
+        known = {i for (i,) in db.session.query(FilterGroup.id).filter(FilterGroup.id.in_(group_ids))}
+        if group_ids - known:
+            return jsonify({'error': 'unknown filter groups', 'filter_group_ids': sorted(group_ids - known)}), 400
+    return None
 
+@filters_bp.route('/articles/<int:article_id>/filters', methods=['POST'])
+@jwt_required()
+def assign_filters_to_article(article_id):
+    """Назначить фильтры для статьи: filter_path и ровно набор filter_group_ids
+    (недостающие связи добавляются, лишние удаляются; replace=false - только добавить)"""
+    try:
+        data = request.get_json() or {}
+        Article.query.get_or_404(article_id)
+
+        # Путь фильтрации обновляется всегда, как и раньше
+        assignment = Assignment.from_request(data, article_id)
+        assignment.filter_path = {key: data.get(key) for key in FILTER_KEYS}
+        assignment.filter_tree_id = data.get('filter_tree_id')
+        error = _check_assignments([assignment])
+        if error:
+            return error
+
+        stats = sync_article_filters([assignment], replace=data.get('replace', True) is not False)
         db.session.commit()
 
         return jsonify({
             'success': True,
-            'message': 'Filters assigned successfully'
+            'message': 'Filters assigned successfully',
+            'stats': stats.as_dict(),
         })
 
+    except (TypeError, ValueError) as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-def build_filter_hierarchy(filter_tree):
-    """Построить иерархию фильтров"""
-    hierarchy = {}
-
-    for inst_type in filter_tree.institution_types:
-        if not inst_type.is_active:
-            continue
+@filters_bp.route('/articles/filters', methods=['POST'])
+@jwt_required()
+def assign_filters_to_articles():
+    """Назначить фильтры сразу многим статьям в одной транзакции.
+    Тело: {"items": [{"article_id", "filter_group_ids", "city", ..., "filter_tree_id"}, ...]}
+    или {"article_ids": [...], "filter_group_ids": [...], ...} - одни фильтры для всех.
+    filter_path меняется только у статей, где передан хотя бы один его ключ.
+    replace=false - только добавить связи, не удаляя лишние.
+    """
+    try:
+        data = request.get_json() or {}
+        items = data.get('items')
+        if items is None:
+            article_ids = data.get('article_ids')
+            if not isinstance(article_ids, list):
+                return jsonify({'error': 'items or article_ids is required'}), 400
+            shared = {k: v for k, v in data.items() if k not in ('article_ids', 'replace')}
+            items = [dict(shared, article_id=article_id) for article_id in article_ids]
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'items must be a non-empty list'}), 400
+        if len(items) > MAX_ASSIGN_ARTICLES:
+            return jsonify({'error': f'at most {MAX_ASSIGN_ARTICLES} articles per request'}), 400
+
+        assignments = [Assignment.from_request(item) for item in items]
+        error = _check_assignments(assignments)
+        if error:
+            return error
+
+        stats = sync_article_filters(assignments, replace=data.get('replace', True) is not False)
+        db.session.commit()
 
-        hierarchy[inst_type.type_key] = {
-            'display_name': inst_type.display_name,
-            'general': {},
-            'city': {},
-            'study_info': {}
-        }
+        return jsonify({
+            'success': True,
+            'message': 'Filters assigned successfully',
+            'stats': stats.as_dict(),
+        })
 
-        # Общие фильтры
-        for general in inst_type.general_filters:
-            if general.filter_key == 'general':
-                hierarchy[inst_type.type_key]['general'] = {
-                    'id': general.id,
-                    'display_name': general.display_name
-                }
-            elif general.filter_key == 'city':
-                hierarchy[inst_type.type_key]['city'] = {}
-                for city in general.city_filters:
-                    hierarchy[inst_type.type_key]['city'][city.city_key] = {
-                        'id': city.id,
-                        'display_name': city.display_name
-                    }
-            elif general.filter_key == 'study_info':
-                hierarchy[inst_type.type_key]['study_info'] = {}
-                for program in general.study_info_filters:
-                    hierarchy[inst_type.type_key]['study_info'][program.program_key] = {}
-                    for course in program.courses:
-                        hierarchy[inst_type.type_key]['study_info'][program.program_key][course.course_key] = {}
-                        for form in course.education_forms:
-                            hierarchy[inst_type.type_key]['study_info'][program.program_key][course.course_key][form.form_key] = {}
-                            for city_instance in form.city_instances:
-                                hierarchy[inst_type.type_key]['study_info'][program.program_key][course.course_key][form.form_key][city_instance.city_key] = {
-                                    'id': city_instance.id,
-                                    'display_name': city_instance.display_name
-                                }
-
-    return hierarchy
-
-def get_display_name(key):
-    """Получить отображаемое имя для ключа"""
-    display_names = {
-        'college': 'Колледж',
-        'university': 'Университет',
-        'school': 'Школа',
-        'general': 'Общее',
-        'city': 'Город',
-        'study_info': 'Учебная информация',
-        'programming': 'Программирование',
-        'sys_adm': 'Системное администрирование',
-        'design': 'Дизайн',
-        'commercial': 'Реклама',
-        'web_design': 'Веб-дизайн',
-        'gamedev': 'Разработка игр',
-        'ai': 'Искусственный интеллект',
-        '3d': '3D моделирование',
-        'cybersport': 'Киберспорт',
-        'info_sec': 'Информационная безопасность',
-        'tech': 'Технологии',
-        'full_time': 'Очная',
-        'remote': 'Заочная',
-        'dist': 'Дистанционная',
-        'blended': 'Смешанная'
-    }
-    return display_names.get(key, key)
-
-def get_city_display_name(key):
-    """Получить отображаемое имя города"""
-    city_names = {
-        'nsk': 'Новосибирск',
-        'spb': 'Санкт-Петербург',
-        'msk': 'Москва',
-        'ekb': 'Екатеринбург',
-        'krd': 'Краснодар',
-        'rnd': 'Ростов-на-Дону'
-    }
-    return city_names.get(key, key)
-
-def get_program_display_name(key):
-    """Получить отображаемое имя программы"""
-    program_names = {
-        'programming': 'Программирование',
-        'sys_adm': 'Системное администрирование',
-        'design': 'Дизайн',
-        'commercial': 'Реклама',
-        'web_design': 'Веб-дизайн',
-        'gamedev': 'Разработка игр',
-        'ai': 'Искусственный интеллект',
-        '3d': '3D моделирование',
-        'cybersport': 'Киберспорт',
-        'info_sec': 'Информационная безопасность',
-        'tech': 'Технологии'
-    }
-    return program_names.get(key, key)
-
-def get_course_display_name(key):
-    """Получить отображаемое имя курса"""
-    course_names = {
-        '1 course': '1 курс',
-        '2 course': '2 курс',
-        '3 course': '3 курс',
-        '4 course': '4 курс'
-    }
-    return course_names.get(key, key)
-
-def get_form_display_name(key):
-    """Получить отображаемое имя формы обучения"""
-    form_names = {
-        'full_time': 'Очная',
-        'remote': 'Заочная',
-        'dist': 'Дистанционная',
-        'blended': 'Смешанная'
-    }
-    return form_names.get(key, key)
+    except (TypeError, ValueError) as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,180 @@
+"""Filter tree loader and compiled, versioned snapshots for GET /api/filters/tree.
+
+`load_hierarchy(tree_id)` reads the tree with one query per level (types,
+general filters, cities, programs, courses, forms, city instances) instead
+of walking lazy relationships node by node. `get_snapshot()` keeps the
+serialized response per (tree id, version) in process memory; the version
+column on FilterTree is bumped in the same transaction as any write to the
+filter_* tables, so every worker notices the change with its next
+one-row version lookup and rebuilds once.
+"""
+import hashlib
+import threading
+from dataclasses import dataclass
+
+from sqlalchemy import event, select, update
+
+from app.db_pool import RoutingSession
+
+FILTER_TABLE_PREFIX = 'filter_'
+VERSIONED_TABLE = 'filter_trees'
+
+
+@dataclass(frozen=True)
+class TreeSnapshot:
+    tree_id: int
+    version: int
+    body: bytes  # serialized {'success': True, 'data': hierarchy}
+    etag: str  # unquoted; Response.set_etag() adds the quotes
+
+
+_snapshots = {}
+_lock = threading.Lock()
+
+
+def _by_parent(rows, parent_attr):
+    children = {}
+    for row in rows:
+        children.setdefault(getattr(row, parent_attr), []).append(row)
+    return children
+
+
+def load_hierarchy(tree_id: int) -> dict:
+    """Same structure as the former relationship walk, built from 7 level queries"""
+    from app import db
+    from app.models import (
+        FilterInstitutionType, FilterGeneral, FilterCity, FilterStudyProgram,
+        FilterCourse, FilterEducationForm, FilterCityInstance,
+    )
+
+    def level(model, parent_column, parent_ids, *columns):
+        if not parent_ids:
+            return []
+        return db.session.execute(
+            select(model.id, parent_column, *columns)
+            .where(parent_column.in_(parent_ids))
+            .order_by(model.id)
+        ).all()
+
+    inst_types = db.session.execute(
+        select(FilterInstitutionType.id, FilterInstitutionType.type_key, FilterInstitutionType.display_name)
+        .where(FilterInstitutionType.filter_tree_id == tree_id, FilterInstitutionType.is_active.is_(True))
+        .order_by(FilterInstitutionType.id)
+    ).all()
+    generals = level(FilterGeneral, FilterGeneral.institution_type_id, [t.id for t in inst_types],
+                     FilterGeneral.filter_key, FilterGeneral.display_name)
+    general_ids = [g.id for g in generals]
+    cities = level(FilterCity, FilterCity.general_filter_id, general_ids,
+                   FilterCity.city_key, FilterCity.display_name)
+    programs = level(FilterStudyProgram, FilterStudyProgram.general_filter_id, general_ids,
+                     FilterStudyProgram.program_key)
+    courses = level(FilterCourse, FilterCourse.study_program_id, [p.id for p in programs],
+                    FilterCourse.course_key)
+    forms = level(FilterEducationForm, FilterEducationForm.course_id, [c.id for c in courses],
+                  FilterEducationForm.form_key)
+    instances = level(FilterCityInstance, FilterCityInstance.education_form_id, [f.id for f in forms],
+                      FilterCityInstance.city_key, FilterCityInstance.display_name)
+
+    generals_of = _by_parent(generals, 'institution_type_id')
+    cities_of = _by_parent(cities, 'general_filter_id')
+    programs_of = _by_parent(programs, 'general_filter_id')
+    courses_of = _by_parent(courses, 'study_program_id')
+    forms_of = _by_parent(forms, 'course_id')
+    instances_of = _by_parent(instances, 'education_form_id')
+
+    hierarchy = {}
+    for inst_type in inst_types:
+        node = hierarchy[inst_type.type_key] = {
+            'display_name': inst_type.display_name,
+            'general': {},
+            'city': {},
+            'study_info': {},
+        }
+        for general in generals_of.get(inst_type.id, ()):
+            if general.filter_key == 'general':
+                node['general'] = {'id': general.id, 'display_name': general.display_name}
+            elif general.filter_key == 'city':
+                node['city'] = {
+                    city.city_key: {'id': city.id, 'display_name': city.display_name}
+                    for city in cities_of.get(general.id, ())
+                }
+            elif general.filter_key == 'study_info':
+                study_info = node['study_info'] = {}
+                for program in programs_of.get(general.id, ()):
+                    program_node = study_info[program.program_key] = {}
+                    for course in courses_of.get(program.id, ()):
+                        course_node = program_node[course.course_key] = {}
+                        for form in forms_of.get(course.id, ()):
+                            course_node[form.form_key] = {
+                                inst.city_key: {'id': inst.id, 'display_name': inst.display_name}
+                                for inst in instances_of.get(form.id, ())
+                            }
+    return hierarchy
+
+
+def get_snapshot():
+    """Snapshot of the active tree, rebuilt only when its version changed; None if no active tree"""
+    from flask import current_app
+    from app import db
+    from app.models import FilterTree
+
+    row = db.session.execute(
+        select(FilterTree.id, FilterTree.version)
+        .where(FilterTree.is_active.is_(True))
+        .order_by(FilterTree.id)
+        .limit(1)
+    ).first()
+    if row is None:
+        return None
+    key = (row.id, row.version)
+    snapshot = _snapshots.get(key)
+    if snapshot is not None:
+        return snapshot
+    with _lock:
+        snapshot = _snapshots.get(key)
+        if snapshot is None:
+            body = current_app.json.dumps({'success': True, 'data': load_hierarchy(row.id)}).encode() + b'\n'
+            etag = f'ft-{row.id}-{row.version}-{hashlib.sha1(body).hexdigest()[:12]}'
+            snapshot = TreeSnapshot(row.id, row.version, body, etag)
+            # older versions of this tree are never served again
+            for old in [k for k in _snapshots if k[0] == row.id]:
+                del _snapshots[old]
+            _snapshots[key] = snapshot
+    return snapshot
+
+
+def _touches_filters(table_name) -> bool:
+    return bool(table_name) and table_name.startswith(FILTER_TABLE_PREFIX) and table_name != VERSIONED_TABLE
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _note_flushed(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if _touches_filters(getattr(obj, '__tablename__', None)):
+            session.info['filter_tree_dirty'] = True
+            return
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _note_bulk_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None and _touches_filters(table.name):
+            orm_execute_state.session.info['filter_tree_dirty'] = True
+
+
+@event.listens_for(RoutingSession, 'before_commit')
+def _bump_tree_version(session):
+    if any(_touches_filters(getattr(obj, '__tablename__', None))
+           for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info['filter_tree_dirty'] = True
+    if session.info.pop('filter_tree_dirty', False):
+        from app.models import FilterTree
+        # A handful of trees at most; bumping all of them avoids resolving each node's tree
+        session.execute(update(FilterTree).values(version=FilterTree.version + 1))
+
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _forget_rolled_back(session, previous_transaction):
+    if not session.in_transaction():
+        session.info.pop('filter_tree_dirty', None)
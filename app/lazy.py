@@ -0,0 +1,24 @@
+"""Deferred view loading for rarely used endpoints.
+
+Route modules are imported when create_app registers blueprints, so
+everything they import is paid for by every gunicorn worker at boot.
+Endpoints that are seldom called and pull in extra modules (Weeek import,
+CSV import/export) are registered with a LazyView instead: the URL rule
+exists immediately, and the implementing module is imported on the first
+request that hits it.
+"""
+from werkzeug.utils import cached_property, import_string
+
+
+class LazyView:
+    def __init__(self, import_name: str):
+        # Endpoint name and module match the real view, so url_for() keeps working
+        self.__module__, self.__name__ = import_name.rsplit('.', 1)
+        self.import_name = import_name
+
+    @cached_property
+    def view(self):
+        return import_string(self.import_name)
+
+    def __call__(self, *args, **kwargs):
+        return self.view(*args, **kwargs)
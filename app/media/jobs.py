@@ -0,0 +1,224 @@
+"""Persistent background queue for media processing.
+
+Jobs live in the `media_jobs` table. Uploads only enqueue work; a separate
+`flask media-worker` process claims and runs it. Claiming uses
+SELECT ... FOR UPDATE SKIP LOCKED on Postgres/MySQL 8 so several workers can
+poll concurrently; SQLite (single writer) uses a compare-and-set UPDATE.
+"""
+import io
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import ArticleMedia, ArticleMediaVariant, MediaJob
+
+log = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+# A 'running' job whose worker died is handed out again after this lease expires
+LEASE_SECONDS = 600
+THUMB_SIZE = (320, 320)
+
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    def register(fn):
+        JOB_HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def jobs_for(media_type: str, mime_type: str = None, file_name: str = None) -> list:
+    """Job kinds to run for a freshly uploaded file"""
+    kinds = []
+    if media_type == 'image':
+        kinds.append('thumbnail')
+    ext = (file_name or '').rsplit('.', 1)[-1].lower()
+    if mime_type == 'application/pdf' or ext == 'pdf':
+        kinds.append('pdf_preview')
+    return kinds
+
+
+def enqueue(media, kinds) -> list:
+    """Add jobs for `media` to the current session (caller commits).
+    Sets media.status to 'processing' when there is anything to do."""
+    jobs = [MediaJob(media_id=media.id, kind=kind, status='pending', run_after=datetime.utcnow()) for kind in kinds]
+    for job in jobs:
+        db.session.add(job)
+    media.status = 'processing' if jobs else 'ready'
+    return jobs
+
+
+def default_worker_id() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _dialect() -> str:
+    return db.session.get_bind().dialect.name
+
+
+def _release_stale_jobs():
+    expired = datetime.utcnow() - timedelta(seconds=LEASE_SECONDS)
+    MediaJob.query.filter(
+        MediaJob.status == 'running',
+        MediaJob.locked_at < expired
+    ).update({MediaJob.status: 'pending', MediaJob.locked_by: None}, synchronize_session=False)
+    db.session.commit()
+
+
+def claim_next(worker_id: str):
+    """Atomically take the oldest runnable job; returns it (status 'running') or None"""
+    now = datetime.utcnow()
+    runnable = MediaJob.query.filter(MediaJob.status == 'pending', MediaJob.run_after <= now).order_by(MediaJob.id)
+    if _dialect() in ('postgresql', 'mysql'):
+        job = runnable.with_for_update(skip_locked=True).first()
+        if not job:
+            db.session.rollback()
+            return None
+        job.status = 'running'
+        job.locked_by = worker_id
+        job.locked_at = now
+        job.attempts = (job.attempts or 0) + 1
+        db.session.commit()
+        return job
+
+    # SQLite: no row locks; a conditional UPDATE is the claim, retry if another worker won
+    for _ in range(5):
+        candidate = runnable.with_entities(MediaJob.id).first()
+        if not candidate:
+            db.session.rollback()
+            return None
+        claimed = MediaJob.query.filter(
+            MediaJob.id == candidate.id,
+            MediaJob.status == 'pending'
+        ).update({
+            MediaJob.status: 'running',
+            MediaJob.locked_by: worker_id,
+            MediaJob.locked_at: now,
+            MediaJob.attempts: MediaJob.attempts + 1,
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return db.session.get(MediaJob, candidate.id)
+    return None
+
+
+def run_job(job) -> bool:
+    """Execute a claimed job and record the outcome. Returns True on success."""
+    handler = JOB_HANDLERS.get(job.kind)
+    try:
+        if not handler:
+            raise ValueError(f'unknown job kind: {job.kind}')
+        note = handler(job.media_id)
+        job.status = 'done'
+        job.last_error = note
+        job.finished_at = datetime.utcnow()
+        ok = True
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(MediaJob, job.id)
+        job.last_error = str(e)[:2000]
+        if (job.attempts or 0) >= MAX_ATTEMPTS:
+            job.status = 'failed'
+            job.finished_at = datetime.utcnow()
+        else:
+            # Exponential backoff: 30s, 60s, ...
+            job.status = 'pending'
+            job.run_after = datetime.utcnow() + timedelta(seconds=30 * (2 ** max(0, (job.attempts or 1) - 1)))
+        log.warning('media job %s (%s) failed: %s', job.id, job.kind, e)
+        ok = False
+    job.locked_by = None
+    _refresh_media_status(job.media_id)
+    db.session.commit()
+    return ok
+
+
+def _refresh_media_status(media_id: int):
+    statuses = [s for (s,) in db.session.query(MediaJob.status).filter(MediaJob.media_id == media_id).all()]
+    if any(s in ('pending', 'running') for s in statuses):
+        status = 'processing'
+    elif any(s == 'failed' for s in statuses):
+        status = 'failed'
+    else:
+        status = 'ready'
+    ArticleMedia.query.filter_by(id=media_id).update({ArticleMedia.status: status}, synchronize_session=False)
+
+
+def work(worker_id: str = None, once: bool = False, poll_interval: float = 2.0, stop=None) -> int:
+    """Worker loop. With once=True drains the queue and returns; otherwise polls forever
+    (or until stop() returns True). Returns number of processed jobs."""
+    import time
+    worker_id = worker_id or default_worker_id()
+    processed = 0
+    _release_stale_jobs()
+    while not (stop and stop()):
+        job = claim_next(worker_id)
+        if job is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
+    return processed
+
+
+def _load_blob(media_id: int) -> bytes:
+    return db.session.query(ArticleMedia.data).filter(ArticleMedia.id == media_id).scalar() or b''
+
+
+def _store_variant(media_id: int, kind: str, data: bytes, mime_type: str, width: int = None, height: int = None):
+    import hashlib
+    variant = ArticleMediaVariant.query.filter_by(media_id=media_id, kind=kind).first()
+    if not variant:
+        variant = ArticleMediaVariant(media_id=media_id, kind=kind)
+        db.session.add(variant)
+    variant.data = data
+    variant.mime_type = mime_type
+    variant.width = width
+    variant.height = height
+    variant.byte_size = len(data)
+    variant.content_hash = hashlib.sha256(data).hexdigest()
+    return variant
+
+
+@job_handler('hash')
+def hash_media(media_id: int):
+    """Backfill content hash/size for rows uploaded before hashes were stored"""
+    import hashlib
+    blob = _load_blob(media_id)
+    ArticleMedia.query.filter_by(id=media_id).update({
+        ArticleMedia.content_hash: hashlib.sha256(blob).hexdigest(),
+        ArticleMedia.byte_size: len(blob),
+    }, synchronize_session=False)
+
+
+@job_handler('thumbnail')
+def make_thumbnail(media_id: int):
+    from PIL import Image
+    with Image.open(io.BytesIO(_load_blob(media_id))) as img:
+        img.thumbnail(THUMB_SIZE)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA')
+        out = io.BytesIO()
+        img.save(out, format='WEBP', quality=80)
+        _store_variant(media_id, 'thumb', out.getvalue(), 'image/webp', img.width, img.height)
+
+
+@job_handler('pdf_preview')
+def make_pdf_preview(media_id: int):
+    try:
+        import fitz  # PyMuPDF, optional
+    except ImportError:
+        return 'skipped: PyMuPDF is not installed'
+    doc = fitz.open(stream=_load_blob(media_id), filetype='pdf')
+    try:
+        if doc.page_count == 0:
+            return 'skipped: empty document'
+        pix = doc.load_page(0).get_pixmap(dpi=72)
+        _store_variant(media_id, 'preview', pix.tobytes('png'), 'image/png', pix.width, pix.height)
+    finally:
+        doc.close()
@@ -0,0 +1,115 @@
+"""Slim, blob-free query paths for article media metadata."""
+from sqlalchemy import func
+from app import db
+from app.models import Article, ArticleMedia, ArticleMediaLink, ArticleMediaVariant
+
+# Columns needed to describe media in article payloads; never includes ArticleMedia.data
+MEDIA_META_COLUMNS = (
+    ArticleMedia.id,
+    ArticleMedia.media_type,
+    ArticleMedia.file_name,
+    ArticleMedia.mime_type,
+    ArticleMedia.caption,
+    ArticleMedia.created_at,
+)
+
+
+def serialize_media_row(row) -> dict:
+    return {
+        'id': row.id,
+        'media_type': row.media_type,
+        'file_name': row.file_name,
+        'mime_type': row.mime_type,
+        'caption': row.caption,
+        'position': row.position,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+    }
+
+
+def load_article_media(article_ids) -> dict:
+    """Batched loader: one query for the media metadata of many articles.
+    Returns {article_id: [media dict, ...]} ordered by position; articles
+    without media are present with an empty list.
+    """
+    ids = [int(a) for a in article_ids if a is not None]
+    result = {a: [] for a in ids}
+    if not ids:
+        return result
+    rows = (
+        db.session.query(ArticleMediaLink.article_id, ArticleMediaLink.position, *MEDIA_META_COLUMNS)
+        .join(ArticleMedia, ArticleMedia.id == ArticleMediaLink.media_id)
+        .filter(ArticleMediaLink.article_id.in_(ids))
+        .order_by(ArticleMediaLink.article_id, func.coalesce(ArticleMediaLink.position, 0), ArticleMedia.id)
+        .all()
+    )
+    for row in rows:
+        result[row.article_id].append(serialize_media_row(row))
+    return result
+
+
+def media_exists(media_id: int) -> bool:
+    return db.session.query(ArticleMedia.id).filter(ArticleMedia.id == media_id).first() is not None
+
+
+def load_media_manifest(article_id: int):
+    """Compact manifest of an article's media in a single query: positions, sizes,
+    hashes and variant URLs. Returns None if the article does not exist."""
+    rows = (
+        db.session.query(
+            Article.id.label('article_id'),
+            ArticleMediaLink.position,
+            ArticleMedia.id,
+            ArticleMedia.media_type,
+            ArticleMedia.file_name,
+            ArticleMedia.mime_type,
+            ArticleMedia.caption,
+            ArticleMedia.byte_size,
+            ArticleMedia.content_hash,
+            ArticleMedia.status,
+            ArticleMediaVariant.kind.label('variant_kind'),
+            ArticleMediaVariant.mime_type.label('variant_mime_type'),
+            ArticleMediaVariant.byte_size.label('variant_byte_size'),
+            ArticleMediaVariant.width.label('variant_width'),
+            ArticleMediaVariant.height.label('variant_height'),
+            ArticleMediaVariant.content_hash.label('variant_hash'),
+        )
+        .select_from(Article)
+        .outerjoin(ArticleMediaLink, ArticleMediaLink.article_id == Article.id)
+        .outerjoin(ArticleMedia, ArticleMedia.id == ArticleMediaLink.media_id)
+        .outerjoin(ArticleMediaVariant, ArticleMediaVariant.media_id == ArticleMedia.id)
+        .filter(Article.id == article_id)
+        .order_by(func.coalesce(ArticleMediaLink.position, 0), ArticleMedia.id, ArticleMediaVariant.kind)
+        .all()
+    )
+    if not rows:
+        return None
+    items = {}
+    for row in rows:
+        if row.id is None:
+            continue
+        item = items.get(row.id)
+        if item is None:
+            is_link = row.media_type == 'link'
+            item = items[row.id] = {
+                'id': row.id,
+                'position': row.position,
+                'media_type': row.media_type,
+                'file_name': row.file_name,
+                'mime_type': row.mime_type,
+                'caption': row.caption,
+                'size': row.byte_size,
+                'hash': row.content_hash,
+                'status': row.status or 'ready',
+                'url': row.file_name if is_link else f'/api/media/{row.id}',
+                'variants': {},
+            }
+        if row.variant_kind:
+            item['variants'][row.variant_kind] = {
+                'url': f'/api/media/{row.id}/variants/{row.variant_kind}',
+                'mime_type': row.variant_mime_type,
+                'size': row.variant_byte_size,
+                'width': row.variant_width,
+                'height': row.variant_height,
+                'hash': row.variant_hash,
+            }
+    return list(items.values())
@@ -1,13 +1,17 @@
 from flask import request, jsonify, send_file, redirect, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.media import media_bp
-from app.models import ArticleMedia, ArticleMediaLink, Article, User
+from app.models import ArticleMedia, ArticleMediaLink, ArticleMediaVariant, MediaJob, Article, ArticleAuthor, User
+from app.media.loaders import load_article_media, load_media_manifest, media_exists
+from app.media.jobs import enqueue, jobs_for
 from app import db
 import os
 import mimetypes
 from werkzeug.utils import secure_filename
-from datetime import datetime
+from datetime import datetime, timezone
+import hashlib
 import io
+from sqlalchemy import case
 
 ALLOWED_EXTENSIONS = {
     # images
@@ -21,21 +25,37 @@ ALLOWED_EXTENSIONS = {
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def guess_mime(filename: str, fallback: str = 'application/octet-stream') -> str:
-    # Extend default types
-    mimetypes.add_type('text/markdown', '.md')
-    mimetypes.add_type('application/x-fictionbook+xml', '.fb2')
-    mimetypes.add_type('application/vnd.openxmlformats-officedocument.wordprocessingml.document', '.docx')
-    mimetypes.add_type('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', '.xlsx')
-    mimetypes.add_type('application/vnd.openxmlformats-officedocument.presentationml.presentation', '.pptx')
+# Media bytes never change for a given id, so stored files can be cached forever.
+MEDIA_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# External links may be edited/retargeted; keep redirects short-lived.
+LINK_CACHE_CONTROL = 'public, max-age=300'
+# Variants can be regenerated by the worker under the same URL; revalidate daily via ETag.
+VARIANT_CACHE_CONTROL = 'public, max-age=86400'
+
+def content_digest(data: bytes) -> str:
+    return hashlib.sha256(data or b'').hexdigest()
+
+# Extra extensions -> MIME types, registered once at import instead of on every call
+EXTRA_MIME_TYPES = (
+    ('text/markdown', '.md'),
+    ('application/x-fictionbook+xml', '.fb2'),
+    ('application/vnd.openxmlformats-officedocument.wordprocessingml.document', '.docx'),
+    ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', '.xlsx'),
+    ('application/vnd.openxmlformats-officedocument.presentationml.presentation', '.pptx'),
     # common video types
-    mimetypes.add_type('video/mp4', '.mp4')
-    mimetypes.add_type('video/x-matroska', '.mkv')
-    mimetypes.add_type('video/webm', '.webm')
-    mimetypes.add_type('video/quicktime', '.mov')
-    mimetypes.add_type('video/x-msvideo', '.avi')
-    mimetypes.add_type('video/x-m4v', '.m4v')
-    mimetypes.add_type('video/3gpp', '.3gp')
+    ('video/mp4', '.mp4'),
+    ('video/x-matroska', '.mkv'),
+    ('video/webm', '.webm'),
+    ('video/quicktime', '.mov'),
+    ('video/x-msvideo', '.avi'),
+    ('video/x-m4v', '.m4v'),
+    ('video/3gpp', '.3gp'),
+)
+for _mime, _ext in EXTRA_MIME_TYPES:
+    mimetypes.add_type(_mime, _ext)
+
+
+def guess_mime(filename: str, fallback: str = 'application/octet-stream') -> str:
     mime, _ = mimetypes.guess_type(filename)
     return mime or fallback
 
@@ -82,10 +102,15 @@ def upload_media():
             data=file_data,
             file_name=filename,
             mime_type=(file.content_type or guess_mime(filename)),
-            caption=request.form.get('caption', '')
+            caption=request.form.get('caption', ''),
+            content_hash=content_digest(file_data),
+            byte_size=len(file_data)
         )
         
         db.session.add(media)
+        db.session.flush()
+        # Heavy work (thumbnails, previews) is done by `flask media-worker`
+        enqueue(media, jobs_for(media.media_type, media.mime_type, media.file_name))
         db.session.commit()
         
         return jsonify({
@@ -94,6 +119,8 @@ def upload_media():
             'media_type': media.media_type,
             'mime_type': media.mime_type,
             'caption': media.caption,
+            'status': media.status,
+            'status_url': f'/api/media/{media.id}/status',
             'message': 'File uploaded successfully'
         }), 201
         
@@ -109,9 +136,27 @@ def get_media(media_id):
     media = ArticleMedia.query.get_or_404(media_id)
     # Handle link redirects
     if media.media_type == 'link' and media.file_name:
-        return redirect(media.file_name, code=302)
+        rv = redirect(media.file_name, code=302)
+        rv.headers['Cache-Control'] = LINK_CACHE_CONTROL
+        return rv
 
-    data = media.data or b''
+    if not media.content_hash:
+        # Legacy row uploaded before hashes were stored: compute once and persist
+        blob = db.session.query(ArticleMedia.data).filter(ArticleMedia.id == media.id).scalar() or b''
+        media.content_hash = content_digest(blob)
+        media.byte_size = len(blob)
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+
+    # Conditional requests are answered from metadata, without reading the blob
+    if _is_not_modified(media):
+        rv = Response(status=304)
+        _set_cache_headers(rv, media)
+        return rv
+
+    data = db.session.query(ArticleMedia.data).filter(ArticleMedia.id == media.id).scalar() or b''
     mime = media.mime_type or guess_mime(media.file_name or '')
 
     # Handle Range requests for streaming
@@ -135,6 +180,7 @@ def get_media(media_id):
             rv.headers.add('Accept-Ranges', 'bytes')
             rv.headers.add('Content-Length', str(len(chunk)))
             rv.headers.add('Content-Disposition', f'inline; filename="{media.file_name}"')
+            _set_cache_headers(rv, media)
             return rv
         except Exception:
             # Fallback to full content
@@ -146,10 +192,66 @@ def get_media(media_id):
         file_obj,
         mimetype=mime,
         as_attachment=False,
-        download_name=media.file_name
+        download_name=media.file_name,
+        conditional=False
     )
     # hint to clients that range is supported
     rv.headers.add('Accept-Ranges', 'bytes')
+    _set_cache_headers(rv, media)
+    return rv
+
+def _last_modified(media):
+    if not media.created_at:
+        return None
+    # created_at is stored as naive UTC; HTTP dates have second precision
+    return media.created_at.replace(tzinfo=timezone.utc, microsecond=0)
+
+def _set_cache_headers(rv, media, cache_control=MEDIA_CACHE_CONTROL):
+    rv.set_etag(media.content_hash)
+    last_modified = _last_modified(media)
+    if last_modified:
+        rv.last_modified = last_modified
+    rv.headers['Cache-Control'] = cache_control
+
+def _is_not_modified(media) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since (RFC 7232: ETag wins when both are sent)."""
+    if request.if_none_match:
+        return request.if_none_match.contains(media.content_hash) or request.if_none_match.star_tag
+    since = request.if_modified_since
+    last_modified = _last_modified(media)
+    if since and last_modified:
+        return last_modified <= since
+    return False
+
+@media_bp.route('/<int:media_id>/status', methods=['GET'])
+def get_media_status(media_id):
+    """Processing status for polling after upload: 'processing' | 'ready' | 'failed'"""
+    media = ArticleMedia.query.get_or_404(media_id)
+    jobs = MediaJob.query.filter_by(media_id=media_id).order_by(MediaJob.id).all()
+    variants = db.session.query(ArticleMediaVariant.kind).filter_by(media_id=media_id).all()
+    return jsonify({
+        'id': media.id,
+        'status': media.status or 'ready',
+        'jobs': [{
+            'kind': job.kind,
+            'status': job.status,
+            'attempts': job.attempts,
+            'error': job.last_error if job.status != 'done' else None
+        } for job in jobs],
+        'variants': {kind: f'/api/media/{media.id}/variants/{kind}' for (kind,) in variants}
+    }), 200
+
+@media_bp.route('/<int:media_id>/variants/<kind>', methods=['GET'])
+def get_media_variant(media_id, kind):
+    """Serve a derived rendition (e.g. 'thumb', 'preview') produced by the media worker"""
+    variant = ArticleMediaVariant.query.filter_by(media_id=media_id, kind=kind).first_or_404()
+    if _is_not_modified(variant):
+        rv = Response(status=304)
+        _set_cache_headers(rv, variant, VARIANT_CACHE_CONTROL)
+        return rv
+    data = db.session.query(ArticleMediaVariant.data).filter(ArticleMediaVariant.id == variant.id).scalar() or b''
+    rv = Response(data, 200, mimetype=variant.mime_type or 'application/octet-stream')
+    _set_cache_headers(rv, variant, VARIANT_CACHE_CONTROL)
     return rv
 
 @media_bp.route('/create-link', methods=['POST'])
@@ -192,28 +294,29 @@ def delete_media(media_id):
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    media = ArticleMedia.query.get_or_404(media_id)
+    db.session.query(ArticleMedia.id).filter(ArticleMedia.id == media_id).first_or_404()
     
     # Check if user has permission to delete this media
     # (Only authors of articles that use this media or admins/editors)
-    is_author = False
     is_admin_or_editor = user.role.name in ['Администратор', 'Редактор']
-    
-    for link in media.article_links:
-        article = link.article
-        if any(author.user_id == user.id for author in article.authors):
-            is_author = True
-            break
+    is_author = db.session.query(ArticleAuthor.article_id).join(
+        ArticleMediaLink, ArticleMediaLink.article_id == ArticleAuthor.article_id
+    ).filter(
+        ArticleMediaLink.media_id == media_id,
+        ArticleAuthor.user_id == user.id
+    ).first() is not None
     
     if not is_author and not is_admin_or_editor:
         return jsonify({'error': 'Unauthorized'}), 403
     
     try:
-        # Remove all article links first
-        ArticleMediaLink.query.filter_by(media_id=media_id).delete()
+        # Remove all article links, derived variants and queued jobs first
+        ArticleMediaLink.query.filter_by(media_id=media_id).delete(synchronize_session=False)
+        ArticleMediaVariant.query.filter_by(media_id=media_id).delete(synchronize_session=False)
+        MediaJob.query.filter_by(media_id=media_id).delete(synchronize_session=False)
         
-        # Delete media
-        db.session.delete(media)
+        # Delete media without loading the row (and its blob) into the session
+        ArticleMedia.query.filter_by(id=media_id).delete(synchronize_session=False)
         db.session.commit()
         
         return jsonify({'message': 'Media deleted successfully'}), 200
@@ -225,26 +328,78 @@ def delete_media(media_id):
 @media_bp.route('/article/<int:article_id>/media', methods=['GET'])
 def get_article_media(article_id):
     """Get all media for a specific article"""
-    article = Article.query.get_or_404(article_id)
-    
-    media_list = []
-    for media_link in article.media_links:
-        media_data = {
-            'id': media_link.media.id,
-            'media_type': media_link.media.media_type,
-            'file_name': media_link.media.file_name,
-            'mime_type': media_link.media.mime_type,
-            'caption': media_link.media.caption,
-            'position': media_link.position,
-            'created_at': media_link.media.created_at.isoformat()
-        }
-        media_list.append(media_data)
+    db.session.query(Article.id).filter(Article.id == article_id).first_or_404()
     
-    # Sort by position
-    media_list.sort(key=lambda x: x['position'] or 0)
+    media_list = load_article_media([article_id])[article_id]
     
     return jsonify(media_list), 200
 
+@media_bp.route('/article/<int:article_id>/manifest', methods=['GET'])
+def get_article_media_manifest(article_id):
+    """Compact media manifest (positions, sizes, hashes, variant URLs) in one query"""
+    manifest = load_media_manifest(article_id)
+    if manifest is None:
+        return jsonify({'error': 'Article not found'}), 404
+    return jsonify({'article_id': article_id, 'media': manifest}), 200
+
+@media_bp.route('/article/<int:article_id>/media/order', methods=['PUT'])
+@jwt_required()
+def update_media_order(article_id):
+    """Apply a full media ordering in one transaction.
+    Body: { media_ids: [int, ...] } — every media linked to the article, in display order.
+    """
+    user_id = int(get_jwt_identity())
+    user = User.query.get(user_id)
+    
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    db.session.query(Article.id).filter(Article.id == article_id).first_or_404()
+    
+    # Check if user is author or has admin/editor role (avoid loading relationship)
+    is_author = ArticleAuthor.query.filter_by(article_id=article_id, user_id=user.id).first() is not None
+    is_admin_or_editor = user.role.name in ['Администратор', 'Редактор']
+    
+    if not is_author and not is_admin_or_editor:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    media_ids = data.get('media_ids')
+    if not isinstance(media_ids, list) or not all(isinstance(m, int) and not isinstance(m, bool) for m in media_ids):
+        return jsonify({'error': 'media_ids must be a list of integers'}), 400
+    if len(set(media_ids)) != len(media_ids):
+        return jsonify({'error': 'media_ids contains duplicates'}), 400
+    
+    linked = {mid for (mid,) in db.session.query(ArticleMediaLink.media_id).filter_by(article_id=article_id).all()}
+    if set(media_ids) != linked:
+        return jsonify({
+            'error': 'media_ids must list exactly the media linked to this article',
+            'missing': sorted(linked - set(media_ids)),
+            'unknown': sorted(set(media_ids) - linked)
+        }), 409
+    
+    try:
+        if media_ids:
+            positions = {mid: index for index, mid in enumerate(media_ids)}
+            ArticleMediaLink.query.filter(
+                ArticleMediaLink.article_id == article_id,
+                ArticleMediaLink.media_id.in_(media_ids)
+            ).update(
+                {ArticleMediaLink.position: case(positions, value=ArticleMediaLink.media_id)},
+                synchronize_session=False
+            )
+        db.session.commit()
+        
+        return jsonify({
+            'article_id': article_id,
+            'order': [{'id': mid, 'position': index} for index, mid in enumerate(media_ids)],
+            'message': 'Media order updated successfully'
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to update media order'}), 500
+
 @media_bp.route('/article/<int:article_id>/media', methods=['POST'])
 @jwt_required()
 def add_media_to_article(article_id):
@@ -273,8 +428,7 @@ def add_media_to_article(article_id):
     position = data.get('position', 0)
     
     # Check if media exists
-    media = ArticleMedia.query.get(media_id)
-    if not media:
+    if not media_exists(media_id):
         return jsonify({'error': 'Media not found'}), 404
     
     # Check if media is already linked to this article
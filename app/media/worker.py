@@ -0,0 +1,47 @@
+"""`flask media-worker`: consume the media_jobs queue in a separate process."""
+import logging
+import signal
+
+import click
+from flask.cli import with_appcontext
+
+
+@click.command('media-worker')
+@click.option('--once', is_flag=True, help='Drain pending jobs and exit instead of polling forever.')
+@click.option('--poll-interval', default=2.0, show_default=True, help='Seconds to sleep when the queue is empty.')
+@click.option('--worker-id', default=None, help='Identifier stored in media_jobs.locked_by.')
+@with_appcontext
+def media_worker_command(once, poll_interval, worker_id):
+    """Process thumbnails, document previews and hashing jobs for uploaded media."""
+    from app.media.jobs import work, default_worker_id
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    worker_id = worker_id or default_worker_id()
+    stopping = {'flag': False}
+
+    def _stop(signum, frame):
+        stopping['flag'] = True
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    click.echo(f'media-worker {worker_id} started')
+    processed = work(worker_id=worker_id, once=once, poll_interval=poll_interval, stop=lambda: stopping['flag'])
+    click.echo(f'media-worker {worker_id} stopped, processed {processed} jobs')
+
+
+@click.command('media-backfill-hashes')
+@with_appcontext
+def media_backfill_hashes_command():
+    """Enqueue 'hash' jobs for media uploaded before content hashes were stored."""
+    from app import db
+    from app.models import ArticleMedia, MediaJob
+
+    ids = [mid for (mid,) in db.session.query(ArticleMedia.id).filter(
+        ArticleMedia.content_hash.is_(None),
+        ArticleMedia.media_type != 'link'
+    ).all()]
+    for mid in ids:
+        db.session.add(MediaJob(media_id=mid, kind='hash', status='pending'))
+    db.session.commit()
+    click.echo(f'enqueued {len(ids)} hash jobs')
@@ -0,0 +1,127 @@
+"""Prometheus metrics: request latency per blueprint/endpoint, status codes,
+in-flight requests, DB pool checkout wait and cache hit/miss counters.
+
+Under gunicorn set PROMETHEUS_MULTIPROC_DIR (see Dockerfile / gunicorn.conf.py)
+so every worker writes to a shared mmap store and /metrics aggregates them.
+The endpoint is served only when METRICS_TOKEN is configured and must be
+called with `Authorization: Bearer <METRICS_TOKEN>`.
+"""
+import hmac
+import os
+import time
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest,
+    )
+    from prometheus_client import multiprocess
+except ImportError:  # optional: metrics are disabled without prometheus_client
+    Counter = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+if Counter is not None:
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        # gunicorn's on_starting creates it; CLI commands and scripts in the same image do not
+        os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+    REQUEST_LATENCY = Histogram(
+        'kb_http_request_duration_seconds', 'HTTP request latency',
+        ['blueprint', 'endpoint', 'method'], buckets=LATENCY_BUCKETS,
+    )
+    REQUESTS = Counter(
+        'kb_http_requests_total', 'HTTP requests by status code',
+        ['blueprint', 'endpoint', 'method', 'status'],
+    )
+    IN_FLIGHT = Gauge(
+        'kb_http_requests_in_flight', 'Requests currently being served',
+        multiprocess_mode='livesum',
+    )
+    REQUEST_QUERIES = Histogram(
+        'kb_db_queries_per_request', 'SQL statements per request (when query stats are enabled)',
+        ['blueprint', 'endpoint'], buckets=(1, 2, 5, 10, 20, 50, 100, 250, 1000),
+    )
+    POOL_WAIT = Histogram(
+        'kb_db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled DB connection',
+        ['pool'], buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+    )
+    CACHE_LOOKUPS = Counter(
+        'kb_cache_lookups_total', 'Cache lookups by result (hit ratio = hit / (hit + miss))',
+        ['cache', 'result'],
+    )
+
+
+def enabled() -> bool:
+    return Counter is not None
+
+
+def observe_pool_wait(pool_name: str, seconds: float):
+    if Counter is not None:
+        POOL_WAIT.labels(pool=pool_name).observe(seconds)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    if Counter is not None:
+        CACHE_LOOKUPS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+def _labels(request):
+    # Unmatched URLs share one label to keep cardinality bounded
+    return request.blueprint or 'app', request.endpoint or 'unmatched', request.method
+
+
+def render_latest():
+    """Exposition in Prometheus text format, aggregated across workers when multiprocess"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
+
+def init_metrics(app):
+    if Counter is None:
+        return
+
+    from flask import Response, abort, g, request
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_start = time.perf_counter()
+        IN_FLIGHT.inc()
+        g._metrics_in_flight = True
+
+    @app.after_request
+    def _metrics_observe(response):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            blueprint, endpoint, method = _labels(request)
+            REQUEST_LATENCY.labels(blueprint, endpoint, method).observe(time.perf_counter() - start)
+            REQUESTS.labels(blueprint, endpoint, method, str(response.status_code)).inc()
+            from app.query_stats import current_stats
+            stats = current_stats()
+            if stats is not None:
+                REQUEST_QUERIES.labels(blueprint, endpoint).observe(stats.count)
+        return response
+
+    @app.teardown_request
+    def _metrics_finish(exc):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            # after_request did not run: the request died with an unhandled exception
+            blueprint, endpoint, method = _labels(request)
+            REQUEST_LATENCY.labels(blueprint, endpoint, method).observe(time.perf_counter() - start)
+            REQUESTS.labels(blueprint, endpoint, method, '500').inc()
+        # an earlier before_request hook may have raised before _metrics_start ran
+        if g.pop('_metrics_in_flight', False):
+            IN_FLIGHT.dec()
+
+    @app.route('/metrics')
+    def metrics():
+        token = app.config.get('METRICS_TOKEN')
+        if not token:
+            abort(404)
+        supplied = (request.headers.get('Authorization') or '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return Response('unauthorized\n', status=401, mimetype='text/plain')
+        return Response(render_latest(), content_type=CONTENT_TYPE_LATEST)
@@ -2,6 +2,9 @@ from app import db
 from datetime import datetime, timedelta
 from sqlalchemy.dialects.mysql import LONGBLOB, LONGTEXT
 from sqlalchemy import Text, LargeBinary, JSON
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
 
 # Новые модели для иерархической структуры фильтров
 class FilterTree(db.Model):
@@ -12,6 +15,8 @@ class FilterTree(db.Model):
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     is_active = db.Column(db.Boolean, default=True)
+    # Bumped on every write to the filter_* tables (app/filters/snapshot.py)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -304,14 +309,56 @@ class ArticleMedia(db.Model):
         db.Enum('image', 'video', 'file', 'link', name='article_media_type'),
         nullable=False,
     )
-    data = db.Column(LargeBinary, nullable=False)
+    # Deferred: metadata queries must not pull the blob; get_media undefers it explicitly
+    data = db.deferred(db.Column(LargeBinary, nullable=False))
     file_name = db.Column(db.String(255))
     mime_type = db.Column(db.String(100))
     caption = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # sha256 of data (hex) and its length; used for ETags without reading the blob
+    content_hash = db.Column(db.String(64))
+    byte_size = db.Column(db.Integer)
+    # 'processing' while background jobs run, then 'ready' / 'failed'; NULL for legacy rows (= ready)
+    status = db.Column(db.String(20), default='ready')
 
     # Relationships
     article_links = db.relationship('ArticleMediaLink', backref='media', lazy=True)
+    variants = db.relationship('ArticleMediaVariant', backref='media', lazy=True)
+
+class ArticleMediaVariant(db.Model):
+    """Derived renditions of a media file (thumbnail, document preview)"""
+    __tablename__ = 'articles_media_variants'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    media_id = db.Column(db.Integer, db.ForeignKey('articles_media.id'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'thumb', 'preview'
+    data = db.deferred(db.Column(LargeBinary, nullable=False))
+    mime_type = db.Column(db.String(100))
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    content_hash = db.Column(db.String(64))
+    byte_size = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('media_id', 'kind', name='uq_media_variant_kind'),)
+
+class MediaJob(db.Model):
+    """Persistent queue of background media processing jobs (consumed by `flask media-worker`)"""
+    __tablename__ = 'media_jobs'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    media_id = db.Column(db.Integer, db.ForeignKey('articles_media.id'), nullable=False, index=True)
+    kind = db.Column(db.String(30), nullable=False)  # 'hash', 'thumbnail', 'pdf_preview'
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending | running | done | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    locked_by = db.Column(db.String(64))
+    locked_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (db.Index('idx_media_jobs_status_run_after', 'status', 'run_after'),)
 
 class ReactionEmoji(db.Model):
     __tablename__ = 'reaction_emojis'
@@ -323,6 +370,28 @@ class ReactionEmoji(db.Model):
     # Relationships
     reactions = db.relationship('ArticleReaction', backref='emoji', lazy=True)
 
+class FilterPathText(ColumnElement):
+    """filter_path[key] as text, rendered per dialect (generated fp_* columns of Article)"""
+    type = db.String(64)
+    inherit_cache = True
+
+    def __init__(self, key):
+        self.key = key
+
+@compiles(FilterPathText)
+def _filter_path_text_sqlite(element, compiler, **kw):
+    return f"json_extract(filter_path, '$.{element.key}')"
+
+@compiles(FilterPathText, 'postgresql')
+def _filter_path_text_postgresql(element, compiler, **kw):
+    return f"(filter_path ->> '{element.key}')"
+
+@compiles(FilterPathText, 'mysql')
+def _filter_path_text_mysql(element, compiler, **kw):
+    # json_unquote turns a JSON null into the string 'null'; keep it SQL NULL like the other dialects
+    path = f"json_extract(filter_path, '$.{element.key}')"
+    return f"(CASE WHEN json_type({path}) = 'NULL' THEN NULL ELSE json_unquote({path}) END)"
+
 # Обновленная модель Article с новой системой фильтрации
 class Article(db.Model):
     __tablename__ = 'articles'
@@ -343,7 +412,13 @@ class Article(db.Model):
 
     # Новая система фильтрации
     filter_tree_id = db.Column(db.Integer, db.ForeignKey('filter_trees.id'))
-    filter_path = db.Column(JSON)  # JSON с путем по дереву фильтров
+    filter_path = db.Column(JSON().with_variant(JSONB, 'postgresql'))  # JSON с путем по дереву фильтров (app/filters/filter_path.py)
+    # filter_path keys as generated columns, for composite btree indexes with created_at
+    fp_city = db.Column(db.String(64), db.Computed(FilterPathText('city'), persisted=True))
+    fp_institution_type = db.Column(db.String(64), db.Computed(FilterPathText('institution_type'), persisted=True))
+    fp_program = db.Column(db.String(64), db.Computed(FilterPathText('program'), persisted=True))
+    fp_course = db.Column(db.String(64), db.Computed(FilterPathText('course'), persisted=True))
+    fp_form = db.Column(db.String(64), db.Computed(FilterPathText('form'), persisted=True))
 
     # Legacy fields (для обратной совместимости)
     tag = db.Column(db.String(20))
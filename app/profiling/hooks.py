@@ -0,0 +1,116 @@
+"""Request hooks deciding which requests get profiled.
+
+A request is sampled when any trigger applies:
+  * PROFILER_SAMPLE_RATE - random fraction of requests (0.0-1.0);
+  * PROFILER_SLOW_MS     - every request is sampled, but the profile is kept
+                           only if the request took at least this long;
+  * `X-Profile` header   - equal to PROFILER_TOKEN, or sent with an admin JWT.
+Kept profiles (stacks + SQL timings) go to the rotating ProfileStore and are
+served by the admin endpoints in app/profiling/routes.py.
+"""
+import os
+import random
+import time
+
+from app.profiling.sampler import sampler
+from app.profiling.store import ProfileStore
+
+# SQL statements kept per profile, slowest first
+MAX_SQL_STATEMENTS = 50
+
+
+def get_store(app) -> ProfileStore:
+    store = app.extensions.get('kb_profile_store')
+    if store is None:
+        directory = app.config.get('PROFILER_DIR') or os.path.join(app.instance_path, 'profiles')
+        store = app.extensions['kb_profile_store'] = ProfileStore(directory, app.config.get('PROFILER_MAX_FILES', 200))
+    return store
+
+
+def _requested_by_header(app, request) -> bool:
+    value = request.headers.get('X-Profile')
+    if not value:
+        return False
+    token = app.config.get('PROFILER_TOKEN')
+    if token and value == token:
+        return True
+    from app.profiling.routes import current_admin
+    return current_admin() is not None
+
+
+def _trigger(app, request):
+    if request.endpoint and request.endpoint.startswith('profiling.'):
+        return None
+    if _requested_by_header(app, request):
+        return 'header'
+    rate = float(app.config.get('PROFILER_SAMPLE_RATE') or 0)
+    if rate > 0 and random.random() < rate:
+        return 'sample'
+    if float(app.config.get('PROFILER_SLOW_MS') or 0) > 0:
+        return 'slow'
+    return None
+
+
+def init_profiler(app):
+    if not app.config.get('PROFILER_ENABLED'):
+        return
+
+    from flask import g, request
+    from app.query_stats import track_queries, current_stats
+
+    @app.before_request
+    def _start_profile():
+        trigger = _trigger(app, request)
+        if trigger is None:
+            return
+        stats = current_stats()
+        if stats is not None:
+            stats.capture = True
+        else:
+            g._profile_sql = track_queries(capture=True)
+            stats = g._profile_sql.__enter__()
+        interval = max(0.001, float(app.config.get('PROFILER_INTERVAL_MS') or 5) / 1000.0)
+        g._profile = (trigger, time.time(), sampler.start(interval), stats)
+
+    @app.after_request
+    def _finish_profile(response):
+        state = g.pop('_profile', None)
+        if state is None:
+            return response
+        trigger, started_at, profile, stats = state
+        sampler.stop(profile)
+        duration_ms = (time.perf_counter() - profile.started) * 1000.0
+        if trigger == 'slow' and duration_ms < float(app.config.get('PROFILER_SLOW_MS') or 0):
+            return response
+        statements = sorted(stats.statements, key=lambda s: s[2], reverse=True)[:MAX_SQL_STATEMENTS]
+        record = {
+            'started_at': started_at,
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(duration_ms, 2),
+            'trigger': trigger,
+            'interval_ms': profile.interval * 1000.0,
+            'sample_count': profile.sample_count,
+            'samples': [[list(stack), n] for stack, n in profile.samples.most_common()],
+            'sql': {
+                'queries': stats.count,
+                'db_ms': round(stats.total_ms, 3),
+                'statements': [{'statement': st[:4000], 'ms': round(ms, 3)} for st, _, ms in statements],
+            },
+        }
+        try:
+            response.headers['X-Profile-Id'] = get_store(app).save(record)
+        except OSError as exc:
+            app.logger.warning('could not store profile: %s', exc)
+        return response
+
+    @app.teardown_request
+    def _stop_profile(exc):
+        state = g.pop('_profile', None)
+        if state is not None:
+            sampler.stop(state[2])
+        tracker = g.pop('_profile_sql', None)
+        if tracker is not None:
+            tracker.__exit__(None, None, None)
@@ -0,0 +1,57 @@
+import json
+
+from flask import Response, current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity, jwt_required, verify_jwt_in_request
+from app.profiling import profiling_bp
+from app.profiling.hooks import get_store
+from app.profiling.store import to_collapsed, to_speedscope
+from app.models import User
+
+
+def current_admin():
+    """The administrator behind the request's JWT, or None"""
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        return None
+    if not identity:
+        return None
+    try:
+        user = User.query.get(int(identity))
+    except (TypeError, ValueError):
+        return None
+    if not user or not user.role or user.role.name != 'Администратор':
+        return None
+    return user
+
+
+@profiling_bp.route('/', methods=['GET'])
+@jwt_required()
+def list_profiles():
+    """Recently captured profiles (admin only)"""
+    if current_admin() is None:
+        return jsonify({'error': 'Unauthorized'}), 403
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    return jsonify({'profiles': get_store(current_app).list(limit)}), 200
+
+
+@profiling_bp.route('/<profile_id>', methods=['GET'])
+@jwt_required()
+def get_profile(profile_id):
+    """One profile as ?format=json (default), collapsed or speedscope (admin only)"""
+    if current_admin() is None:
+        return jsonify({'error': 'Unauthorized'}), 403
+    record = get_store(current_app).load(profile_id)
+    if record is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    fmt = request.args.get('format', 'json')
+    if fmt == 'collapsed':
+        return Response(to_collapsed(record), mimetype='text/plain')
+    if fmt == 'speedscope':
+        rv = Response(json.dumps(to_speedscope(record)), mimetype='application/json')
+        rv.headers['Content-Disposition'] = f'attachment; filename="{profile_id}.speedscope.json"'
+        return rv
+    if fmt != 'json':
+        return jsonify({'error': 'format must be json, collapsed or speedscope'}), 400
+    return jsonify(record), 200
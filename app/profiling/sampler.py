@@ -0,0 +1,109 @@
+"""Wall-clock stack sampler for individual request threads.
+
+One daemon thread per process wakes every `interval` seconds, reads
+`sys._current_frames()` and adds the stack of each registered thread to
+its Profile. Only threads serving a profiled request are walked, so the
+cost for other requests is a dict lookup.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+MAX_DEPTH = 128
+
+
+class Profile:
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self.started = time.perf_counter()
+
+    @property
+    def sample_count(self) -> int:
+        return sum(self.samples.values())
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _short_path(path: str) -> str:
+    # Keep flame graph labels readable: package-relative for libraries, app/... for our code
+    idx = path.rfind('site-packages' + os.sep)
+    if idx != -1:
+        return path[idx + len('site-packages') + 1:]
+    idx = path.rfind(os.sep + 'app' + os.sep)
+    if idx != -1:
+        return path[idx + 1:]
+    return os.path.basename(path)
+
+
+def stack_of(frame) -> tuple:
+    """Root-first tuple of frame labels"""
+    stack = []
+    while frame is not None and len(stack) < MAX_DEPTH:
+        stack.append(frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+class Sampler:
+    def __init__(self):
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.interval = 0.005
+
+    def start(self, interval: float) -> Profile:
+        """Begin sampling the calling thread"""
+        tid = threading.get_ident()
+        profile = Profile(tid, interval)
+        with self._lock:
+            self.interval = min(self.interval, interval) if self._active else interval
+            self._active[tid] = profile
+            self._ensure_thread()
+        self._wakeup.set()
+        return profile
+
+    def stop(self, profile: Profile):
+        with self._lock:
+            if self._active.get(profile.thread_id) is profile:
+                del self._active[profile.thread_id]
+
+    def _ensure_thread(self):
+        # A forked gunicorn worker inherits the object but not the thread
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='kb-profiler', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                active = dict(self._active)
+                interval = self.interval
+            if not active:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            time.sleep(interval)
+            frames = sys._current_frames()
+            for tid, profile in active.items():
+                if tid == own:
+                    continue
+                frame = frames.get(tid)
+                if frame is not None:
+                    profile.samples[stack_of(frame)] += 1
+            del frames
+
+
+sampler = Sampler()
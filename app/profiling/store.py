@@ -0,0 +1,112 @@
+"""Rotating on-disk store for captured profiles and their export formats."""
+import json
+import os
+import uuid
+
+
+class ProfileStore:
+    def __init__(self, directory: str, max_files: int = 200):
+        self.directory = directory
+        self.max_files = max(1, int(max_files))
+
+    def save(self, record: dict) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = record.get('id') or f"{int(record.get('started_at', 0) * 1000)}-{uuid.uuid4().hex[:8]}"
+        record['id'] = profile_id
+        path = self._path(profile_id)
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            json.dump(record, fh, ensure_ascii=False)
+        os.replace(tmp, path)
+        self._rotate()
+        return profile_id
+
+    def list(self, limit: int = 100) -> list:
+        items = []
+        for name in self._files()[-limit:][::-1]:
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as fh:
+                    rec = json.load(fh)
+            except (OSError, ValueError):
+                continue
+            rec.pop('samples', None)
+            sql = rec.pop('sql', None) or {}
+            rec['queries'] = sql.get('queries')
+            rec['db_ms'] = sql.get('db_ms')
+            items.append(rec)
+        return items
+
+    def load(self, profile_id: str):
+        if not profile_id or os.sep in profile_id or profile_id.startswith('.'):
+            return None
+        try:
+            with open(self._path(profile_id), encoding='utf-8') as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _path(self, profile_id: str) -> str:
+        return os.path.join(self.directory, f'{profile_id}.json')
+
+    def _files(self) -> list:
+        try:
+            # ids start with a millisecond timestamp, so name order is capture order
+            return sorted(n for n in os.listdir(self.directory) if n.endswith('.json'))
+        except OSError:
+            return []
+
+    def _rotate(self):
+        files = self._files()
+        for name in files[:max(0, len(files) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+
+def to_collapsed(record: dict) -> str:
+    """Brendan Gregg's collapsed-stack format (flamegraph.pl, speedscope, inferno)"""
+    lines = []
+    for stack, count in record.get('samples', []):
+        lines.append(f"{';'.join(frame.replace(';', ':') for frame in stack)} {count}")
+    return '\n'.join(lines) + '\n'
+
+
+def to_speedscope(record: dict) -> dict:
+    """Speedscope 'sampled' profile, weighted in milliseconds"""
+    frames, index = [], {}
+    samples, weights = [], []
+    interval_ms = float(record.get('interval_ms') or 1.0)
+    for stack, count in record.get('samples', []):
+        ids = []
+        for label in stack:
+            if label not in index:
+                index[label] = len(frames)
+                name, _, where = label.rpartition(' (')
+                file, _, line = where.rstrip(')').rpartition(':')
+                frame = {'name': name or label}
+                if file:
+                    frame['file'] = file
+                    if line.isdigit():
+                        frame['line'] = int(line)
+                frames.append(frame)
+            ids.append(index[label])
+        samples.append(ids)
+        weights.append(count * interval_ms)
+    name = f"{record.get('method', '')} {record.get('path', '')} ({record.get('duration_ms', 0)} ms)".strip()
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights,
+        }],
+        'name': name,
+        'activeProfileIndex': 0,
+        'exporter': 'knowledge-base profiler',
+    }
@@ -0,0 +1,177 @@
+"""Per-request SQL instrumentation: query count, DB time and N+1 detection.
+
+Hooks SQLAlchemy's before/after_cursor_execute on every Engine and
+accumulates into the QueryStats of the current request (or of an explicit
+`track_queries()` block). In non-production the totals are sent back as
+`X-DB-Queries` / `Server-Timing` headers; statements repeated within one
+request are logged as likely N+1 (and sent as `X-DB-N1` only in debug, since
+the header carries SQL text). With QUERY_STATS_STRICT enabled a
+detected N+1 or an exceeded `@query_budget` raises QueryBudgetExceeded, so
+test runs fail on a regression.
+"""
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_current = ContextVar('query_stats', default=None)
+_listening = False
+
+# Same statement shape executed this many times in one request => likely N+1
+DEFAULT_N1_THRESHOLD = 5
+
+_WS_RE = re.compile(r'\s+')
+_PARAM_LIST_RE = re.compile(r'\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*\)')
+_NUMBER_RE = re.compile(r'\b\d+\b')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryStats:
+    def __init__(self, capture: bool = False):
+        self.count = 0
+        self.total_ms = 0.0
+        self.shapes = Counter()
+        # (statement, parameters, duration_ms) per query when capture=True (used by plan checks)
+        self.capture = capture
+        self.statements = []
+
+    def record(self, statement, parameters, duration_ms):
+        self.count += 1
+        self.total_ms += duration_ms
+        self.shapes[normalize_statement(statement)] += 1
+        if self.capture:
+            self.statements.append((statement, parameters, duration_ms))
+
+    def repeated(self, threshold: int = DEFAULT_N1_THRESHOLD):
+        """[(shape, times)] executed at least `threshold` times, most frequent first"""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+    def as_dict(self):
+        return {
+            'queries': self.count,
+            'db_ms': round(self.total_ms, 3),
+            'repeated': [{'statement': shape, 'count': n} for shape, n in self.repeated()],
+        }
+
+
+def normalize_statement(statement: str) -> str:
+    """Collapse whitespace, expanded IN-lists and inline numbers so that executions that
+    differ only in bound values share one shape"""
+    shape = _WS_RE.sub(' ', statement or '').strip()
+    shape = _PARAM_LIST_RE.sub('(?)', shape)
+    return _NUMBER_RE.sub('N', shape)
+
+
+def current_stats():
+    return _current.get()
+
+
+@contextmanager
+def track_queries(capture: bool = False):
+    """Count queries issued inside the block: `with track_queries() as stats: ...`"""
+    _install_listeners()
+    stats = QueryStats(capture=capture)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def query_budget(max_queries: int):
+    """Declare the expected upper bound of SQL statements for a view (checked in strict mode)"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            return fn(*args, **kwargs)
+        wrapper.query_budget = max_queries
+        return wrapper
+    return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('query_stats_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    starts = conn.info.get('query_stats_start')
+    if not starts:
+        return
+    stats.record(statement, parameters, (time.perf_counter() - starts.pop()) * 1000.0)
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute does not run for a failed statement; drop its start time
+    conn = exception_context.connection
+    if conn is not None and _current.get() is not None:
+        starts = conn.info.get('query_stats_start')
+        if starts:
+            starts.pop()
+
+
+def _install_listeners():
+    global _listening
+    if _listening:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+    _listening = True
+
+
+def init_query_stats(app):
+    """Attach per-request query accounting to `app` (see module docstring for config keys)"""
+    if not app.config.get('QUERY_STATS_ENABLED'):
+        return
+    _install_listeners()
+
+    from flask import g, request
+
+    @app.before_request
+    def _start_query_stats():
+        g._query_stats_token = _current.set(QueryStats())
+
+    @app.after_request
+    def _report_query_stats(response):
+        stats = _current.get()
+        if stats is None:
+            return response
+        # Read per request so tests can flip strict mode on an existing app
+        threshold = int(app.config.get('QUERY_STATS_N1_THRESHOLD') or DEFAULT_N1_THRESHOLD)
+        repeated = stats.repeated(threshold)
+        if app.config.get('QUERY_STATS_HEADERS', True):
+            response.headers['X-DB-Queries'] = str(stats.count)
+            response.headers.add('Server-Timing', f'db;dur={stats.total_ms:.2f};desc="{stats.count} queries"')
+            if repeated and app.debug:
+                response.headers['X-DB-N1'] = f'{repeated[0][1]}x {repeated[0][0][:200]}'
+        for shape, n in repeated:
+            app.logger.warning('possible N+1 in %s %s: %dx %s', request.method, request.path, n, shape[:500])
+        if app.config.get('QUERY_STATS_STRICT'):
+            view = app.view_functions.get(request.endpoint) if request.endpoint else None
+            budget = getattr(view, 'query_budget', None)
+            if budget is not None and stats.count > budget:
+                raise QueryBudgetExceeded(f'{request.endpoint}: {stats.count} queries > budget {budget}')
+            if repeated:
+                raise QueryBudgetExceeded(f'{request.endpoint}: likely N+1, {repeated[0][1]}x {repeated[0][0][:300]}')
+        return response
+
+    @app.teardown_request
+    def _stop_query_stats(exc):
+        token = g.pop('_query_stats_token', None)
+        if token is not None:
+            try:
+                _current.reset(token)
+            except ValueError:
+                _current.set(None)
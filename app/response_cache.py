@@ -0,0 +1,406 @@
+"""Response cache for public GET endpoints whose JSON does not depend on the caller.
+
+Views opt in with `@cached(*tags, ttl=..., when=...)`. Entries are keyed on
+the normalized path plus the sorted query string and carry tags such as
+`articles`, `article:<id>`, `groups`, `group:<id>`, `lookups`, `reactions` or `filters`
+(templates like 'group:{group_id}' are filled from view args / query args).
+
+Tags are purged automatically after every commit that touched a table they
+depend on (see TABLE_TAGS / ID_TAGS); ORM flushes and ORM-enabled bulk
+insert/update/delete are both tracked. Call `purge(...)` for writes that
+bypass the session.
+
+RESPONSE_CACHE picks the storage:
+  * off     - disabled (default);
+  * memory  - per-process LRU; purges only reach the worker that committed,
+              other workers serve stale entries until their TTL;
+  * sqlite  - one file shared by all workers on a host (RESPONSE_CACHE_URL is
+              the path, default <tmp>/kb-response-cache.sqlite);
+  * redis   - any Redis-protocol server (RESPONSE_CACHE_URL=redis://...),
+              needs the optional `redis` package.
+Cache hits/misses are counted in kb_cache_lookups_total{cache="response"}.
+"""
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from sqlalchemy import event, inspect
+
+from app.db_pool import RoutingSession
+
+try:
+    import redis
+except ImportError:  # optional: only the redis backend needs it
+    redis = None
+
+DEFAULT_TTL = 30
+
+# Tables whose writes invalidate a whole tag. Article lists embed categories,
+# groups and authors (users), so those purge 'articles' too.
+TABLE_TAGS = {
+    'articles': ('articles',),
+    'article_categories': ('articles',),
+    'article_authors': ('articles',),
+    'article_filters': ('articles',),
+    'users': ('articles',),
+    'categories': ('articles', 'lookups'),
+    'top_categories': ('articles', 'lookups'),
+    'subcategories': ('articles', 'lookups'),
+    'groupss': ('articles', 'groups'),
+    'cities': ('lookups',),
+    'specialities': ('lookups',),
+    'education_forms': ('lookups',),
+    'admission_years': ('lookups',),
+    'school_classes': ('lookups',),
+    'institution_types': ('lookups',),
+    'reaction_emojis': ('lookups', 'reactions'),
+}
+# Tables whose rows purge a per-object tag: table -> (tag prefix, column)
+ID_TAGS = {
+    'articles': ('article', 'id'),
+    'article_categories': ('article', 'article_id'),
+    'article_authors': ('article', 'article_id'),
+    'article_filters': ('article', 'article_id'),
+    'article_reactions': ('article', 'article_id'),
+    'groupss': ('group', 'id'),
+}
+FILTER_TABLE_PREFIX = 'filter_'
+# Updating only these columns purges nothing. views_count is rendered by cached article lists,
+# which show it as of the cached render until the entry expires: a view must not drop every list.
+IGNORED_COLUMNS = {
+    'articles': {'views_count'},
+    'users': {'password', 'role_id'},
+}
+
+
+class MemoryBackend:
+    """Per-process LRU with TTL and a tag -> keys index"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value: bytes, ttl: float, tags):
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (time.time() + ttl, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class SQLiteBackend:
+    """File-backed store shared by the workers of one host (WAL, one connection per thread)"""
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS entry_tags (tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key))',
+        'CREATE INDEX IF NOT EXISTS ix_entries_expires_at ON entries (expires_at)',
+    )
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._conn() as conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT value FROM entries WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value: bytes, ttl: float, tags):
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)',
+                         (key, value, time.time() + ttl))
+            conn.executemany('INSERT OR IGNORE INTO entry_tags (tag, key) VALUES (?, ?)',
+                             [(tag, key) for tag in tags])
+            if random.random() < 0.01:
+                self._prune(conn)
+
+    def invalidate(self, tags):
+        tags = list(tags)
+        if not tags:
+            return
+        marks = ','.join('?' * len(tags))
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(f'DELETE FROM entries WHERE key IN (SELECT key FROM entry_tags WHERE tag IN ({marks}))', tags)
+            conn.execute(f'DELETE FROM entry_tags WHERE tag IN ({marks})', tags)
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute('DELETE FROM entries')
+            conn.execute('DELETE FROM entry_tags')
+
+    def _prune(self, conn):
+        conn.execute('DELETE FROM entries WHERE expires_at <= ?', (time.time(),))
+        conn.execute(
+            'DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY expires_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,),
+        )
+        conn.execute('DELETE FROM entry_tags WHERE key NOT IN (SELECT key FROM entries)')
+
+
+class RedisBackend:
+    """Redis-protocol server; a tag is a set of the keys stored under it"""
+
+    TAG_TTL = 86400
+
+    def __init__(self, url: str, prefix: str = 'kb:rc:'):
+        if redis is None:
+            raise RuntimeError('RESPONSE_CACHE=redis requires the redis package')
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value: bytes, ttl: float, tags):
+        ttl = max(1, int(ttl))
+        pipe = self.client.pipeline(transaction=False)
+        pipe.set(self.prefix + key, value, ex=ttl)
+        for tag in tags:
+            tag_key = f'{self.prefix}tag:{tag}'
+            pipe.sadd(tag_key, self.prefix + key)
+            # outlive every entry in the set; stale members are harmless on DEL
+            pipe.expire(tag_key, max(ttl, self.TAG_TTL))
+        pipe.execute()
+
+    def invalidate(self, tags):
+        for tag in tags:
+            tag_key = f'{self.prefix}tag:{tag}'
+            keys = self.client.smembers(tag_key)
+            self.client.delete(tag_key, *keys)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+def make_backend(kind: str, url: str = None, max_entries: int = 1024):
+    kind = (kind or 'off').lower()
+    if kind == 'memory':
+        return MemoryBackend(max_entries)
+    if kind == 'sqlite':
+        return SQLiteBackend(url or os.path.join(tempfile.gettempdir(), 'kb-response-cache.sqlite'), max_entries)
+    if kind == 'redis':
+        return RedisBackend(url or 'redis://127.0.0.1:6379/0')
+    return None
+
+
+def get_cache(app=None):
+    from flask import current_app
+    app = app or current_app
+    return app.extensions.get('kb_response_cache')
+
+
+def purge(*tags):
+    """Invalidate cached responses carrying any of `tags`"""
+    cache = get_cache()
+    if cache is None or not tags:
+        return
+    try:
+        cache.invalidate(tags)
+    except Exception:
+        from flask import current_app
+        current_app.logger.exception('response cache purge failed for %s', tags)
+
+
+def cache_key(request) -> str:
+    path = request.path.rstrip('/') or '/'
+    return f'{path}?{urlencode(sorted(request.args.items(multi=True)))}'
+
+
+def _format_tags(templates, values):
+    tags = []
+    for template in templates:
+        try:
+            tags.append(template.format(**values))
+        except (KeyError, IndexError):
+            continue
+    return tags
+
+
+def _encode(response) -> bytes:
+    return response.content_type.encode() + b'\n' + response.get_data()
+
+
+def _decode(blob: bytes):
+    from flask import Response
+    content_type, _, body = bytes(blob).partition(b'\n')
+    return Response(body, status=200, content_type=content_type.decode())
+
+
+def cached(*tags, ttl: float = None, when=None):
+    """Cache the view's 200 responses per path + query string, e.g.
+    @cached('articles', 'group:{group_id}', ttl=60, when=lambda: ...).
+    Only for views whose output is the same for every caller."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            from flask import current_app, g, request
+            from app.metrics import record_cache_lookup
+            cache = get_cache()
+            if cache is None or request.method != 'GET' or (when is not None and not when()):
+                return fn(*args, **kwargs)
+            key = cache_key(request)
+            try:
+                blob = cache.get(key)
+            except Exception:
+                current_app.logger.exception('response cache lookup failed')
+                return fn(*args, **kwargs)
+            record_cache_lookup('response', blob is not None)
+            if blob is not None:
+                response = _decode(blob)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response = current_app.make_response(fn(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough:
+                seconds = ttl if ttl is not None else current_app.config.get('RESPONSE_CACHE_TTL', DEFAULT_TTL)
+                if g.get('db_pool') == 'replica':
+                    # a lagging replica may have served pre-purge data; keep it no longer than the lag bound
+                    seconds = min(seconds, current_app.config.get('REPLICA_MAX_LAG_SECONDS', 5.0))
+                values = {**request.args.to_dict(), **(request.view_args or {})}
+                try:
+                    cache.set(key, _encode(response), seconds, _format_tags(tags, values))
+                except Exception:
+                    current_app.logger.exception('response cache store failed')
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def _tags_for_row(table: str, row):
+    tags = set(TABLE_TAGS.get(table, ()))
+    if table.startswith(FILTER_TABLE_PREFIX):
+        tags.add('filters')
+    id_tag = ID_TAGS.get(table)
+    if id_tag is not None and row is not None:
+        value = row.get(id_tag[1]) if isinstance(row, dict) else getattr(row, id_tag[1], None)
+        if value is not None:
+            tags.add(f'{id_tag[0]}:{value}')
+    return tags
+
+
+def _pending(session) -> set:
+    return session.info.setdefault('response_cache_tags', set())
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _collect_flushed(session, flush_context):
+    pending = _pending(session)
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if not table:
+            continue
+        if obj in session.dirty and table in IGNORED_COLUMNS:
+            changed = {attr.key for attr in inspect(obj).attrs if attr.history.has_changes()}
+            if changed <= IGNORED_COLUMNS[table]:
+                continue
+        pending |= _tags_for_row(table, obj)
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _collect_bulk_dml(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if table is None:
+        return
+    pending = _pending(orm_execute_state.session)
+    params = orm_execute_state.parameters
+    rows = params if isinstance(params, list) else [params or {}]
+    for row in rows:
+        pending |= _tags_for_row(table.name, row)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _purge_committed(session):
+    tags = session.info.pop('response_cache_tags', None)
+    if not tags:
+        return
+    from flask import has_app_context
+    if has_app_context():
+        purge(*sorted(tags))
+
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _forget_rolled_back(session, previous_transaction):
+    if not session.in_transaction():
+        session.info.pop('response_cache_tags', None)
+
+
+def init_response_cache(app):
+    try:
+        backend = make_backend(
+            app.config.get('RESPONSE_CACHE'),
+            app.config.get('RESPONSE_CACHE_URL'),
+            app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 1024),
+        )
+    except Exception:
+        app.logger.exception('response cache disabled: backend init failed')
+        backend = None
+    if backend is not None:
+        app.extensions['kb_response_cache'] = backend
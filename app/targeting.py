@@ -0,0 +1,378 @@
+"""Targeting resolver: which published articles a student or a filter selection sees.
+
+An article's audience comes from three sources:
+  * the legacy audience_* columns (audience, audience_city_id, audience_course,
+    base_class, speciality_id, education_form_id, audience_admission_year_id,
+    education_mode, audience_courses);
+  * filter_path, exposed as the indexed generated fp_* columns;
+  * ArticleFilter links to FilterGroup.
+A context (`StudentContext`, `FilterContext`, `AudienceQuery`) is a frozen,
+hashable description of who is asking; `plan_for(context)` compiles it once
+into a `TargetingPlan` and memoizes it, so repeated contexts reuse the same
+SQL clauses (and SQLAlchemy's compiled-statement cache). A plan carries
+  * `conditions` - the complete WHERE clause, every rule in SQL (no Python
+    post-filtering), so the database counts and paginates;
+  * `bitmap` - the same rules over the in-process bitmap index
+    (app/bitmap_index.py), or None when a rule needs data the index does not
+    hold (ArticleFilter links); callers then use the SQL path.
+
+Bridging between the sources:
+  * a filter selection on city/course also matches articles targeted by the
+    legacy audience city/course (city keys <-> City ids via app/filters/keys.py);
+  * a student also sees articles without a legacy audience whose filter_path
+    only narrows on city/course, when those keys agree with the student;
+  * `filter_group_ids` (on both contexts) matches ArticleFilter links.
+
+Contexts carry resolved values (City ids, city keys), so a refreshed key
+registry simply yields a different context and a new plan.
+"""
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Optional
+
+from sqlalchemy import Boolean, and_, exists, or_, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+
+PLAN_CACHE_SIZE = 1024
+
+
+class AudienceCoursesMatch(ColumnElement):
+    """True unless `column` holds a JSON array none of whose integers is in `courses`
+    (NULL, invalid JSON and non-arrays match), rendered per dialect"""
+    type = Boolean()
+    inherit_cache = True
+    _traverse_internals = [
+        ('column', InternalTraversal.dp_clauseelement),
+        ('courses', InternalTraversal.dp_plain_obj),
+    ]
+
+    def __init__(self, column, courses):
+        self.column = column
+        self.courses = tuple(sorted({int(c) for c in courses}))
+
+
+@compiles(AudienceCoursesMatch)
+def _audience_courses_default(element, compiler, **kw):
+    return '1 = 1'
+
+
+@compiles(AudienceCoursesMatch, 'sqlite')
+def _audience_courses_sqlite(element, compiler, **kw):
+    col = compiler.process(element.column, **kw)
+    values = ', '.join(str(c) for c in element.courses)
+    return (f"(CASE WHEN json_valid({col}) THEN CASE WHEN json_type({col}) = 'array' THEN "
+            f"EXISTS (SELECT 1 FROM json_each({col}) WHERE json_each.type = 'integer' "
+            f"AND json_each.value IN ({values})) ELSE 1 END ELSE 1 END)")
+
+
+# A flat JSON array of scalars. Before Postgres 16 there is no IS JSON (nor a safe cast), and
+# casting one invalid value fails the whole query, so only text matching this is cast; nested
+# arrays are treated like invalid JSON. The articles routes write json.dumps() of a flat list.
+_PG_JSON_SCALAR = (r'(-?(0|[1-9][0-9]*)(\.[0-9]+)?([eE][+-]?[0-9]+)?'
+                   r'|"([^"\\[:cntrl:]]|\\(["\\/bfnrt]|u[0-9a-fA-F]{4}))*"|true|false|null)')
+PG_FLAT_JSON_ARRAY = rf'^\s*\[\s*({_PG_JSON_SCALAR}(\s*,\s*{_PG_JSON_SCALAR})*)?\s*\]\s*$'
+
+
+@compiles(AudienceCoursesMatch, 'postgresql')
+def _audience_courses_postgresql(element, compiler, **kw):
+    col = compiler.process(element.column, **kw)
+    overlaps = ' OR '.join(f"CAST({col} AS JSONB) @> '[{c}]'" for c in element.courses)
+    if (compiler.dialect.server_version_info or (0,)) >= (16,):
+        is_array = f'{col} IS JSON ARRAY'
+    else:
+        is_array = f"{col} ~ '{PG_FLAT_JSON_ARRAY}'"
+    return f"(CASE WHEN {is_array} THEN ({overlaps}) ELSE TRUE END)"
+
+
+@compiles(AudienceCoursesMatch, 'mysql')
+def _audience_courses_mysql(element, compiler, **kw):
+    col = compiler.process(element.column, **kw)
+    values = ', '.join(str(c) for c in element.courses)
+    return (f"(CASE WHEN JSON_VALID({col}) THEN CASE WHEN JSON_TYPE({col}) = 'ARRAY' THEN "
+            f"JSON_OVERLAPS({col}, '[{values}]') ELSE 1 END ELSE 1 END)")
+
+
+def narrow(value, requested=()) -> tuple:
+    """Values a targeted field may hold for a student: the group's value,
+    if the request's list (when given) allows it"""
+    if value is None or (requested and value not in requested):
+        return ()
+    return (value,)
+
+
+def _course_keys(course) -> tuple:
+    """filter_path spellings of a course number: '2' (create_article) and '2 course' (filter tree)"""
+    return (str(course), f'{course} course') if course else ()
+
+
+@dataclass(frozen=True)
+class StudentContext:
+    """A student group's context for the feed; tuples are the values targeted fields may hold"""
+    city_id: Optional[int] = None
+    city_key: Optional[str] = None
+    course: Optional[int] = None
+    base_class: Optional[int] = None
+    speciality_ids: tuple = ()
+    education_form_ids: tuple = ()
+    admission_year_ids: tuple = ()
+    courses: tuple = ()
+    institution_type_id: Optional[int] = None
+    filter_group_ids: tuple = ()
+
+
+@dataclass(frozen=True)
+class FilterContext:
+    """Incremental filter_path selection of /api/filters/articles and /facets"""
+    city: Optional[str] = None
+    city_id: Optional[int] = None  # legacy City id of `city`, for audience='city' articles
+    institution_type: Optional[str] = None
+    program: Optional[str] = None
+    course: Optional[str] = None
+    form: Optional[str] = None
+    filter_group_ids: tuple = ()
+
+    @classmethod
+    def from_args(cls, args) -> 'FilterContext':
+        from app.filters.keys import get_key_registry
+        city = args.get('city') or None
+        groups = tuple(sorted({int(x) for x in args.getlist('filter_group_ids') if str(x).isdigit()}))
+        return cls(
+            city=city,
+            city_id=get_key_registry().city_id(city) if city else None,
+            institution_type=args.get('institution_type') or None,
+            program=args.get('program') or None,
+            course=args.get('course') or None,
+            form=args.get('form') or None,
+            filter_group_ids=groups,
+        )
+
+    def selection(self) -> dict:
+        """Selected filter_path keys"""
+        from app.filters.filter_path import FILTER_KEYS
+        return {key: getattr(self, key) for key in FILTER_KEYS if getattr(self, key)}
+
+
+@dataclass(frozen=True)
+class AudienceQuery:
+    """Audience filters of the admin listing GET /api/articles/ (not a student: no published rule)"""
+    audience: Optional[str] = None
+    audience_city_ids: tuple = ()
+    audience_course: Optional[int] = None
+    base_class: Optional[int] = None
+    education_form_ids: tuple = ()
+    speciality_ids: tuple = ()
+    admission_year_ids: tuple = ()
+    education_mode: Optional[str] = None
+    institution_type_ids: tuple = ()
+    strict_audience: bool = False
+    view: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class TargetingPlan:
+    conditions: tuple
+    bitmap: Optional[Callable] = field(default=None, compare=False)
+
+    def bits(self, index):
+        """Matching articles as a bitmap of `index`, None if the plan needs the SQL path"""
+        return self.bitmap(index) if self.bitmap is not None else None
+
+
+def _article_filter_exists(filter_group_ids):
+    from app.models import Article, ArticleFilter
+    return exists(
+        select(1).where(ArticleFilter.article_id == Article.id, ArticleFilter.filter_group_id.in_(filter_group_ids))
+    )
+
+
+def _one_of(column, values):
+    """column IS NULL OR column IN values (just IS NULL when nothing is allowed)"""
+    return or_(column.is_(None), column.in_(values)) if values else column.is_(None)
+
+
+def _student_plan(ctx: StudentContext) -> TargetingPlan:
+    from app.filters.filter_path import fp_column
+    from app.models import Article, ArticleCategory, Category, Group
+
+    # Who the article is addressed to: everyone, the student's city or course,
+    # filter_path narrowing on city/course only, or one of the student's filter groups
+    fp_city, fp_course = fp_column('city'), fp_column('course')
+    course_keys = _course_keys(ctx.course)
+    audience = [Article.audience == 'all']
+    if ctx.city_id:
+        audience.append(and_(Article.audience == 'city', Article.audience_city_id == ctx.city_id))
+    if ctx.course:
+        audience.append(and_(Article.audience == 'course', Article.audience_course == ctx.course))
+    audience.append(and_(
+        Article.audience.is_(None),
+        fp_column('institution_type').is_(None), fp_column('program').is_(None), fp_column('form').is_(None),
+        or_(fp_city.isnot(None), fp_course.isnot(None)),
+        _one_of(fp_city, (ctx.city_key,) if ctx.city_key else ()),
+        _one_of(fp_course, course_keys),
+    ))
+    if ctx.filter_group_ids:
+        audience.append(_article_filter_exists(ctx.filter_group_ids))
+
+    conditions = [
+        Article.is_published.is_(True),
+        or_(*audience),
+        # A field the article targets must match the student's context
+        _one_of(Article.base_class, (ctx.base_class,) if ctx.base_class is not None else ()),
+        _one_of(Article.speciality_id, ctx.speciality_ids),
+        _one_of(Article.education_form_id, ctx.education_form_ids),
+        _one_of(Article.audience_admission_year_id, ctx.admission_year_ids),
+        Article.education_mode.is_(None),
+    ]
+    if ctx.courses:
+        conditions.append(AudienceCoursesMatch(Article.audience_courses, ctx.courses))
+    if ctx.institution_type_id is not None:
+        # Targeted posts must not leak across institution types
+        targeted = or_(
+            Article.audience.isnot(None),
+            Article.base_class.isnot(None),
+            Article.speciality_id.isnot(None),
+            Article.education_form_id.isnot(None),
+            Article.audience_admission_year_id.isnot(None),
+        )
+        conditions.append(or_(~targeted, exists(
+            select(1)
+            .select_from(ArticleCategory)
+            .join(Category, ArticleCategory.category_id == Category.id)
+            .join(Group, Category.group_id == Group.id)
+            .where(ArticleCategory.article_id == Article.id, Group.institution_type_id == ctx.institution_type_id)
+        )))
+
+    def bitmap(index):
+        bits = index.member('audience', 'all')
+        if ctx.city_id:
+            bits |= index.member('audience', 'city') & index.member('audience_city_id', ctx.city_id)
+        if ctx.course:
+            bits |= index.member('audience', 'course') & index.member('audience_course', ctx.course)
+        fp_untargeted = index.member('fp_city', None) & index.member('fp_course', None)
+        bits |= (
+            index.member('audience', None)
+            & index.member('fp_institution_type', None) & index.member('fp_program', None)
+            & index.member('fp_form', None)
+            & (index.published & ~fp_untargeted)
+            & (index.member('fp_city', None) | (index.member('fp_city', ctx.city_key) if ctx.city_key else 0))
+            & (index.member('fp_course', None) | index.any_of('fp_course', course_keys))
+        )
+        bits &= index.member('base_class', None) | (
+            index.member('base_class', ctx.base_class) if ctx.base_class is not None else 0)
+        bits &= index.member('speciality_id', None) | index.any_of('speciality_id', ctx.speciality_ids)
+        bits &= index.member('education_form_id', None) | index.any_of('education_form_id', ctx.education_form_ids)
+        bits &= (index.member('audience_admission_year_id', None)
+                 | index.any_of('audience_admission_year_id', ctx.admission_year_ids))
+        bits &= index.member('education_mode', None)
+        if ctx.courses:
+            bits &= index.member('audience_courses', None) | index.any_of('audience_courses', ctx.courses)
+        if ctx.institution_type_id is not None:
+            bits &= ((index.published & ~index.member('targeted', True))
+                     | index.member('institution_type_id', ctx.institution_type_id))
+        return bits
+
+    return TargetingPlan(tuple(conditions), None if ctx.filter_group_ids else bitmap)
+
+
+def _filter_plan(ctx: FilterContext) -> TargetingPlan:
+    from app.filters.filter_path import fp_column
+    from app.filters.keys import course_number
+    from app.models import Article
+
+    course_num = course_number(ctx.course) if ctx.course else None
+    conditions = [Article.is_published.is_(True)]
+    if ctx.city:
+        # filter_path city, or the legacy audience city it maps to
+        city = fp_column('city') == ctx.city
+        if ctx.city_id:
+            city = or_(city, and_(Article.audience == 'city', Article.audience_city_id == ctx.city_id))
+        conditions.append(city)
+    if ctx.institution_type:
+        conditions.append(fp_column('institution_type') == ctx.institution_type)
+    if ctx.program:
+        conditions.append(fp_column('program') == ctx.program)
+    if ctx.course:
+        course = fp_column('course') == str(ctx.course)
+        if course_num is not None:
+            course = or_(course, and_(Article.audience == 'course', Article.audience_course == course_num))
+        conditions.append(course)
+    if ctx.form:
+        conditions.append(fp_column('form') == ctx.form)
+    if ctx.filter_group_ids:
+        conditions.append(_article_filter_exists(ctx.filter_group_ids))
+
+    def bitmap(index):
+        bits = index.published
+        if ctx.city:
+            city = index.member('fp_city', ctx.city)
+            if ctx.city_id:
+                city |= index.member('audience', 'city') & index.member('audience_city_id', ctx.city_id)
+            bits &= city
+        if ctx.institution_type:
+            bits &= index.member('fp_institution_type', ctx.institution_type)
+        if ctx.program:
+            bits &= index.member('fp_program', ctx.program)
+        if ctx.course:
+            course = index.member('fp_course', str(ctx.course))
+            if course_num is not None:
+                course |= index.member('audience', 'course') & index.member('audience_course', course_num)
+            bits &= course
+        if ctx.form:
+            bits &= index.member('fp_form', ctx.form)
+        return bits
+
+    return TargetingPlan(tuple(conditions), None if ctx.filter_group_ids else bitmap)
+
+
+def _audience_plan(ctx: AudienceQuery) -> TargetingPlan:
+    from app.models import Article, Speciality
+
+    conditions = []
+    if ctx.institution_type_ids:
+        # Institution type via the article's speciality
+        conditions.append(Article.speciality_id.in_(
+            select(Speciality.id).where(Speciality.institution_type_id.in_(ctx.institution_type_ids))
+        ))
+    if ctx.education_form_ids:
+        conditions.append(Article.education_form_id.in_(ctx.education_form_ids))
+    if ctx.speciality_ids:
+        conditions.append(Article.speciality_id.in_(ctx.speciality_ids))
+    if ctx.base_class:
+        conditions.append(Article.base_class == ctx.base_class)
+    if ctx.audience:
+        conditions.append(Article.audience == ctx.audience)
+    if ctx.audience_city_ids:
+        conditions.append(Article.audience_city_id.in_(ctx.audience_city_ids))
+    if ctx.audience_course:
+        conditions.append(Article.audience_course == ctx.audience_course)
+    if ctx.admission_year_ids:
+        conditions.append(Article.audience_admission_year_id.in_(ctx.admission_year_ids))
+    if ctx.education_mode:
+        conditions.append(Article.education_mode == ctx.education_mode)
+    if ctx.strict_audience:
+        # exclude fully general posts
+        conditions.append(and_(Article.audience.isnot(None), Article.audience != 'all'))
+    # View toggle: 'common' shows only general posts; 'city' shows only city-targeted
+    if ctx.view == 'common':
+        conditions.append(or_(Article.audience.is_(None), Article.audience == 'all'))
+    elif ctx.view == 'city':
+        conditions.append(Article.audience == 'city')
+    elif ctx.audience_city_ids:
+        # city filter: city-targeted or general
+        conditions.append(or_(Article.audience == 'city', Article.audience == 'all'))
+    return TargetingPlan(tuple(conditions))
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def plan_for(ctx) -> TargetingPlan:
+    """Compiled, memoized plan of a context"""
+    if isinstance(ctx, StudentContext):
+        return _student_plan(ctx)
+    if isinstance(ctx, FilterContext):
+        return _filter_plan(ctx)
+    if isinstance(ctx, AudienceQuery):
+        return _audience_plan(ctx)
+    raise TypeError(f'unknown targeting context: {type(ctx).__name__}')
@@ -0,0 +1,95 @@
+"""Bulk user import from CSV (loaded lazily, see app/lazy.py)."""
+from flask import request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.models import User
+from app import db, bcrypt
+from app.db_pool import use_pool
+import secrets
+import string
+
+
+@use_pool('bulk')
+@jwt_required()
+def bulk_import_users():
+    """Bulk import users from CSV (admin only)"""
+    current_user_id = int(get_jwt_identity())
+    current_user = User.query.get(current_user_id)
+    
+    if not current_user or current_user.role.name != 'Администратор':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
+    
+    file = request.files['file']
+    
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+    
+    if not file.filename.endswith('.csv'):
+        return jsonify({'error': 'File must be a CSV'}), 400
+    
+    try:
+        # Read CSV file
+        content = file.read().decode('utf-8')
+        lines = content.strip().split('\n')
+        
+        imported_users = []
+        errors = []
+        
+        for i, line in enumerate(lines[1:], 2):  # Skip header
+            try:
+                # Parse CSV line (semicolon separated)
+                parts = line.split(';')
+                if len(parts) < 3:
+                    errors.append(f'Line {i}: Invalid format')
+                    continue
+                
+                login = parts[0].strip()
+                last_name = parts[1].strip()
+                first_name = parts[2].strip()
+                
+                # Validate data
+                if not login or not last_name or not first_name:
+                    errors.append(f'Line {i}: Missing required fields')
+                    continue
+                
+                # Check if user already exists
+                if User.query.filter_by(email=login).first():
+                    errors.append(f'Line {i}: User already exists')
+                    continue
+                
+                # Generate temporary password
+                temp_password = ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(12))
+                hashed_password = bcrypt.generate_password_hash(temp_password).decode('utf-8')
+                
+                # Create user
+                user = User(
+                    email=login,
+                    password=hashed_password,
+                    full_name=f'{last_name} {first_name}',
+                    role_id=3  # Default role (Авторизованный читатель)
+                )
+                
+                db.session.add(user)
+                imported_users.append({
+                    'email': login,
+                    'full_name': f'{last_name} {first_name}',
+                    'temp_password': temp_password
+                })
+                
+            except Exception as e:
+                errors.append(f'Line {i}: {str(e)}')
+        
+        if imported_users:
+            db.session.commit()
+        
+        return jsonify({
+            'imported_users': imported_users,
+            'errors': errors,
+            'message': f'Successfully imported {len(imported_users)} users'
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to import users: {str(e)}'}), 500
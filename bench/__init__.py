@@ -0,0 +1,5 @@
+"""Benchmark harness: synthetic data at scale, hot-endpoint scenarios, latency report.
+
+    python -m bench --dsn sqlite:///bench.db --scale small --generate
+    python -m bench --dsn sqlite:///bench.db --dsn postgresql+psycopg2://... --scale medium --generate
+"""
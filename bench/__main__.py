@@ -0,0 +1,93 @@
+"""CLI entry point: `python -m bench --help`"""
+import argparse
+import os
+import platform
+import sys
+from datetime import datetime
+
+from bench.report import render_table, summarize, write_json
+
+
+def _label(dsn: str) -> str:
+    return dsn.split(':', 1)[0].split('+', 1)[0]
+
+
+def _make_app(dsn: str):
+    # SQL instrumentation is done by the runner; keep the app's own hooks out of the timings
+    os.environ['DATABASE_URL'] = dsn
+    os.environ.setdefault('QUERY_STATS', '0')
+    os.environ.setdefault('PROFILER', '0')
+    from app import create_app
+    return create_app('production')
+
+
+def run(dsn: str, args) -> dict:
+    from app import db
+    from bench.datagen import SCALES, generate
+    from bench.scenarios import SCENARIOS, Context, run_scenario
+
+    app = _make_app(dsn)
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+            db.create_all()
+            from app.db_migrations import run_startup_migrations
+            run_startup_migrations(db)
+        if args.generate:
+            counts = generate(SCALES[args.scale], seed=args.seed)
+            print(f'[{_label(dsn)}] generated: {counts}', flush=True)
+        ctx = Context.load()
+        selected = [s for s in SCENARIOS if not args.only or any(o in s.name for o in args.only)]
+        results = {}
+        for scenario in selected:
+            samples, wall = run_scenario(app, scenario, ctx, args.iterations, args.warmup, args.concurrency)
+            results[scenario.name] = summarize(samples, wall)
+            s = results[scenario.name]
+            print(f"[{_label(dsn)}] {scenario.name}: p50={s['p50_ms']}ms p95={s['p95_ms']}ms "
+                  f"queries={s['queries_p50']:g} rps={s['rps']}", flush=True)
+        db.session.remove()
+        db.engine.dispose()
+    return results
+
+
+def main(argv=None):
+    from bench.datagen import SCALES
+
+    parser = argparse.ArgumentParser(prog='python -m bench', description=__doc__)
+    parser.add_argument('--dsn', action='append', default=[],
+                        help='SQLAlchemy URL; repeat to compare databases (default: $DATABASE_URL)')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--generate', action='store_true', help='Insert synthetic data before running')
+    parser.add_argument('--reset', action='store_true', help='DROP and recreate all tables first (destructive!)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--only', action='append', help='Run scenarios whose name contains this text')
+    parser.add_argument('--json', help='Write the full report to this file')
+    args = parser.parse_args(argv)
+
+    dsns = args.dsn or [os.getenv('DATABASE_URL') or 'sqlite:///bench.db']
+    results = {}
+    for dsn in dsns:
+        label = _label(dsn)
+        while label in results:
+            label += "'"
+        results[label] = run(dsn, args)
+
+    print()
+    print(render_table(results))
+    if args.json:
+        write_json(args.json, {
+            'generated_at': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'scale': args.scale,
+            'iterations': args.iterations,
+            'concurrency': args.concurrency,
+            'results': results,
+        })
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
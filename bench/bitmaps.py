@@ -0,0 +1,107 @@
+"""Bitmap index vs SQL targeting for the student feed and /api/filters/articles.
+
+    python -m bench.bitmaps --dsn sqlite:///bench.db --generate --scale small
+    python -m bench.bitmaps --dsn postgresql+psycopg2://... --iterations 500
+
+Runs every scenario twice in the same process, with BITMAP_INDEX off (SQL
+path) and on (app/bitmap_index.py), after checking on --verify sampled
+requests that both paths return the same article ids and totals. Also
+reports the index build time and the size of its bitmaps. The response
+cache is forced off so every request reaches the view.
+"""
+import argparse
+import os
+import sys
+import time
+
+from bench.report import render_table, summarize
+
+SCENARIOS = ('articles.student_feed', 'filters.articles')
+EXTRA_SCENARIOS = (
+    # deep pages: the SQL path pages with OFFSET, the index skips whole bytes of the bitmap
+    ('articles.student_feed.page5', lambda c: (f'/api/articles/student-feed?group_id={c.choice(c.group_ids)}&course=2&page=5&per_page=20', {})),
+    ('filters.articles.limit200', lambda c: ('/api/filters/articles?institution_type=college&limit=200', {})),
+)
+
+
+def _ids(payload):
+    if 'articles' in payload:
+        return [a['id'] for a in payload['articles']], payload['pagination']['total']
+    return [a['id'] for a in payload['data']], payload['total']
+
+
+def verify(app, scenarios, ctx, samples: int) -> int:
+    """Number of sampled requests whose ids/total differ between the two paths"""
+    client = app.test_client()
+    mismatches = 0
+    for scenario in scenarios:
+        for _ in range(samples):
+            url, headers = scenario.request(ctx)
+            results = []
+            for enabled in (False, True):
+                app.config['BITMAP_INDEX'] = enabled
+                rv = client.get(url, headers=headers)
+                results.append(_ids(rv.get_json()) if rv.status_code == 200 else rv.status_code)
+            if results[0] != results[1]:
+                mismatches += 1
+                print(f'MISMATCH {url}: sql={results[0]} bitmap={results[1]}', flush=True)
+    return mismatches
+
+
+def main(argv=None):
+    from bench.datagen import SCALES
+
+    parser = argparse.ArgumentParser(prog='python -m bench.bitmaps', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=os.getenv('DATABASE_URL') or 'sqlite:///bench.db')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--generate', action='store_true', help='Insert synthetic data before running')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--verify', type=int, default=20, help='Sampled requests per scenario compared across paths')
+    args = parser.parse_args(argv)
+
+    os.environ['RESPONSE_CACHE'] = 'off'
+    os.environ['BITMAP_INDEX'] = '0'
+    from bench.__main__ import _make_app
+    app = _make_app(args.dsn)
+
+    from app import db
+    from app.bitmap_index import get_bitmap_index
+    from bench.datagen import generate
+    from bench.scenarios import SCENARIOS as ALL, Context, Scenario, run_scenario
+
+    with app.app_context():
+        if args.generate:
+            print(f'generated: {generate(SCALES[args.scale], seed=args.seed)}', flush=True)
+        ctx = Context.load()
+        scenarios = [s for s in ALL if s.name in SCENARIOS] + [Scenario(n, r) for n, r in EXTRA_SCENARIOS]
+
+        app.config['BITMAP_INDEX'] = True
+        started = time.perf_counter()
+        index = get_bitmap_index(app)
+        build_ms = (time.perf_counter() - started) * 1000.0
+        size = sum(bits.bit_length() for bits in index.bitmaps.values()) // 8
+        print(f'index: {index.published.bit_count()} published, {len(index.bitmaps)} bitmaps, '
+              f'{size / 1024:.0f} KiB, built in {build_ms:.0f} ms', flush=True)
+
+        mismatches = verify(app, scenarios, ctx, args.verify)
+        print(f'verify: {mismatches} mismatching requests', flush=True)
+
+        results = {}
+        for label, enabled in (('sql', False), ('bitmap', True)):
+            app.config['BITMAP_INDEX'] = enabled
+            results[label] = {}
+            for scenario in scenarios:
+                samples, wall = run_scenario(app, scenario, ctx, args.iterations, args.warmup)
+                results[label][scenario.name] = summarize(samples, wall)
+        db.session.remove()
+
+    print()
+    print(render_table(results))
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
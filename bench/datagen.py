@@ -0,0 +1,262 @@
+"""Synthetic data generator built on the app models.
+
+Everything is written with bulk `INSERT ... VALUES` batches (executemany via
+`session.execute(insert(Model), rows)`), never one ORM object per row, so
+the large scale (100k articles, 5k groups, 10M views) finishes in minutes.
+The random generator is seeded: the same scale + seed yields the same data.
+"""
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, func, insert, update
+
+from app import db
+from app.models import (
+    AdmissionYear, Article, ArticleAuthor, ArticleCategory, ArticleMedia, ArticleMediaLink, ArticleView,
+    Category, City, EducationForm, Group, InstitutionType, Role, SchoolClass, Speciality, Subcategory,
+    TopCategory, User,
+)
+
+BATCH = 5000
+
+
+@dataclass(frozen=True)
+class Scale:
+    articles: int
+    groups: int
+    views: int
+    authors: int = 50
+    media_ratio: float = 0.3      # share of articles that carry media
+    media_bytes: int = 4096       # blob size of generated files
+
+
+SCALES = {
+    'tiny': Scale(articles=500, groups=50, views=5_000, authors=10),
+    'small': Scale(articles=5_000, groups=300, views=100_000, authors=20),
+    'medium': Scale(articles=20_000, groups=1_000, views=1_000_000),
+    'large': Scale(articles=100_000, groups=5_000, views=10_000_000, authors=200),
+}
+
+CITY_KEYS = {
+    'nsk': 'Новосибирск',
+    'spb': 'Санкт-Петербург',
+    'msk': 'Москва',
+    'ekb': 'Екатеринбург',
+    'krd': 'Краснодар',
+    'rnd': 'Ростов-на-Дону',
+}
+INSTITUTIONS = {'Школа': 'school', 'Колледж': 'college', 'Вуз': 'university'}
+PROGRAMS = ['programming', 'sys_adm', 'design', 'commercial', 'web_design', 'gamedev', 'ai', '3d',
+            'cybersport', 'info_sec', 'tech']
+FORMS = {'Очная': 'full_time', 'Заочная': 'remote', 'Дистанционная': 'dist', 'Очно-заочная': 'blended'}
+WORDS = ('расписание практика экзамен стипендия общежитие библиотека проект зачет конференция '
+         'олимпиада сессия модуль лекция семинар куратор документы справка приказ').split()
+
+# Audience mix of generated articles: (audience, weight)
+AUDIENCE_MIX = (('all', 55), ('city', 20), ('course', 10), (None, 15))
+
+
+def _log(msg):
+    print(f'[datagen] {msg}', flush=True)
+
+
+def _insert(model, rows):
+    """Bulk insert in BATCH-sized executemany chunks"""
+    for i in range(0, len(rows), BATCH):
+        db.session.execute(insert(model), rows[i:i + BATCH])
+
+
+def _ids(model, start_id=0):
+    return [i for (i,) in db.session.query(model.id).filter(model.id > start_id).order_by(model.id).all()]
+
+
+def _max_id(model):
+    return db.session.query(func.coalesce(func.max(model.id), 0)).scalar()
+
+
+def _get_or_create(model, **kwargs):
+    obj = model.query.filter_by(**kwargs).first()
+    if obj is None:
+        obj = model(**kwargs)
+        db.session.add(obj)
+        db.session.flush()
+    return obj
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def generate(scale: Scale, seed: int = 42, now: datetime = None) -> dict:
+    """Populate the current app's database. Returns row counts per table.
+    Lookups are reused when present; bulk entities are appended."""
+    rng = random.Random(seed)
+    now = now or datetime.utcnow()
+    counts = {}
+    started = time.perf_counter()
+
+    # --- lookups ---
+    role = _get_or_create(Role, name='Редактор')
+    inst = {name: _get_or_create(InstitutionType, name=name) for name in INSTITUTIONS}
+    cities = [_get_or_create(City, name=name) for name in CITY_KEYS.values()]
+    city_key_by_id = {c.id: key for c, key in zip(cities, CITY_KEYS)}
+    forms = {(i, f): _get_or_create(EducationForm, name=f, institution_type_id=inst[i].id)
+             for i in ('Колледж', 'Вуз') for f in FORMS}
+    specs = []
+    for i in ('Колледж', 'Вуз'):
+        for n in range(12):
+            specs.append(_get_or_create(Speciality, code=f'{9 + n:02d}.0{2 if i == "Колледж" else 3}.0{n % 9 + 1}',
+                                        name=f'Специальность {i} {n + 1}', institution_type_id=inst[i].id))
+    years = {(i, y): _get_or_create(AdmissionYear, year=y, institution_type_id=inst[i].id)
+             for i in ('Колледж', 'Вуз') for y in range(now.year - 4, now.year + 1)}
+    classes = [_get_or_create(SchoolClass, name=str(n), institution_type_id=inst['Школа'].id) for n in (9, 11)]
+    tops = [_get_or_create(TopCategory, slug=f'bench-top-{n}', name=f'Раздел {n}') for n in range(8)]
+    subs = [_get_or_create(Subcategory, top_category_id=t.id, slug=f'bench-sub-{t.id}-{n}', name=f'Подраздел {n}')
+            for t in tops for n in range(4)]
+    db.session.commit()
+    _log(f'lookups ready ({time.perf_counter() - started:.1f}s)')
+
+    # --- authors ---
+    first_user = _max_id(User)
+    _insert(User, [{'email': f'bench-author-{first_user + n}@example.org', 'password': 'x', 'role_id': role.id,
+                    'full_name': f'Автор {first_user + n}'} for n in range(scale.authors)])
+    author_ids = _ids(User, first_user)
+    counts['users'] = len(author_ids)
+
+    # --- groups: college/university combinations, distributed over cities ---
+    first_group = _max_id(Group)
+    group_rows = []
+    for n in range(scale.groups):
+        inst_name = 'Колледж' if n % 3 else 'Вуз'
+        spec = rng.choice([s for s in specs if s.institution_type_id == inst[inst_name].id])
+        form_name = rng.choices(list(FORMS), weights=(70, 15, 10, 5))[0]
+        year = rng.randint(now.year - 4, now.year)
+        city = rng.choices(cities, weights=(30, 25, 20, 10, 10, 5))[0]
+        group_rows.append({
+            'display_name': f'{spec.code}-{year % 100}{FORMS[form_name][0]}-{first_group + n}',
+            'speciality_id': spec.id,
+            'education_form_id': forms[(inst_name, form_name)].id,
+            'admission_year_id': years[(inst_name, year)].id,
+            'city_id': city.id,
+            'institution_type_id': inst[inst_name].id,
+        })
+    _insert(Group, group_rows)
+    group_ids = _ids(Group, first_group)
+    counts['groups'] = len(group_ids)
+
+    # --- categories: one per group + section-level ones ---
+    first_cat = _max_id(Category)
+    cat_rows = [{'top_category_id': rng.choice(tops).id, 'group_id': g} for g in group_ids]
+    cat_rows += [{'top_category_id': s.top_category_id, 'subcategory_id': s.id} for s in subs]
+    _insert(Category, cat_rows)
+    category_ids = _ids(Category, first_cat)
+    counts['categories'] = len(category_ids)
+    db.session.commit()
+    _log(f'{len(group_ids)} groups, {len(category_ids)} categories ({time.perf_counter() - started:.1f}s)')
+
+    # --- articles ---
+    first_article = _max_id(Article)
+    audiences, weights = zip(*AUDIENCE_MIX)
+    span = timedelta(days=730).total_seconds()
+    article_rows = []
+    for n in range(scale.articles):
+        created = now - timedelta(seconds=span * (rng.random() ** 2))  # skewed towards recent
+        audience = rng.choices(audiences, weights=weights)[0]
+        row = {
+            'title': _text(rng, rng.randint(3, 8)),
+            'content': ' '.join(_text(rng, rng.randint(8, 20)) for _ in range(rng.randint(3, 30))),
+            'created_at': created,
+            'updated_at': created,
+            'is_published': rng.random() < 0.85,
+            'is_for_staff': rng.random() < 0.05,
+            'is_actual': rng.random() < 0.3,
+            'views_count': 0,
+            'audience': audience,
+        }
+        fp = {}
+        if audience == 'city':
+            city = rng.choice(cities)
+            row['audience_city_id'] = city.id
+            fp['city'] = city_key_by_id[city.id]
+        elif audience == 'course':
+            row['audience_course'] = rng.randint(1, 4)
+            fp['course'] = str(row['audience_course'])
+        elif audience is None and rng.random() < 0.6:
+            spec = rng.choice(specs)
+            row['speciality_id'] = spec.id
+            inst_name = 'Колледж' if spec.institution_type_id == inst['Колледж'].id else 'Вуз'
+            form_name = rng.choice(list(FORMS))
+            row['education_form_id'] = forms[(inst_name, form_name)].id
+            fp.update(institution_type=INSTITUTIONS[inst_name], form=FORMS[form_name])
+        if rng.random() < 0.4:
+            fp['program'] = rng.choice(PROGRAMS)
+            fp.setdefault('institution_type', 'college')
+        if fp:
+            row['filter_path'] = fp
+        article_rows.append(row)
+    _insert(Article, article_rows)
+    del article_rows
+    article_ids = _ids(Article, first_article)
+    counts['articles'] = len(article_ids)
+    db.session.commit()
+    _log(f'{len(article_ids)} articles ({time.perf_counter() - started:.1f}s)')
+
+    # --- article links: authors, categories ---
+    _insert(ArticleAuthor, [{'article_id': a, 'user_id': rng.choice(author_ids)} for a in article_ids])
+    ac_rows = []
+    for a in article_ids:
+        for c in rng.sample(category_ids, k=min(len(category_ids), rng.choice((0, 1, 1, 1, 2, 3)))):
+            ac_rows.append({'article_id': a, 'category_id': c})
+    _insert(ArticleCategory, ac_rows)
+    counts['article_categories'] = len(ac_rows)
+    db.session.commit()
+
+    # --- media: a few shared blobs of realistic size, linked with positions ---
+    with_media = [a for a in article_ids if rng.random() < scale.media_ratio]
+    first_media = _max_id(ArticleMedia)
+    media_rows, owners = [], []
+    for a in with_media:
+        for pos in range(rng.randint(1, 3)):
+            blob = rng.randbytes(scale.media_bytes)
+            media_rows.append({'media_type': 'image', 'data': blob, 'file_name': f'bench-{a}-{pos}.png',
+                               'mime_type': 'image/png', 'byte_size': len(blob), 'status': 'ready',
+                               'created_at': now})
+            owners.append((a, pos))
+    _insert(ArticleMedia, media_rows)
+    del media_rows
+    # ids are assigned in insertion order
+    media_ids = _ids(ArticleMedia, first_media)
+    link_rows = [{'article_id': a, 'media_id': m, 'position': pos} for m, (a, pos) in zip(media_ids, owners)]
+    _insert(ArticleMediaLink, link_rows)
+    counts['media'] = len(media_ids)
+    db.session.commit()
+    _log(f'{len(media_ids)} media ({time.perf_counter() - started:.1f}s)')
+
+    # --- views: Zipf-like popularity, streamed in batches ---
+    hot = max(1, len(article_ids) // 20)
+    views_per_article = {}
+    remaining = scale.views
+    while remaining > 0:
+        n = min(BATCH * 4, remaining)
+        rows = []
+        for _ in range(n):
+            # 80% of views go to the 5% most popular articles
+            a = article_ids[rng.randrange(hot)] if rng.random() < 0.8 else rng.choice(article_ids)
+            rows.append({'article_id': a, 'user_id': None,
+                         'created_at': now - timedelta(seconds=span * rng.random() ** 3)})
+            views_per_article[a] = views_per_article.get(a, 0) + 1
+        _insert(ArticleView, rows)
+        db.session.commit()
+        remaining -= n
+    if views_per_article:
+        stmt = update(Article).where(Article.id == bindparam('aid')).values(views_count=bindparam('views'))
+        rows = [{'aid': a, 'views': v} for a, v in views_per_article.items()]
+        for i in range(0, len(rows), BATCH):
+            db.session.connection().execute(stmt, rows[i:i + BATCH])
+        db.session.commit()
+    counts['views'] = scale.views
+    _log(f'{scale.views} views ({time.perf_counter() - started:.1f}s)')
+    counts['seconds'] = round(time.perf_counter() - started, 1)
+    return counts
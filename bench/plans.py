@@ -0,0 +1,214 @@
+"""Query-plan regression check for the hot article queries.
+
+Replays the hot endpoints against a seeded database, captures the SQL they
+issue (`track_queries(capture=True)`) and runs every statement touching
+`articles` through `EXPLAIN (FORMAT JSON)` (Postgres) or `EXPLAIN QUERY
+PLAN` (SQLite). A sequential scan on `articles` fails the check once the
+table holds at least --min-rows rows. Known, accepted scans can be recorded
+in a baseline file; only scans missing from it fail, so CI catches query
+shapes that regress without blocking on ones already on the backlog.
+A case answering with HTTP 5xx always fails.
+
+    python -m bench.plans --dsn postgresql+psycopg2://... --generate small
+    python -m bench.plans --baseline plan_baseline.json --update-baseline
+    make check-plans PLAN_BASELINE=plan_baseline.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from dataclasses import dataclass
+
+_ARTICLES_RE = re.compile(r'\barticles\b', re.IGNORECASE)
+
+
+@dataclass
+class Case:
+    name: str
+    url: str
+
+
+def _cases(group_id):
+    get_articles = [
+        ('default', ''),
+        ('published', 'is_published=1'),
+        ('staff', 'is_for_staff=1'),
+        ('actual', 'is_actual=1'),
+        ('tag', 'tag=study'),
+        ('date_range', 'date_from=2024-01-01&date_to=2030-01-01'),
+        ('top_category', 'top_category_id=1'),
+        ('subcategory', 'subcategory_id=1'),
+        ('group', 'group_id=1'),
+        ('institution_type', 'institution_type_id=2'),
+        ('education_form', 'education_form_id=1'),
+        ('speciality', 'speciality_id=1'),
+        ('city_ids', 'city_ids=1&city_ids=2'),
+        ('audience_city', 'audience=city&audience_city_id=1'),
+        ('audience_course', 'audience=course&audience_course=2'),
+        ('published_page_50', 'is_published=1&page=50'),
+        ('search', 'search=practice'),
+    ]
+    filtered = [
+        ('city', 'city=msk'),
+        ('institution_type', 'institution_type=college'),
+        ('program', 'institution_type=college&program=programming'),
+        ('course', 'course=2'),
+        ('form', 'form=full_time'),
+        ('all', 'city=msk&institution_type=college&program=programming&course=2&form=full_time'),
+    ]
+    groups = [
+        ('institution', 'institution_type_id=2'),
+        ('city', 'city_id=1'),
+        ('speciality_form', 'institution_type_id=2&speciality_id=1&education_form_id=1'),
+        ('search', 'search=09'),
+    ]
+    cases = [Case(f'get_articles[{n}]', f'/api/articles/?{q}&per_page=20') for n, q in get_articles]
+    if group_id:
+        cases.append(Case('student_feed', f'/api/articles/student-feed?group_id={group_id}&course=2'))
+    cases += [Case(f'get_filtered_articles[{n}]', f'/api/filters/articles?{q}') for n, q in filtered]
+    cases += [Case(f'get_groups[{n}]', f'/api/categories/groups?{q}') for n, q in groups]
+    return cases
+
+
+def shape_key(statement: str) -> str:
+    from app.query_stats import normalize_statement
+    return hashlib.sha1(normalize_statement(statement).encode()).hexdigest()[:12]
+
+
+def _pg_article_scans(plan_node, out):
+    relation = plan_node.get('Relation Name')
+    if relation == 'articles':
+        index = plan_node.get('Index Name')
+        out.append(plan_node['Node Type'] + (f' using {index}' if index else ''))
+    for child in plan_node.get('Plans', []):
+        _pg_article_scans(child, out)
+    return out
+
+
+def explain(conn, dialect: str, statement: str, parameters):
+    """[access path on articles, ...] for one statement"""
+    if dialect == 'postgresql':
+        (plan,) = conn.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters).one()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return _pg_article_scans(plan[0]['Plan'], [])
+    if dialect == 'sqlite':
+        scans = []
+        for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all():
+            detail = row[-1]
+            m = re.match(r'(SCAN|SEARCH) articles\b(.*)', detail)
+            if m:
+                kind, rest = m.group(1), m.group(2).strip()
+                # 'SCAN articles' without an index is SQLite's sequential scan
+                scans.append('Seq Scan' if kind == 'SCAN' and 'INDEX' not in rest else f'{kind} {rest}'.strip())
+        return scans
+    raise SystemExit(f'plan checks support postgresql and sqlite, not {dialect}')
+
+
+def collect(app, cases):
+    """{case: [(shape, statement, access paths)]} for statements touching articles"""
+    from app import db
+    from app.query_stats import track_queries
+
+    dialect = db.engine.dialect.name
+    client = app.test_client()
+    report = {}
+    for case in cases:
+        with track_queries(capture=True) as stats:
+            rv = client.get(case.url)
+        seen, entries = set(), []
+        for statement, parameters, _ms in stats.statements:
+            if not _ARTICLES_RE.search(statement) or statement.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')):
+                continue
+            key = shape_key(statement)
+            if key in seen:
+                continue
+            seen.add(key)
+            with db.engine.connect() as conn:
+                entries.append((key, statement, explain(conn, dialect, statement, parameters)))
+        report[case.name] = {'status': rv.status_code, 'statements': entries}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bench.plans', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', help='SQLAlchemy URL (default: $DATABASE_URL)')
+    parser.add_argument('--generate', metavar='SCALE', help='Seed synthetic data first (see bench.datagen.SCALES)')
+    parser.add_argument('--min-rows', type=int, default=10000,
+                        help='Sequential scans on articles fail only from this table size on')
+    parser.add_argument('--baseline', help='JSON file with accepted sequential scans')
+    parser.add_argument('--update-baseline', action='store_true', help='Write current findings to --baseline')
+    parser.add_argument('--verbose', '-v', action='store_true')
+    args = parser.parse_args(argv)
+
+    if args.dsn:
+        os.environ['DATABASE_URL'] = args.dsn
+    os.environ.setdefault('QUERY_STATS', '0')
+    from sqlalchemy import func, text
+    from app import create_app, db
+    from app.models import Article, Group
+
+    app = create_app('production')
+    with app.app_context():
+        if args.generate:
+            from bench.datagen import SCALES, generate
+            generate(SCALES[args.generate])
+        dialect = db.engine.dialect.name
+        with db.engine.begin() as conn:
+            conn.execute(text('ANALYZE'))
+        rows = db.session.query(func.count(Article.id)).scalar()
+        group_id = db.session.query(func.min(Group.id)).scalar()
+        report = collect(app, _cases(group_id))
+        db.session.remove()
+
+    baseline = {}
+    if args.baseline and os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, encoding='utf-8') as fh:
+            baseline = json.load(fh)
+
+    enforce = rows >= args.min_rows
+    failures, known, found, errors = [], [], {}, []
+    for case, data in report.items():
+        if data['status'] >= 500:
+            errors.append((case, data['status']))
+        for key, statement, scans in data['statements']:
+            if args.verbose:
+                print(f'{case} {key}: {", ".join(scans) or "-"}')
+            if 'Seq Scan' not in scans:
+                continue
+            found.setdefault(case, []).append(key)
+            if key in baseline.get(case, []):
+                known.append((case, key, statement))
+            else:
+                failures.append((case, key, statement))
+
+    if args.update_baseline:
+        if not args.baseline:
+            parser.error('--update-baseline needs --baseline')
+        with open(args.baseline, 'w', encoding='utf-8') as fh:
+            json.dump(found, fh, indent=2, sort_keys=True)
+            fh.write('\n')
+        print(f'baseline written: {sum(len(v) for v in found.values())} accepted sequential scans')
+        return 0
+
+    print(f'{dialect}: articles has {rows} rows; {len(report)} cases, '
+          f'{sum(len(d["statements"]) for d in report.values())} statements explained')
+    for case, key, _ in known:
+        print(f'  known seq scan  {case} [{key}]')
+    for case, key, statement in failures:
+        print(f'  SEQ SCAN        {case} [{key}]\n      {" ".join(statement.split())[:300]}')
+    for case, status in errors:
+        print(f'  HTTP {status}        {case}: plan not checked')
+    if errors:
+        return 1
+    if failures and not enforce:
+        print(f'articles has fewer than {args.min_rows} rows: sequential scans reported, not enforced')
+        return 0
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
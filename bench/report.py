@@ -0,0 +1,50 @@
+"""Latency/throughput summaries and the comparison table across databases."""
+import json
+from collections import Counter
+
+
+def percentile(sorted_values, q: float) -> float:
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def summarize(samples, wall_seconds: float) -> dict:
+    ms = sorted(s.seconds * 1000.0 for s in samples)
+    queries = sorted(s.queries for s in samples)
+    return {
+        'requests': len(samples),
+        'p50_ms': round(percentile(ms, 0.50), 2),
+        'p95_ms': round(percentile(ms, 0.95), 2),
+        'p99_ms': round(percentile(ms, 0.99), 2),
+        'max_ms': round(ms[-1], 2) if ms else 0.0,
+        'queries_p50': percentile(queries, 0.50),
+        'queries_max': queries[-1] if queries else 0,
+        'rps': round(len(samples) / wall_seconds, 1) if wall_seconds else 0.0,
+        'statuses': dict(Counter(s.status for s in samples)),
+    }
+
+
+def render_table(results: dict) -> str:
+    """results: {db_label: {scenario: summary}} -> aligned text table"""
+    header = ('db', 'scenario', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'req/s', 'status')
+    rows = [header]
+    for label, scenarios in results.items():
+        for name, s in scenarios.items():
+            status = ','.join(f'{code}x{n}' for code, n in sorted(s['statuses'].items()))
+            queries = f"{s['queries_p50']:g}" + (f"..{s['queries_max']}" if s['queries_max'] != s['queries_p50'] else '')
+            rows.append((label, name, f"{s['p50_ms']:.2f}", f"{s['p95_ms']:.2f}", f"{s['p99_ms']:.2f}",
+                         queries, f"{s['rps']:.1f}", status))
+    widths = [max(len(str(r[i])) for r in rows) for i in range(len(header))]
+    lines = ['  '.join(str(v).ljust(w) for v, w in zip(r, widths)) for r in rows]
+    lines.insert(1, '  '.join('-' * w for w in widths))
+    return '\n'.join(lines)
+
+
+def write_json(path: str, payload: dict):
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(payload, fh, ensure_ascii=False, indent=2)
@@ -0,0 +1,113 @@
+"""Hot-endpoint scenarios and the in-process runner.
+
+Requests go through `app.test_client()` so routing, hooks and serialization
+are measured without network noise; each request is wrapped in
+`track_queries()` to count its SQL statements.
+"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable
+
+from sqlalchemy import func
+
+from app import db
+from app.models import Article, ArticleMedia, City, Group, InstitutionType
+from app.query_stats import track_queries
+
+
+@dataclass
+class Context:
+    """Ids sampled from the database that scenarios draw their parameters from"""
+    article_ids: list
+    group_ids: list
+    media_ids: list
+    city_ids: list
+    institution_type_ids: list
+    rng: random.Random = field(default_factory=lambda: random.Random(7))
+
+    @classmethod
+    def load(cls, sample: int = 2000):
+        def pick(model, extra=None):
+            q = db.session.query(model.id)
+            if extra is not None:
+                q = q.filter(extra)
+            return [i for (i,) in q.order_by(func.random()).limit(sample).all()]
+        return cls(
+            article_ids=pick(Article, Article.is_published.is_(True)),
+            group_ids=pick(Group),
+            media_ids=pick(ArticleMedia, ArticleMedia.media_type != 'link'),
+            city_ids=pick(City),
+            institution_type_ids=pick(InstitutionType),
+        )
+
+    def choice(self, items, default=1):
+        return self.rng.choice(items) if items else default
+
+
+@dataclass
+class Scenario:
+    name: str
+    request: Callable  # (Context) -> (url, headers)
+
+
+FILTER_COMBOS = (
+    {'city': 'msk'},
+    {'institution_type': 'college'},
+    {'institution_type': 'college', 'program': 'programming'},
+    {'city': 'spb', 'course': '2'},
+    {'institution_type': 'college', 'form': 'full_time'},
+)
+
+
+def _qs(params: dict) -> str:
+    return '&'.join(f'{k}={v}' for k, v in params.items())
+
+
+SCENARIOS = [
+    Scenario('articles.list', lambda c: ('/api/articles/?page=1&per_page=20', {})),
+    Scenario('articles.list.published', lambda c: ('/api/articles/?is_published=1&page=3&per_page=20', {})),
+    Scenario('articles.list.search', lambda c: ('/api/articles/?search=практика&per_page=20', {})),
+    Scenario('articles.detail', lambda c: (f'/api/articles/{c.choice(c.article_ids)}', {})),
+    Scenario('articles.student_feed', lambda c: (f'/api/articles/student-feed?group_id={c.choice(c.group_ids)}&course=2', {})),
+    Scenario('filters.articles', lambda c: (f'/api/filters/articles?{_qs(c.rng.choice(FILTER_COMBOS))}', {})),
+    Scenario('categories.groups', lambda c: (f'/api/categories/groups?institution_type_id={c.choice(c.institution_type_ids)}&city_id={c.choice(c.city_ids)}', {})),
+    Scenario('categories.audience_options', lambda c: (f'/api/categories/audience/options?institution_type_id={c.choice(c.institution_type_ids)}', {})),
+    Scenario('media.range', lambda c: (f'/api/media/{c.choice(c.media_ids)}', {'Range': 'bytes=0-1023'})),
+]
+
+
+@dataclass
+class Sample:
+    seconds: float
+    queries: int
+    status: int
+
+
+def run_scenario(app, scenario: Scenario, ctx: Context, iterations: int, warmup: int = 3, concurrency: int = 1):
+    """Run `iterations` requests; returns (samples, wall_seconds)"""
+    def one(client):
+        url, headers = scenario.request(ctx)
+        with track_queries() as stats:
+            start = time.perf_counter()
+            rv = client.get(url, headers=headers)
+            rv.get_data()
+            elapsed = time.perf_counter() - start
+        return Sample(elapsed, stats.count, rv.status_code)
+
+    client = app.test_client()
+    for _ in range(warmup):
+        one(client)
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        samples = [one(client) for _ in range(iterations)]
+    else:
+        def worker(n):
+            c = app.test_client()
+            return [one(c) for _ in range(n)]
+        share = [iterations // concurrency + (1 if i < iterations % concurrency else 0) for i in range(concurrency)]
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = [s for chunk in pool.map(worker, share) for s in chunk]
+    return samples, time.perf_counter() - started
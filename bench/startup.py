@@ -0,0 +1,146 @@
+"""Startup benchmark: import cost of the app and time-to-first-request per gunicorn worker.
+
+    python -m bench.startup                 # -X importtime summary + 4 gunicorn workers
+    python -m bench.startup --workers 8 --threads 4
+    python -m bench.startup --importtime-only --top 40
+
+Worker timings come from the kb-boot log lines written by the hooks in
+gunicorn.conf.py: app_loaded_ms (fork -> WSGI app imported and created)
+and first_request_ms (fork -> first request accepted).
+"""
+import argparse
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_IMPORT_RE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+_BOOT_RE = re.compile(r'kb-boot worker=(\d+) (app_loaded_ms|first_request_ms)=([\d.]+)')
+
+
+def importtime(module: str = 'wsgi', env=None):
+    """[(cumulative_us, self_us, depth, name)] from `python -X importtime -c 'import <module>'`"""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _IMPORT_RE.match(line)
+        if m:
+            rows.append((int(m.group(2)), int(m.group(1)), (len(m.group(3)) - 1) // 2, m.group(4)))
+    if proc.returncode != 0 and not rows:
+        raise RuntimeError(proc.stderr[-2000:])
+    return rows
+
+
+def print_importtime(rows, top: int):
+    total = next((cum for cum, _, depth, name in rows if depth == 0 and name == 'wsgi'), None)
+    print(f'import wsgi: {total / 1000.0:.1f} ms' if total else 'import wsgi: n/a')
+    print(f'{"cumulative ms":>14} {"self ms":>9}  module')
+    for cum, self_us, depth, name in sorted(rows, reverse=True)[:top]:
+        print(f'{cum / 1000.0:>14.1f} {self_us / 1000.0:>9.1f}  {"  " * depth}{name}')
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def gunicorn_boot(workers: int, threads: int, timeout: float, env=None) -> dict:
+    """Start gunicorn, hit it until every worker served a request, return per-worker timings"""
+    port = _free_port()
+    cmd = [sys.executable, '-m', 'gunicorn', 'wsgi:app', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+           '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--threads', str(threads),
+           '--log-level', 'info']
+    started = time.monotonic()
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, text=True)
+    timings = {}
+    lock = threading.Lock()
+
+    def read_log():
+        for line in proc.stderr:
+            m = _BOOT_RE.search(line)
+            if m:
+                with lock:
+                    timings.setdefault(int(m.group(1)), {})[m.group(2)] = float(m.group(3))
+
+    reader = threading.Thread(target=read_log, daemon=True)
+    reader.start()
+
+    first_response = None
+    stop = threading.Event()
+
+    def hammer():
+        nonlocal first_response
+        while not stop.is_set():
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=5) as rv:
+                    rv.read()
+                if first_response is None:
+                    first_response = (time.monotonic() - started) * 1000.0
+            except (urllib.error.URLError, ConnectionError, OSError):
+                time.sleep(0.02)
+
+    clients = [threading.Thread(target=hammer, daemon=True) for _ in range(workers * max(threads, 1) * 2)]
+    for t in clients:
+        t.start()
+    try:
+        deadline = started + timeout
+        while time.monotonic() < deadline:
+            with lock:
+                served = sum(1 for t in timings.values() if 'first_request_ms' in t)
+            if served >= workers:
+                break
+            time.sleep(0.05)
+    finally:
+        stop.set()
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return {'workers': timings, 'first_response_ms': first_response}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bench.startup', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--top', type=int, default=25, help='Modules listed in the import-time summary')
+    parser.add_argument('--importtime-only', action='store_true')
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite:///bench.db')
+    # Multiprocess metrics need a clean directory per run
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+
+    print_importtime(importtime(env=env), args.top)
+    if args.importtime_only:
+        return 0
+
+    result = gunicorn_boot(args.workers, args.threads, args.timeout, env=env)
+    print()
+    print(f'gunicorn: first response {result["first_response_ms"] or float("nan"):.1f} ms after master start')
+    print(f'{"worker":>8} {"app loaded ms":>14} {"first request ms":>17}')
+    for pid, t in sorted(result['workers'].items()):
+        print(f'{pid:>8} {t.get("app_loaded_ms", float("nan")):>14.1f} {t.get("first_request_ms", float("nan")):>17.1f}')
+    missing = args.workers - sum(1 for t in result['workers'].values() if 'first_request_ms' in t)
+    if missing > 0:
+        print(f'{missing} worker(s) did not serve a request within {args.timeout:.0f}s')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
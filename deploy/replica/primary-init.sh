@@ -0,0 +1,5 @@
+#!/bin/sh
+# Runs once on a fresh primary data dir (docker-entrypoint-initdb.d):
+# allow streaming replication connections for the db-replica service.
+set -e
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
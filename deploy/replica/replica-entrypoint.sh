@@ -0,0 +1,11 @@
+#!/bin/sh
+# Hot-standby stand-in for a managed read replica: clones the primary with
+# pg_basebackup on first start (-R writes standby.signal + primary_conninfo),
+# then runs postgres in recovery.
+set -e
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+  until pg_isready -h db -U "$POSTGRES_USER" -d "$POSTGRES_DB"; do sleep 1; done
+  PGPASSWORD="$POSTGRES_PASSWORD" pg_basebackup -h db -U "$POSTGRES_USER" -D "$PGDATA" -R -X stream
+  chmod 700 "$PGDATA"
+fi
+exec docker-entrypoint.sh postgres -c hot_standby=on
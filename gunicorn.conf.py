@@ -0,0 +1,43 @@
+# Gunicorn reads ./gunicorn.conf.py automatically.
+# Prometheus multiprocess mode: every worker writes its metrics into
+# PROMETHEUS_MULTIPROC_DIR and /metrics aggregates them (see app/metrics.py).
+import os
+import shutil
+
+
+def on_starting(server):
+    path = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        # Stale files from a previous master would be summed into the new counters
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        try:
+            from prometheus_client import multiprocess
+        except ImportError:
+            return
+        multiprocess.mark_process_dead(worker.pid)
+
+
+# Boot timing per worker (parsed by `python -m bench.startup`)
+def post_fork(server, worker):
+    import time
+    worker.kb_forked_at = time.monotonic()
+    worker.kb_served_first = False
+
+
+def post_worker_init(worker):
+    import time
+    worker.log.info('kb-boot worker=%s app_loaded_ms=%.1f',
+                    worker.pid, (time.monotonic() - worker.kb_forked_at) * 1000.0)
+
+
+def pre_request(worker, req):
+    if not worker.kb_served_first:
+        import time
+        worker.kb_served_first = True
+        worker.log.info('kb-boot worker=%s first_request_ms=%.1f',
+                        worker.pid, (time.monotonic() - worker.kb_forked_at) * 1000.0)